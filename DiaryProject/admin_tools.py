@@ -0,0 +1,87 @@
+"""
+Admin changelists for tables with millions of rows.
+
+A stock changelist runs ``COUNT(*)`` twice per page (the filtered count for
+the paginator and the unfiltered one for "N total"), and on SQLite a count
+visits every row. ``LargeTableAdmin`` drops the second count and pages with
+``EstimatedCountPaginator``: an unfiltered list takes the table size from
+the database's statistics, and a filtered one counts at most ``COUNT_LIMIT``
+rows, or up to the page after the requested one when that is further, so
+the pager shows "10000+" rather than scanning on and every page stays
+reachable. Reaching page N already costs an OFFSET over the rows before it,
+so counting that far adds no more than the page itself reads.
+
+The estimate is the largest rowid on SQLite, which overshoots by however
+many rows have been deleted; the last pages of an unfiltered list can then
+be empty. PostgreSQL's ``reltuples`` is used as is.
+"""
+from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+COUNT_LIMIT = 10000
+
+
+def estimated_count(queryset):
+    """A cheap estimate of the number of rows in ``queryset``'s table, or None."""
+    connection = connections[queryset.db]
+    opts = queryset.model._meta
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite" and opts.pk.get_internal_type() in ("AutoField", "BigAutoField"):
+            # reads one entry at the end of the table b-tree
+            cursor.execute(f"SELECT max(rowid) FROM {connection.ops.quote_name(opts.db_table)}")
+        elif connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [opts.db_table])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that counts no further than ``COUNT_LIMIT`` rows, or than the
+    page after ``page``.
+
+    ``capped`` tells whether the count stopped at that limit, i.e. whether
+    there may be more rows than ``count``.
+    """
+    capped = False
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, page=1):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.count_limit = max(COUNT_LIMIT, (page + 1) * int(per_page))
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate > COUNT_LIMIT:
+                return estimate
+        count = queryset.order_by()[:self.count_limit].count()
+        self.capped = count == self.count_limit
+        return count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin defaults for the large tables.
+
+    Subclasses still need ``list_select_related`` for the foreign keys they
+    display, ``raw_id_fields`` for the ones they edit (a select widget loads
+    the whole related table), and search fields that can use an index.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        try:
+            page = max(int(request.GET.get(PAGE_VAR, 1)), 1)
+        except ValueError:
+            page = 1
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, page=page)
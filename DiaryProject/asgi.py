@@ -12,5 +12,17 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DiaryProject.settings')
+# serve the async variants of the hot views (settings.ASYNC_VIEWS)
+os.environ.setdefault('DIARY_ASYNC_VIEWS', '1')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# live event streams are served beside Django, without a thread each
+from DiaryProject.events import EventStreamApp  # noqa: E402
+
+application = EventStreamApp(django_application)
+
+# compile the style, include and base templates before the first request
+from DiaryProject.warmup import warm_up  # noqa: E402
+
+warm_up()
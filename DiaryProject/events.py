@@ -0,0 +1,202 @@
+"""
+Live per-user events, delivered to the browser as Server-Sent Events.
+
+Writers call ``publish(user_id, event_type, data)`` once their transaction has
+committed (``diary.live`` for new responses, ``users.notifications`` for new
+notifications). Each signed-in page opens one EventSource on ``users:events``.
+
+Under ASGI that path is answered by ``EventStreamApp``, which ``asgi.py``
+wraps around Django. Django runs every ASGI request in its own thread-sensitive
+context, and that context's worker thread lives as long as the response, so a
+stream served by a view would park one thread per open connection. The app
+only borrows a thread from the loop's shared pool to look up the session; an
+idle stream is then just a coroutine waiting on its queue. Under WSGI the
+``users:events`` view answers 204, which tells EventSource not to reconnect.
+
+The default ``InProcessBroker`` only reaches streams served by the same
+process. ``settings.LIVE_EVENTS["BROKER"]`` names a replacement class with the
+same ``subscribe``/``unsubscribe``/``publish`` methods, e.g. one backed by
+Redis pub/sub, for deployments with several ASGI processes.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from importlib import import_module
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http.cookie import parse_cookie
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+DEFAULT_SETTINGS = {
+    "BROKER": "DiaryProject.events.InProcessBroker",
+    "QUEUE_SIZE": 100,  # events buffered per stream; the oldest are dropped beyond this
+    "KEEPALIVE": 15,    # seconds between comment lines on an idle stream
+    "RETRY_MS": 5000,   # how long the browser waits before reconnecting
+}
+
+
+def get_settings():
+    conf = dict(DEFAULT_SETTINGS)
+    conf.update(getattr(settings, "LIVE_EVENTS", {}))
+    return conf
+
+
+class Subscription:
+    """One stream's queue, owned by the event loop that created it."""
+
+    def __init__(self, broker, channel, queue_size):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+
+    def put(self, event):
+        # runs on self.loop; a slow reader loses the oldest events, never blocks publishers
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Fan-out to the subscriptions of this process. ``publish`` may be called from any thread."""
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # the subscriber's loop has closed
+                self.unsubscribe(subscription)
+        return len(subscriptions)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    conf = get_settings()
+    return import_string(conf["BROKER"])(queue_size=conf["QUEUE_SIZE"])
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def publish(user_id, event_type, data):
+    """Send ``data`` (JSON-serialisable) to ``user_id``'s open streams as a ``event_type`` event."""
+    return get_broker().publish(user_channel(user_id), {"type": event_type, "data": data})
+
+
+def format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'], separators=(',', ':'))}\n\n"
+
+
+def _session_user_id(cookie_header):
+    """The signed-in user's id for a Cookie header, or None. Runs in a worker thread."""
+    from django.contrib.auth import get_user
+
+    key = parse_cookie(cookie_header).get(settings.SESSION_COOKIE_NAME)
+    if not key:
+        return None
+    try:
+        session = import_module(settings.SESSION_ENGINE).SessionStore(key)
+        # get_user also checks the session's password hash, like AuthenticationMiddleware
+        user = get_user(SimpleNamespace(session=session))
+        return user.pk if user.is_authenticated else None
+    finally:
+        # a thread of the loop's shared pool, not a request thread: nothing else closes it
+        connection.close()
+
+
+class EventStreamApp:
+    """ASGI wrapper that serves ``users:events`` as an SSE stream and passes everything else on."""
+
+    def __init__(self, app):
+        self.app = app
+        self._path = None
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = reverse("users:events")
+        return self._path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == self.path:
+            return await self.stream(scope, receive, send)
+        return await self.app(scope, receive, send)
+
+    async def stream(self, scope, receive, send):
+        headers = dict(scope.get("headers", []))
+        user_id = await sync_to_async(_session_user_id, thread_sensitive=False)(
+            headers.get(b"cookie", b"").decode("latin-1")
+        )
+        if user_id is None:
+            await send({"type": "http.response.start", "status": 403,
+                        "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"Sign in to receive events."})
+            return
+
+        conf = get_settings()
+        subscription = get_broker().subscribe(user_channel(user_id))
+        disconnected = asyncio.ensure_future(_disconnect(receive))
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),  # no proxy buffering
+            ]})
+            await _send_chunk(send, f"retry: {conf['RETRY_MS']}\n\n")
+            while True:
+                getter = asyncio.ensure_future(subscription.queue.get())
+                done, _pending = await asyncio.wait(
+                    {getter, disconnected}, timeout=conf["KEEPALIVE"], return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnected in done:
+                    getter.cancel()
+                    break
+                if getter in done:
+                    await _send_chunk(send, format_event(getter.result()))
+                else:
+                    getter.cancel()
+                    await _send_chunk(send, ": keepalive\n\n")
+        finally:
+            disconnected.cancel()
+            subscription.close()
+
+
+async def _disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _send_chunk(send, text):
+    await send({"type": "http.response.body", "body": text.encode(), "more_body": True})
@@ -0,0 +1,206 @@
+"""
+Per-request performance instrumentation.
+
+``QueryInstrumentationMiddleware`` wraps every query on the default database
+connection to record, per resolved view, the wall time, the time spent in the
+database and the number of queries. Each request is written as one JSON line
+to the ``diary.perf`` logger and added to an in-process rolling window, whose
+percentiles ``snapshot()`` returns. Repeated identical queries are reported,
+as are views that exceed their budget in ``settings.PERF_INSTRUMENTATION``.
+Records are only built and serialised when ``diary.perf`` will emit them;
+at its default WARNING level most requests just add their sample.
+"""
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger("diary.perf")
+
+DEFAULT_SETTINGS = {
+    "ENABLED": True,
+    "WINDOW": 500,           # samples kept per view for the rolling histogram
+    "DEFAULT_BUDGET": None,  # max queries for views without their own budget
+    "BUDGETS": {},           # view_name -> max queries, e.g. {"pages:home": 8}
+    "DUPLICATE_THRESHOLD": 2,  # identical statements reported in the request record
+    "DUPLICATE_WARNING": 3,    # ... and logged as a warning from this many repeats
+}
+
+
+def get_settings():
+    conf = dict(DEFAULT_SETTINGS)
+    conf.update(getattr(settings, "PERF_INSTRUMENTATION", {}))
+    return conf
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class RollingStats:
+    """Last ``window`` samples of (wall_ms, db_ms, queries) per view."""
+
+    def __init__(self, window):
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def add(self, view, wall_ms, db_ms, queries):
+        with self._lock:
+            self._samples[view].append((wall_ms, db_ms, queries))
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def snapshot(self):
+        with self._lock:
+            samples = {view: list(values) for view, values in self._samples.items()}
+        report = {}
+        for view, values in samples.items():
+            wall = [v[0] for v in values]
+            db = [v[1] for v in values]
+            queries = [v[2] for v in values]
+            report[view] = {
+                "count": len(values),
+                "wall_ms_p50": round(_percentile(wall, 50), 2),
+                "wall_ms_p95": round(_percentile(wall, 95), 2),
+                "db_ms_p50": round(_percentile(db, 50), 2),
+                "db_ms_p95": round(_percentile(db, 95), 2),
+                "queries_p50": _percentile(queries, 50),
+                "queries_max": max(queries),
+            }
+        return report
+
+
+stats = RollingStats(get_settings()["WINDOW"])
+
+
+def snapshot():
+    return stats.snapshot()
+
+
+class _QueryRecorder:
+    """
+    Counts and times queries. Statements are only collected, for the
+    duplicate report, when ``track_statements`` is set: repr()ing every
+    query's parameters is not free, and is wasted when nothing is logged.
+    """
+
+    def __init__(self, track_statements=True):
+        self.count = 0
+        self.db_seconds = 0.0
+        self.statements = Counter() if track_statements else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.count += 1
+            if self.statements is not None:
+                self.statements[(sql, repr(params))] += 1
+
+
+def _install(recorder):
+    connection.execute_wrappers.append(recorder)
+
+
+def _uninstall(recorder):
+    connection.execute_wrappers.remove(recorder)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Sync and async capable. Under ASGI the ORM runs in the request's
+    thread-sensitive worker thread, whose connection is not the event loop
+    thread's, so the recorder is installed from that thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.conf = get_settings()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.conf["ENABLED"]:
+            return self.get_response(request)
+
+        recorder = self._recorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        self._record(request, response, recorder, start)
+        return response
+
+    async def __acall__(self, request):
+        if not self.conf["ENABLED"]:
+            return await self.get_response(request)
+
+        recorder = self._recorder()
+        start = time.perf_counter()
+        await sync_to_async(_install)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(_uninstall)(recorder)
+        self._record(request, response, recorder, start)
+        return response
+
+    def _recorder(self):
+        # duplicates are reported in INFO records and WARNING alerts alone
+        return _QueryRecorder(track_statements=logger.isEnabledFor(logging.WARNING))
+
+    def _record(self, request, response, recorder, start):
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "<unresolved>"
+        db_ms = recorder.db_seconds * 1000
+        stats.add(view, wall_ms, db_ms, recorder.count)
+
+        # the rolling stats are all most requests need; build and serialise
+        # a record only for a logger that will emit it
+        info = logger.isEnabledFor(logging.INFO)
+        if not info and not logger.isEnabledFor(logging.WARNING):
+            return
+        duplicates = [
+            {"sql": sql[:200], "count": count}
+            for (sql, _params), count in (recorder.statements or Counter()).most_common(5)
+            if count >= self.conf["DUPLICATE_THRESHOLD"]
+        ]
+        budget = self.conf["BUDGETS"].get(view, self.conf["DEFAULT_BUDGET"])
+        over_budget = budget is not None and recorder.count > budget
+        repeated = bool(duplicates) and duplicates[0]["count"] >= self.conf["DUPLICATE_WARNING"]
+        if not (info or over_budget or repeated):
+            return
+
+        record = {
+            "view": view,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "wall_ms": round(wall_ms, 2),
+            "db_ms": round(db_ms, 2),
+            "queries": recorder.count,
+            "duplicate_queries": duplicates,
+        }
+        if info:
+            logger.info(json.dumps(record))
+        if repeated:
+            logger.warning(json.dumps({"event": "duplicate_queries", **record}))
+        if over_budget:
+            logger.warning(json.dumps({"event": "query_budget_exceeded", "budget": budget, **record}))
@@ -0,0 +1,50 @@
+"""
+Keyset pagination on (created_at, id).
+
+Lists that grow forever (responses, notifications) are paged by remembering
+the last row shown instead of an OFFSET, so page 500 costs the same single
+indexed range scan as page 1 and no COUNT(*) is needed. The querysets passed
+in must be ordered by ``("-created_at", "-id")``.
+"""
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(obj):
+    return f"{obj.created_at.isoformat()}_{obj.pk}"
+
+
+def decode_cursor(cursor):
+    created_at, _, pk = cursor.rpartition("_")
+    created_at = parse_datetime(created_at)
+    if created_at is None or not pk.isdigit():
+        raise ValueError("Malformed cursor")
+    return created_at, int(pk)
+
+
+def _after(queryset, cursor):
+    if not cursor:
+        return queryset
+    created_at, pk = decode_cursor(cursor)
+    return queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+
+def _page(rows, limit):
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
+
+
+def keyset_page(queryset, cursor, limit):
+    """
+    Return ``(rows, next_cursor)`` for the page after ``cursor`` (None for the
+    first page). ``next_cursor`` is None on the last page. Raises ValueError
+    for a malformed cursor.
+    """
+    return _page(list(_after(queryset, cursor)[:limit + 1]), limit)
+
+
+async def akeyset_page(queryset, cursor, limit):
+    """Async ``keyset_page``, for async views."""
+    return _page([row async for row in _after(queryset, cursor)[:limit + 1]], limit)
@@ -0,0 +1,34 @@
+"""
+SQLite query-plan checks.
+
+``query_plan`` runs ``EXPLAIN QUERY PLAN`` for a queryset and ``plan_problems``
+picks out the steps that mean an index is missing: a full table scan, or a
+temporary B-tree built to sort or group the rows. The regression tests run
+the hot queries of each view through both, so a changed queryset or a dropped
+index shows up as a failing test rather than as a slow page.
+"""
+from django.db import connections
+
+
+def query_plan(queryset):
+    """The ``detail`` column of ``EXPLAIN QUERY PLAN`` for ``queryset``, one string per step."""
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(plan, allowed_scans=(), allow_sort=False):
+    """
+    Steps of ``plan`` that scan a whole table or index or sort in a temp B-tree.
+
+    ``allowed_scans`` lists index names a scan may use, for partial indexes that
+    hold exactly the rows wanted; ``allow_sort`` accepts temp B-tree sorts.
+    """
+    problems = []
+    for step in plan:
+        if step.startswith("SCAN ") and not any(f" INDEX {name}" in step for name in allowed_scans):
+            problems.append(step)
+        elif step.startswith("USE TEMP B-TREE") and not allow_sort:
+            problems.append(step)
+    return problems
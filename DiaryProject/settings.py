@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+from DiaryProject.sqlite import apply_profile as apply_db_profile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'DiaryProject.instrumentation.QueryInstrumentationMiddleware',  # per-view timings and query counts
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -59,6 +61,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# A single backend: login() needs no backend= argument, and a failed login
+# checks the password once. Sessions created under the stock ModelBackend
+# are not recognised and their users sign in again once.
+AUTHENTICATION_BACKENDS = [
+    'users.backends.ProfileModelBackend',  # request.user comes with its userprofile in one query
+]
+
 ROOT_URLCONF = 'DiaryProject.urls'
 
 TEMPLATES = [
@@ -77,8 +86,14 @@ TEMPLATES = [
     },
 ]
 
+# Compile templates, URLconf and translations at process start (DiaryProject/warmup.py)
+TEMPLATE_WARMUP = True
+
 WSGI_APPLICATION = 'DiaryProject.wsgi.application'
 
+# Route the hot views to their async variants; asgi.py turns this on
+ASYNC_VIEWS = os.environ.get('DIARY_ASYNC_VIEWS', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -90,6 +105,10 @@ DATABASES = {
     }
 }
 
+# 'production' adds WAL, pragmas and persistent connections (DiaryProject/sqlite.py)
+DB_PROFILE = os.environ.get('DIARY_DB_PROFILE', 'development')
+apply_db_profile(DATABASES['default'], DB_PROFILE)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -170,3 +189,76 @@ CKEDITOR_UPLOAD_PATH = 'uploads/'
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
+
+# Warm headless-browser pool used for PDF and share-card rendering (diary/rendering.py)
+RENDER_POOL = {
+    'SIZE': 2,  # browsers kept warm per process
+    'QUEUE_SIZE': 8,  # renders allowed to wait before views answer 503
+    'MAX_RENDERS_PER_CONTEXT': 50,  # recycle the browser context after this many renders
+    'TIMEOUT': 30,  # seconds
+}
+
+# Per-view query budgets and timing (DiaryProject/instrumentation.py)
+PERF_INSTRUMENTATION = {
+    'ENABLED': True,
+    'WINDOW': 500,  # samples per view kept for the rolling histogram
+    'DEFAULT_BUDGET': 30,  # max queries per request before a warning is logged
+    'BUDGETS': {
+        'pages:home': 8,
+        'diary:fetch_responses': 6,
+        'diary:view_single_response': 8,
+        'diary:answer_question_set_shared': 25,  # first answer of the week also creates counter rows
+    },
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # one JSON line per request at INFO; budget and duplicate warnings at WARNING
+        'diary.perf': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERF_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# Disk cache for rendered PDFs, share cards and QR codes (diary/artifacts.py)
+RENDER_CACHE = {
+    'DIR': BASE_DIR / 'render_cache',
+    'MAX_BYTES': 256 * 1024 * 1024,  # least recently used files are evicted past this
+}
+
+# Notification compaction job (users/retention.py, manage.py compact_notifications)
+NOTIFICATION_RETENTION = {
+    'DAYS': 180,  # notifications older than this are deleted
+    'COALESCE_AFTER_DAYS': 1,  # a day's responses are folded into digests once it is this old
+    'BATCH_SIZE': 500,  # rows per transaction, keeps SQLite write locks short
+}
+
+# Per-process cache; point this at Redis or Memcached when running several
+# workers so that signal-based invalidation reaches all of them.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'deardiary',
+    }
+}
+
+# Home page caching (pages/caching.py)
+HOME_CACHE = {
+    'FRAGMENT_TIMEOUT': 300,  # carousel and leaderboard fragments, seconds
+    'PAGE_TIMEOUT': 60,  # whole page for anonymous visitors, seconds
+}
+
+# Live response and notification events over SSE (DiaryProject/events.py)
+LIVE_EVENTS = {
+    'BROKER': 'DiaryProject.events.InProcessBroker',  # swap for a cross-process broker with several ASGI workers
+    'QUEUE_SIZE': 100,  # events buffered per open stream
+    'KEEPALIVE': 15,  # seconds between keep-alive comments on an idle stream
+    'RETRY_MS': 5000,  # browser reconnect delay
+}
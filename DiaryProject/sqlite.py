@@ -0,0 +1,58 @@
+"""
+SQLite connection profiles.
+
+``settings.py`` applies one of ``PROFILES`` to ``DATABASES['default']``,
+chosen with the ``DIARY_DB_PROFILE`` environment variable:
+
+* ``development`` (default): Django's defaults, a new connection per request
+  in rollback-journal mode.
+* ``production``: persistent, health-checked connections, ``BEGIN IMMEDIATE``
+  transactions (so a writer waits for the lock up front instead of failing
+  when it upgrades a read lock) and the pragmas below, which put the database
+  in WAL mode so readers no longer block behind writers.
+
+The pragmas live under the database's ``PRAGMAS`` key and are run by
+``configure_connection``, which ``diary.apps`` connects to
+``connection_created``.
+"""
+import copy
+
+PROFILES = {
+    "development": {
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": False,
+        "OPTIONS": {},
+        "PRAGMAS": {},
+    },
+    "production": {
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+        "PRAGMAS": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",  # safe with WAL: only the last commits can be lost on power failure
+            "busy_timeout": 5000,  # ms to wait for a lock before "database is locked"
+            "cache_size": -20000,  # negative means KiB: 20 MB page cache per connection
+            "mmap_size": 134217728,  # 128 MB memory-mapped reads
+            "temp_store": "MEMORY",
+        },
+    },
+}
+
+
+def apply_profile(database, name):
+    """Update a DATABASES entry in place with profile ``name``; returns it."""
+    if name not in PROFILES:
+        raise ValueError(f"Unknown database profile {name!r}; expected one of {sorted(PROFILES)}")
+    profile = copy.deepcopy(PROFILES[name])
+    database.update(profile)
+    return database
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Run the database's PRAGMAS on every new SQLite connection."""
+    if connection.vendor != "sqlite":
+        return
+    # straight on the driver connection, so query counters and wrappers don't see them
+    for name, value in (connection.settings_dict.get("PRAGMAS") or {}).items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
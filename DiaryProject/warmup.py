@@ -0,0 +1,85 @@
+"""
+Template warm-up at process start.
+
+Django keeps compiled templates in its cached loader, but only after the first
+request that needs each one has read and parsed it from disk. ``wsgi.py`` and
+``asgi.py`` call ``warm_up()`` once the application is loaded, so every style
+template, the includes and the base templates are compiled before the first
+request arrives. The URLconf (which imports every view module) and the
+translation catalogs, the other two first-request costs, are loaded too.
+Turn it off with ``TEMPLATE_WARMUP = False``.
+"""
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+from django.urls import get_resolver
+from django.utils import translation
+
+logger = logging.getLogger("diary.perf")
+
+
+def _project_templates():
+    """Every template under the project-level template directories (base, header, includes...)."""
+    names = []
+    for engine in settings.TEMPLATES:
+        for directory in engine.get("DIRS", []):
+            root = Path(directory)
+            names += sorted(str(path.relative_to(root)) for path in root.rglob("*.html"))
+    return names
+
+
+def _style_templates():
+    """Every style template on disk plus whatever the registered styles point at."""
+    from diary import styles
+
+    diary_templates = Path(settings.BASE_DIR) / "diary" / "templates"
+    names = {str(path.relative_to(diary_templates)) for path in diary_templates.glob("diary/style_*.html")}
+    names.add(styles.style_template(None))
+    try:
+        names.update(styles.style_template(style) for style in styles.all_styles())
+    except DatabaseError:
+        # e.g. before the first migrate; the files on disk are still warmed
+        pass
+    return sorted(names)
+
+
+def template_names():
+    return _project_templates() + _style_templates()
+
+
+def warm_templates(names=None):
+    """
+    Compile ``names`` (default: ``template_names()``) into the cached loader.
+
+    Returns ``{name: milliseconds}`` for the templates that compiled; failures
+    are logged and skipped so a broken template never stops the process.
+    """
+    timings = {}
+    for name in template_names() if names is None else names:
+        start = time.perf_counter()
+        try:
+            get_template(name)
+        except (TemplateDoesNotExist, TemplateSyntaxError) as exc:
+            logger.warning("Template warm-up failed for %s: %s", name, exc)
+            continue
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+    return timings
+
+
+def warm_up():
+    """Process-start hook used by wsgi.py and asgi.py."""
+    if not getattr(settings, "TEMPLATE_WARMUP", True):
+        return
+    resolver = get_resolver()
+    for language, _name in settings.LANGUAGES:
+        with translation.override(language):
+            translation.gettext("Notifications")  # loads the catalog
+            resolver.reverse_dict  # imports the views and builds the per-language reverse map
+            resolver.namespace_dict
+            resolver.app_dict
+    warm_templates()
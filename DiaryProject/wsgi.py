@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DiaryProject.settings')
 
 application = get_wsgi_application()
+
+# compile the style, include and base templates before the first request
+from DiaryProject.warmup import warm_up  # noqa: E402
+
+warm_up()
@@ -1,4 +1,7 @@
 from django.contrib import admin
+from django.utils.translation import gettext_lazy as _
+from DiaryProject.admin_tools import LargeTableAdmin
+from . import search
 from .models import QuestionSet, Question, AnswerSession, Answer, QuestionSetStyle, NewsItem
 
 # Inline admin to manage Questions directly inside QuestionSet admin page
@@ -30,22 +33,37 @@ class AnswerInline(admin.TabularInline):
     model = Answer
     extra = 1
     fields = ['question', 'text']
+    raw_id_fields = ['question']
 
 # Admin for AnswerSession with inline answers and filtering
 @admin.register(AnswerSession)
-class AnswerSessionAdmin(admin.ModelAdmin):
+class AnswerSessionAdmin(LargeTableAdmin):
     list_display = ['respondent', 'question_set', 'created_at']
+    # QuestionSet.__str__ reads the owner
+    list_select_related = ['respondent', 'question_set__owner']
     list_filter = ['created_at']
-    search_fields = ['respondent__username', 'question_set__title']
+    # prefix match through user_username_nocase_idx instead of LIKE '%...%' over every session
+    search_fields = ['^respondent__username']
+    search_help_text = _("Respondent username, or the start of it.")
+    raw_id_fields = ['respondent', 'question_set']
     inlines = [AnswerInline]
-    ordering = ['-created_at']
+    # sessions are created in id order, and -pk needs no index besides the table itself
+    ordering = ['-pk']
 
 # Admin for Answer standalone (optional if inline is enough)
 @admin.register(Answer)
-class AnswerAdmin(admin.ModelAdmin):
+class AnswerAdmin(LargeTableAdmin):
     list_display = ['question', 'session', 'text']
-    search_fields = ['text', 'question__text']
-    ordering = ['session']
+    # Answer.__str__ is not used, but Session.__str__ reads the respondent
+    list_select_related = ['question', 'session__respondent']
+    search_fields = ['text', 'question_snapshot__text']
+    search_help_text = _("Whole words in the answer or its question; end a word with * to match a prefix.")
+    raw_id_fields = ['session', 'question', 'question_snapshot']
+    ordering = ['-pk']
+
+    def get_search_results(self, request, queryset, search_term):
+        # the full-text index (diary/search.py) instead of LIKE scans over every answer
+        return search.filter_matching(queryset, search_term), False
 
 @admin.register(QuestionSetStyle)
 class QuestionSetStyleAdmin(admin.ModelAdmin):
@@ -0,0 +1,236 @@
+# diary/analytics.py
+"""
+Per-question answer rollups (``QuestionStats``).
+
+``submit_answers`` calls ``record_answers`` with the answers it bulk-creates,
+and ``diary.signals`` covers answers saved one at a time (e.g. the admin).
+Every question gets its stats row when it is created, so recording a
+submission is one UPDATE of the rows of all its questions, with no read and
+no row lock held beyond that statement. It adds to the counters and, on
+SQLite, merges the new term counts and excerpts into the JSON columns with
+JSON1 functions in the same statement. Other databases leave those two
+columns to ``rebuild``.
+
+Deletes are handled by the ``diary_answer_stats_delete`` trigger (migration
+0015): it takes each deleted answer off its question's counters and drops
+its session from the recent answers, however the delete happened (a
+session or user cascade, a queryset, the admin), without Django loading the
+answers to send a signal per row. Term counts are not decremented and can
+run high after deletes, and only the ``TRACKED_TERMS`` most used terms of a
+question are kept, so counts near the cut-off can drift low. ``rebuild``
+recounts everything exactly (``manage.py rebuild_question_stats``) and also
+picks up edits to existing answers, which are not tracked incrementally.
+"""
+import json
+import re
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from itertools import chain
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, JSONField, Q, Sum, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from .models import Answer, Question, QuestionStats
+
+TRACKED_TERMS = 100
+RECENT_ANSWERS = 5
+EXCERPT_LENGTH = 200
+REBUILD_BATCH_SIZE = 2000
+
+# SQLite JSON1 merges of the JSON columns, done in the counters' UPDATE: add
+# the new term counts and keep the most used, and put the new excerpts (newest
+# first) in front of the old ones
+MERGE_TERMS = """(
+    SELECT json_group_object(key, n) FROM (
+        SELECT key, sum(value) AS n FROM (
+            SELECT key, value FROM json_each({column})
+            UNION ALL SELECT key, value FROM json_each(%s)
+        ) GROUP BY key ORDER BY n DESC, key LIMIT {limit}
+    )
+)"""
+PREPEND_ANSWERS = """(
+    SELECT json_group_array(json(value)) FROM (
+        SELECT value FROM (
+            SELECT 0 AS part, key, value FROM json_each(%s)
+            UNION ALL SELECT 1, key, value FROM json_each({column})
+        ) ORDER BY part, key LIMIT {limit}
+    )
+)"""
+
+_WORD = re.compile(r"[^\W\d_]{3,}", re.UNICODE)
+STOPWORDS = frozenset("""
+    about after again all also and any are because been before but can could did does
+    doing don for from had has have her here hers him his how into its just more most
+    not now off once only other our out over own same she should some such than that
+    the their them then there these they this those through too under until very was
+    were what when where which while who why will with would you your yours
+""".split())
+
+
+def answer_terms(text):
+    """The distinct terms of an answer: lowercase words of 3+ letters, stopwords dropped."""
+    return {word for word in _WORD.findall(text.lower()) if word not in STOPWORDS}
+
+
+def length_bucket(length):
+    return bisect_right(QuestionStats.LENGTH_BUCKETS, length)
+
+
+def _excerpt(answer, session):
+    return {
+        "session": session.pk,
+        "respondent": session.respondent.username if session.respondent_id else None,
+        "created_at": session.created_at.isoformat(),
+        "text": answer.text[:EXCERPT_LENGTH],
+    }
+
+
+def _merge_sql(template, column, limit):
+    table = connection.ops.quote_name(QuestionStats._meta.db_table)
+    return template.format(column=f"{table}.{connection.ops.quote_name(column)}", limit=limit)
+
+
+def _merged(template, column, limit, by_question):
+    """A CASE giving each question's ``column`` merged, by ``template``, with its JSON value in ``by_question``."""
+    sql = _merge_sql(template, column, limit)
+    return Case(
+        *(
+            When(question_id=question_id, then=RawSQL(sql, (json.dumps(value),)))
+            for question_id, value in by_question.items()
+        ),
+        default=F(column),
+        output_field=JSONField(),
+    )
+
+
+def _add_answers(by_question, session):
+    """One UPDATE adding ``by_question``'s answers to their rows; returns the number of rows updated."""
+    deltas = defaultdict(dict)
+    for question_id, answers in by_question.items():
+        deltas["response_count"][question_id] = len(answers)
+        deltas["total_length"][question_id] = sum(len(answer.text) for answer in answers)
+        for answer in answers:
+            field = QuestionStats.LENGTH_BUCKET_FIELDS[length_bucket(len(answer.text))]
+            deltas[field][question_id] = deltas[field].get(question_id, 0) + 1
+    fields = {
+        field: F(field) + Case(
+            *(When(question_id=question_id, then=Value(n)) for question_id, n in per_question.items()),
+            default=Value(0),
+        )
+        for field, per_question in deltas.items()
+    }
+    if connection.vendor == "sqlite":
+        terms = {
+            question_id: Counter(chain.from_iterable(answer_terms(answer.text) for answer in answers))
+            for question_id, answers in by_question.items()
+        }
+        excerpts = {
+            question_id: [_excerpt(answer, session) for answer in reversed(answers)]
+            for question_id, answers in by_question.items()
+        }
+        fields["term_counts"] = _merged(MERGE_TERMS, "term_counts", TRACKED_TERMS, terms)
+        fields["recent_answers"] = _merged(PREPEND_ANSWERS, "recent_answers", RECENT_ANSWERS, excerpts)
+    return QuestionStats.objects.filter(question_id__in=by_question).update(updated_at=timezone.now(), **fields)
+
+
+def create_stats(question_ids):
+    """Give the questions their (empty) stats rows, if they have none yet."""
+    QuestionStats.objects.bulk_create(
+        [QuestionStats(question_id=question_id) for question_id in question_ids], ignore_conflicts=True,
+    )
+
+
+def record_answers(answers, session):
+    """Add ``answers``, all from ``session``, to their questions' rollups."""
+    by_question = defaultdict(list)
+    for answer in answers:
+        if answer.question_id is not None:
+            by_question[answer.question_id].append(answer)
+    if not by_question:
+        return
+
+    if _add_answers(by_question, session) < len(by_question):
+        # questions from before their rows were created up front, or bulk-created ones
+        existing = set(QuestionStats.objects.filter(question_id__in=by_question).values_list("question_id", flat=True))
+        missing = {qid: question_answers for qid, question_answers in by_question.items() if qid not in existing}
+        create_stats(missing)
+        _add_answers(missing, session)
+
+
+@transaction.atomic
+def rebuild(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recompute every question's rollup from the answers table.
+
+    Counts, lengths and the histogram come from one grouped query, with the
+    bucketing done by the database. Terms and recent answers come from a
+    single pass over the answers ordered by question, newest first, fetched
+    ``batch_size`` rows at a time; each batch's terms are counted with one
+    Counter.update over all of its answers rather than answer by answer.
+    Questions without answers get an empty row, which ``record_answers``
+    expects to find. Returns the number of questions with answers.
+    """
+    answers = Answer.objects.filter(question__isnull=False)
+    bounds = (0,) + QuestionStats.LENGTH_BUCKETS + (None,)
+    buckets = {
+        field: Count("id", filter=Q(length__gte=low, length__lt=high) if high else Q(length__gte=low))
+        for field, low, high in zip(QuestionStats.LENGTH_BUCKET_FIELDS, bounds, bounds[1:])
+    }
+
+    stats = {}
+    totals = (
+        answers.annotate(length=Length("text")).values("question_id")
+        .annotate(response_count=Count("id"), total_length=Sum("length"), **buckets)
+        .order_by()
+    )
+    for row in totals:
+        stats[row["question_id"]] = QuestionStats(
+            question_id=row["question_id"],
+            response_count=row["response_count"],
+            total_length=row["total_length"] or 0,
+            **{field: row[field] for field in buckets},
+        )
+
+    rows = (
+        answers.order_by("question_id", "-session__created_at", "-id")
+        .values_list("question_id", "text", "session_id", "session__created_at", "session__respondent__username")
+        .iterator(chunk_size=batch_size)
+    )
+    terms = defaultdict(Counter)
+    batch = []
+
+    def count_batch():
+        grouped = defaultdict(list)
+        for question_id, text in batch:
+            grouped[question_id].append(text)
+        for question_id, texts in grouped.items():
+            terms[question_id].update(chain.from_iterable(map(answer_terms, texts)))
+        batch.clear()
+
+    for question_id, text, session_id, created_at, respondent in rows:
+        recent = stats[question_id].recent_answers
+        if len(recent) < RECENT_ANSWERS:
+            recent.append({
+                "session": session_id,
+                "respondent": respondent,
+                "created_at": created_at.isoformat(),
+                "text": text[:EXCERPT_LENGTH],
+            })
+        batch.append((question_id, text))
+        if len(batch) >= batch_size:
+            count_batch()
+    count_batch()
+
+    for question_id, counter in terms.items():
+        stats[question_id].term_counts = dict(counter.most_common(TRACKED_TERMS))
+    answered = len(stats)
+    for question_id in Question.objects.values_list("id", flat=True).iterator(chunk_size=batch_size):
+        if question_id not in stats:
+            stats[question_id] = QuestionStats(question_id=question_id)
+
+    QuestionStats.objects.all().delete()
+    QuestionStats.objects.bulk_create(stats.values(), batch_size=500)
+    return answered
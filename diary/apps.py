@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class DiaryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'diary'
+
+    def ready(self):
+        import diary.signals
+        from django.db.backends.signals import connection_created
+        from DiaryProject.sqlite import configure_connection
+        connection_created.connect(configure_connection, dispatch_uid="diary_sqlite_pragmas")
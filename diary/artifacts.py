@@ -0,0 +1,156 @@
+# diary/artifacts.py
+"""
+Disk-backed, content-addressed store for rendered artifacts.
+
+Every artifact is filed under ``<namespace>/<scope>/<name>`` where the name
+embeds a sha256 of everything that went into rendering it, so a changed
+answer, question or title produces a new key on its own. The signal
+handlers in ``diary.signals`` also drop a session's PDFs when one of its
+answers is saved and a set's share cards when the set changes, one
+directory each; anything else stale ages out through eviction. Reads
+refresh the file's mtime, and writes evict the least recently used files
+once the store grows past ``RENDER_CACHE['MAX_BYTES']``.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+DEFAULT_CACHE_SETTINGS = {
+    "DIR": Path(settings.BASE_DIR) / "render_cache",
+    "MAX_BYTES": 256 * 1024 * 1024,
+}
+
+
+def make_key(*parts):
+    """Return a stable sha256 hex digest for the given inputs."""
+    payload = json.dumps(parts, default=str, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ArtifactStore:
+    """
+    Files under ``root``, read and written whole.
+
+    ``get``/``get_or_create`` return the bytes rather than a path: a path
+    handed back to a view could be deleted by a concurrent ``invalidate`` or
+    ``evict`` before the view opened it. The store keeps a running total of
+    its size, taken from one walk of the tree on the first write and then
+    adjusted by every put and invalidate, so a write only walks the tree
+    again when the total crosses ``max_bytes``. Eviction then deletes the
+    oldest files down to ``EVICT_TO`` of the limit, and its walk resets the
+    total, which also corrects for files written or removed by other
+    processes sharing the directory.
+    """
+    EVICT_TO = 0.9
+
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None
+
+    def path_for(self, namespace, scope, name):
+        return self.root / namespace / str(scope) / name
+
+    def get(self, namespace, scope, name):
+        """Return the artifact's bytes if present, marking it as recently used."""
+        path = self.path_for(namespace, scope, name)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass  # invalidated or evicted since; the bytes are still good for this request
+        return data
+
+    def put(self, namespace, scope, name, data):
+        """Atomically write ``data`` and return it."""
+        path = self.path_for(namespace, scope, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            try:
+                replaced = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _path, size, _mtime in self._files())
+            else:
+                self._size += len(data) - replaced
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+        return data
+
+    def get_or_create(self, namespace, scope, name, producer):
+        """Return the artifact's bytes, calling ``producer()`` for them on a miss."""
+        data = self.get(namespace, scope, name)
+        if data is None:
+            data = self.put(namespace, scope, name, producer())
+        return data
+
+    def invalidate(self, namespace, scope):
+        """Drop every artifact filed under ``namespace/scope``."""
+        directory = self.root / namespace / str(scope)
+        removed = sum(size for _path, size, _mtime in self._files(directory))
+        shutil.rmtree(directory, ignore_errors=True)
+        with self._lock:
+            if self._size is not None:
+                self._size = max(self._size - removed, 0)
+
+    def _files(self, top=None):
+        for dirpath, _dirnames, filenames in os.walk(top or self.root):
+            for filename in filenames:
+                if filename.startswith(".tmp-"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def evict(self):
+        """Delete least recently used files until the store fits ``EVICT_TO`` of ``max_bytes``."""
+        with self._lock:
+            files = list(self._files())
+            total = sum(size for _path, size, _mtime in files)
+            if total > self.max_bytes:
+                target = self.max_bytes * self.EVICT_TO
+                for path, size, _mtime in sorted(files, key=lambda f: f[2]):
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    if total <= target:
+                        break
+            self._size = total
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        conf = dict(DEFAULT_CACHE_SETTINGS)
+        conf.update(getattr(settings, "RENDER_CACHE", {}))
+        _store = ArtifactStore(conf["DIR"], conf["MAX_BYTES"])
+    return _store
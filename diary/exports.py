@@ -0,0 +1,95 @@
+# diary/exports.py
+"""
+Streaming exports of every response to a question set.
+
+Sessions are read with ``QuerySet.iterator(chunk_size=...)`` and their answers
+are prefetched one chunk at a time, so memory stays flat no matter how many
+responses a set has. Both formats yield text lines suitable for a
+``StreamingHttpResponse`` or for writing straight to a file.
+"""
+import csv
+import json
+
+from django.db.models import Prefetch
+
+from .models import Answer
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+DEFAULT_CHUNK_SIZE = 500
+
+
+class Echo:
+    """File-like object whose write() just returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _iter_sessions(question_set, chunk_size):
+    return (
+        question_set.answer_sessions.select_related("respondent")
+        .prefetch_related(Prefetch("answers", queryset=Answer.objects.select_related("question_snapshot").order_by("id")))
+        .order_by("created_at", "id")
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def _respondent_name(session):
+    return session.respondent.username if session.respondent else "Anonymous"
+
+
+def iter_csv(question_set, chunk_size=DEFAULT_CHUNK_SIZE):
+    """One header row, then one row per session with one column per question."""
+    questions = list(question_set.questions.order_by("order", "id").values_list("id", "text"))
+    # Answers to deleted questions only survive as snapshots; give them their own columns
+    orphaned = list(
+        Answer.objects.filter(session__question_set=question_set, question__isnull=True)
+        .values_list("question_snapshot_id", "question_snapshot__text")
+        .distinct()
+        .order_by("question_snapshot__text")
+    )
+
+    writer = csv.writer(Echo())
+    yield writer.writerow(
+        ["session_id", "respondent", "submitted_at"]
+        + [text for _pk, text in questions]
+        + [text or "" for _pk, text in orphaned]
+    )
+    for session in _iter_sessions(question_set, chunk_size):
+        by_question = {}
+        by_snapshot = {}
+        for answer in session.answers.all():
+            if answer.question_id is None:
+                by_snapshot[answer.question_snapshot_id] = answer.text
+            else:
+                by_question[answer.question_id] = answer.text
+        yield writer.writerow(
+            [session.id, _respondent_name(session), session.created_at.isoformat()]
+            + [by_question.get(pk, "") for pk, _text in questions]
+            + [by_snapshot.get(pk, "") for pk, _text in orphaned]
+        )
+
+
+def iter_ndjson(question_set, chunk_size=DEFAULT_CHUNK_SIZE):
+    """One JSON object per session, newline separated."""
+    for session in _iter_sessions(question_set, chunk_size):
+        yield json.dumps({
+            "session_id": session.id,
+            "respondent": _respondent_name(session),
+            "submitted_at": session.created_at.isoformat(),
+            "answers": [
+                {"question_id": a.question_id, "question": a.question_text, "answer": a.text}
+                for a in session.answers.all()
+            ],
+        }, ensure_ascii=False) + "\n"
+
+
+def iter_export(question_set, fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+    if fmt == "csv":
+        return iter_csv(question_set, chunk_size)
+    if fmt == "ndjson":
+        return iter_ndjson(question_set, chunk_size)
+    raise ValueError(f"Unknown export format: {fmt}")
@@ -1,6 +1,7 @@
 # diary/forms.py
 from django import forms
-from .models import QuestionSet, Question, QuestionSetStyle
+from .models import QuestionSet, Question
+from .styles import all_styles
 
 
 # forms.py
@@ -16,13 +17,13 @@ class QuestionSetCreateForm(forms.ModelForm):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
 
-        # Filter styles based on user plan
-        if user and user.userprofile.plan == 'free':
-            self.fields['style'].queryset = QuestionSetStyle.objects.all()
-            self.fields['style'].widget.choices = [
-                (style.pk, f"{style.name} (Premium)" if style.is_premium else style.name)
-                for style in QuestionSetStyle.objects.all()
-            ]
+        # Choices come from the style registry; free users see which styles are Premium
+        free = bool(user) and user.userprofile.plan == 'free'
+        field = self.fields['style']
+        field.choices = ([('', field.empty_label)] if field.empty_label is not None else []) + [
+            (style.pk, f"{style.name} (Premium)" if free and style.is_premium else style.name)
+            for style in all_styles()
+        ]
 
 
 class QuestionCreateForm(forms.ModelForm):
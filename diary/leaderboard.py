@@ -0,0 +1,100 @@
+# diary/leaderboard.py
+"""
+Incrementally maintained leaderboard of users by responses received.
+
+``diary.signals`` calls ``record_session`` whenever an AnswerSession is created
+or deleted, which bumps the owner's all-time row and the row for the week the
+session belongs to. The home page then only reads the top rows of one period
+through the (period, -response_count) index.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import AnswerSession, LeaderboardEntry
+
+
+def week_period(dt=None):
+    """Return the period key (Monday's ISO date) for the week containing ``dt``."""
+    day = timezone.localdate(dt) if dt else timezone.localdate()
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def period_start(period):
+    """Return the aware datetime at which a weekly period begins."""
+    return timezone.make_aware(datetime.combine(date.fromisoformat(period), time.min))
+
+
+def _bump(user_id, period, delta):
+    if not delta:
+        return
+    entries = LeaderboardEntry.objects.filter(user_id=user_id, period=period)
+    updated = entries.update(response_count=Greatest(F("response_count") + delta, Value(0)))
+    if updated or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            LeaderboardEntry.objects.create(user_id=user_id, period=period, response_count=delta)
+    except IntegrityError:
+        # another request created the row first
+        entries.update(response_count=F("response_count") + delta)
+
+
+def record_sessions(owner_id, created_at, delta):
+    """Add ``delta`` responses received by ``owner_id`` at ``created_at``."""
+    if owner_id is None:
+        return
+    _bump(owner_id, LeaderboardEntry.ALL_TIME, delta)
+    _bump(owner_id, week_period(created_at), delta)
+
+
+def record_session(session, delta=1):
+    if session.question_set_id is None:
+        return
+    record_sessions(session.question_set.owner_id, session.created_at, delta)
+
+
+def forget_question_set(question_set):
+    """Take a deleted set's sessions off its owner's all-time and current-week rows."""
+    sessions = question_set.answer_sessions.all()
+    current_week = week_period()
+    _bump(question_set.owner_id, LeaderboardEntry.ALL_TIME, -sessions.count())
+    _bump(question_set.owner_id, current_week,
+          -sessions.filter(created_at__gte=period_start(current_week)).count())
+
+
+def top_entries(period=LeaderboardEntry.ALL_TIME, limit=5):
+    """The top ``limit`` rows of ``period`` as a lazy queryset."""
+    return (
+        LeaderboardEntry.objects.filter(period=period, response_count__gt=0)
+        .select_related("user")
+        .order_by("-response_count", "user_id")[:limit]
+    )
+
+
+@transaction.atomic
+def rebuild():
+    """
+    Recompute the all-time and current-week rows from AnswerSession.
+
+    Rows for past weeks are dropped, since nothing reads them.
+    Returns the number of rows written.
+    """
+    current_week = week_period()
+    sessions = AnswerSession.objects.filter(question_set__isnull=False)
+    totals = {
+        LeaderboardEntry.ALL_TIME: sessions,
+        current_week: sessions.filter(created_at__gte=period_start(current_week)),
+    }
+
+    LeaderboardEntry.objects.all().delete()
+    rows = [
+        LeaderboardEntry(user_id=row["owner"], period=period, response_count=row["count"])
+        for period, qs in totals.items()
+        for row in qs.values(owner=F("question_set__owner")).annotate(count=Count("id")).order_by()
+    ]
+    LeaderboardEntry.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
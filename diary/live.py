@@ -0,0 +1,30 @@
+# diary/live.py
+"""
+Response payloads shared by ``fetch_responses`` and the live event stream.
+
+A new response is pushed to its question set's owner as a ``response`` event
+carrying the same object ``fetch_responses`` lists, cursor included, so the
+popup can prepend it to the newest page without downloading the page again.
+"""
+from DiaryProject import events
+from DiaryProject.pagination import encode_cursor
+
+
+def session_payload(session, answers):
+    """``session`` with question_set and respondent loaded; ``answers`` in display order."""
+    return {
+        "id": session.id,
+        "question_set_id": session.question_set.id,
+        "question_set_title": session.question_set.title,
+        "respondent": session.respondent.username if session.respondent else "Anonymous",
+        "submitted_at": session.created_at.strftime("%b %d, %Y %H:%M"),
+        "cursor": encode_cursor(session),
+        "answers": [
+            {"question": a.question_text, "answer": a.text} for a in answers
+        ],
+    }
+
+
+def publish_response(session, answers):
+    """Push a committed response to its owner's open streams."""
+    events.publish(session.question_set.owner_id, "response", session_payload(session, answers))
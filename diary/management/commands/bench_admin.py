@@ -0,0 +1,131 @@
+import json
+import logging
+import statistics
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.contrib import admin
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from diary.models import Answer, AnswerSession
+from users.models import Notification, UserProfile
+
+User = get_user_model()
+
+# the admin options these tables had before, for comparison
+LEGACY = {
+    Answer: {
+        "search_fields": ["text", "question__text"],
+        "ordering": ["session"],
+    },
+    AnswerSession: {
+        "search_fields": ["respondent__username", "question_set__title"],
+        "ordering": ["-created_at"],
+    },
+    Notification: {
+        "search_fields": ("user__username", "actor__username", "message"),
+        "ordering": ("-created_at",),
+    },
+    UserProfile: {
+        "search_fields": ("user__username", "user__name", "user__surname"),
+    },
+}
+
+
+@contextmanager
+def legacy_admin(model_admin):
+    """Shadow the current options of ``model_admin`` with the stock and pre-change ones."""
+    overrides = {
+        "list_select_related": False,
+        "paginator": Paginator,
+        "show_full_result_count": True,
+        "raw_id_fields": (),
+        # the plain LIKE search, in case the admin overrides it
+        "get_search_results": admin.ModelAdmin.get_search_results.__get__(model_admin),
+        **LEGACY[model_admin.model],
+    }
+    for name, value in overrides.items():
+        setattr(model_admin, name, value)
+    try:
+        yield
+    finally:
+        for name in overrides:
+            del model_admin.__dict__[name]
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the admin changelists of the large tables (answers, sessions, notifications, '
+        'profiles) with their current options and with the previous ones. Run it against a '
+        'database filled by seed_data, e.g. --users 1000 --sessions-per-set 100 for 1M answers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--modes', default='legacy,current')
+        parser.add_argument('--word', default='coffee', help='Answer search term')
+        parser.add_argument('--username', default='seed-12', help='Username prefix to search for')
+
+    def _time(self, client, url, params, repeat):
+        timings, queries, status = [], 0, None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url, params)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries, status = len(captured.captured_queries), response.status_code
+        return statistics.median(timings), queries, status
+
+    def handle(self, *args, **options):
+        if not Answer.objects.exists():
+            raise CommandError("No answers to benchmark against; run seed_data first.")
+
+        self.stdout.write(", ".join(
+            f"{model.objects.count()} {model._meta.verbose_name_plural}"
+            for model in (Answer, AnswerSession, Notification, UserProfile)
+        ))
+        # per-request log lines would be part of what is measured
+        logging.getLogger("diary.perf").setLevel(logging.CRITICAL)
+        tag = uuid.uuid4().hex[:8]
+        superuser = User.objects.create_superuser(username=f"bench-admin-{tag}", password=tag, email="")
+        client = Client(HTTP_HOST="localhost")
+        client.force_login(superuser)
+
+        cases = []
+        for model in (Answer, AnswerSession, Notification, UserProfile):
+            url = reverse(f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist")
+            search = options['word'] if model is Answer else options['username']
+            cases += [
+                (model, "page 1", url, {}),
+                (model, "page 50", url, {"p": 50}),
+                (model, f"search {search!r}", url, {"q": search}),
+            ]
+
+        rows = []
+        try:
+            for mode in options['modes'].split(','):
+                for model, label, url, params in cases:
+                    model_admin = site._registry[model]
+                    if mode == "legacy":
+                        with legacy_admin(model_admin):
+                            ms, queries, status = self._time(client, url, params, options['repeat'])
+                    else:
+                        ms, queries, status = self._time(client, url, params, options['repeat'])
+                    rows.append({
+                        "mode": mode, "model": model._meta.model_name, "case": label,
+                        "ms": round(ms, 1), "queries": queries, "status": status,
+                    })
+                    self.stdout.write(
+                        f"{mode:<8} {model._meta.model_name:<14} {label:<22} {ms:>9.1f} ms {queries:>5} queries"
+                    )
+        finally:
+            superuser.delete()
+        self.stdout.write(json.dumps(rows))
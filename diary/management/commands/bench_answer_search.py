@@ -0,0 +1,122 @@
+import random
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from diary.models import QuestionSet, AnswerSession, Answer
+from diary.search import like_search, optimize_index, search_answers
+from diary.snapshots import intern
+
+User = get_user_model()
+
+WORDS = (
+    "morning coffee friends music summer winter travel family school dream "
+    "movie book football ocean mountain city garden pizza birthday holiday "
+    "rain sunshine weekend laughter secret favourite memory adventure song "
+    "teacher brother sister kitchen library village river forest island"
+).split()
+RARE_WORD = "zanzibar"
+
+
+def _timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)[len(timings) // 2], result
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with generated answers (kept in the FTS index by its triggers), then '
+        'time the FTS5 search against the LIKE scan it replaces. Run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--answers', type=int, default=1_000_000)
+        parser.add_argument('--owners', type=int, default=200)
+        parser.add_argument('--answers-per-session', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--keep', action='store_true', help='Leave the generated rows in place')
+
+    def _fill(self, tag, options):
+        rng = random.Random(tag)
+        owners = User.objects.bulk_create([
+            User(username=f"bench-search-{tag}-{i}") for i in range(options['owners'])
+        ])
+        sets = QuestionSet.objects.bulk_create([
+            QuestionSet(owner=owner, title=f"Search bench {tag} {i}", slug=f"search-bench-{tag}-{i}")
+            for i, owner in enumerate(owners)
+        ])
+        per_session = options['answers_per_session']
+        snapshots = intern(f"Question {n} about {word}" for n in range(per_session) for word in WORDS)
+        question_texts = [[snapshots[f"Question {n} about {word}"] for word in WORDS] for n in range(per_session)]
+        sessions_needed = -(-options['answers'] // per_session)
+        created = 0
+        start = time.perf_counter()
+        while created < options['answers']:
+            with transaction.atomic():
+                batch = min(1000, sessions_needed)
+                sessions = AnswerSession.objects.bulk_create([
+                    AnswerSession(question_set=rng.choice(sets)) for _ in range(batch)
+                ])
+                answers = []
+                for session in sessions:
+                    for n in range(per_session):
+                        if created + len(answers) >= options['answers']:
+                            break
+                        text = " ".join(rng.choices(WORDS, k=12))
+                        if rng.random() < 0.001:
+                            text += f" {RARE_WORD}"
+                        answers.append(Answer(session=session, question_snapshot=rng.choice(question_texts[n]), text=text))
+                Answer.objects.bulk_create(answers, batch_size=5000)
+                created += len(answers)
+        return owners, created, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        self.stdout.write(f"Generating {options['answers']} answers...")
+        owners, created, elapsed = self._fill(tag, options)
+        self.stdout.write(f"Inserted {created} answers in {elapsed:.1f}s ({created / elapsed:.0f}/s with the FTS triggers)")
+        start = time.perf_counter()
+        optimize_index()
+        self.stdout.write(f"Optimized the index in {time.perf_counter() - start:.1f}s")
+
+        owner = owners[0]
+        repeat = options['repeat']
+        cases = [
+            (f"owner, common word ({WORDS[0]})", WORDS[0]),
+            (f"owner, rare word ({RARE_WORD})", RARE_WORD),
+            ("owner, two words", f"{WORDS[1]} {WORDS[2]}"),
+            (f"owner, prefix ({WORDS[0][:4]}*)", f"{WORDS[0][:4]}*"),
+        ]
+        try:
+            self.stdout.write(f"{'query':<36} {'FTS5 ms':>9} {'LIKE ms':>9}")
+            for label, query in cases:
+                fts_ms, _ = _timed(lambda: search_answers(owner, query), repeat)
+                like_ms, _ = _timed(lambda: like_search(owner, query), repeat)
+                self.stdout.write(f"{label:<36} {fts_ms:>9.1f} {like_ms:>9.1f}")
+
+            # what the admin search did: a LIKE over every answer, no owner filter
+            def global_like():
+                return list(Answer.objects.filter(text__icontains=RARE_WORD).values_list("id", flat=True)[:20])
+
+            def global_fts():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT rowid FROM diary_answer_fts WHERE diary_answer_fts MATCH %s LIMIT 20",
+                        [f'text:"{RARE_WORD}"'],
+                    )
+                    return cursor.fetchall()
+
+            fts_ms, _ = _timed(global_fts, repeat)
+            like_ms, _ = _timed(global_like, repeat)
+            self.stdout.write(f"{'all owners, rare word':<36} {fts_ms:>9.1f} {like_ms:>9.1f}")
+        finally:
+            if not options['keep']:
+                AnswerSession.objects.filter(question_set__owner__in=owners).delete()
+                User.objects.filter(pk__in=[o.pk for o in owners]).delete()
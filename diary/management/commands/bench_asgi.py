@@ -0,0 +1,210 @@
+import asyncio
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from DiaryProject.warmup import warm_up
+from users import quota
+
+User = get_user_model()
+
+MODES = {
+    # mode -> DIARY_ASYNC_VIEWS for the worker process
+    "wsgi": "0",
+    "asgi": "1",
+}
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def _environ(path, cookie):
+    path, _, query = path.partition("?")
+    return {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SCRIPT_NAME": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "localhost",
+        "HTTP_COOKIE": cookie,
+        "wsgi.input": io.BytesIO(b""),
+        "wsgi.errors": sys.stderr,
+        "wsgi.url_scheme": "http",
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+        "wsgi.version": (1, 0),
+    }
+
+
+def _run_wsgi(requests, concurrency):
+    """Like a threaded WSGI server: ``concurrency`` threads, each handling one request at a time."""
+    handler = WSGIHandler()
+
+    def call(item):
+        path, cookie = item
+        statuses = []
+        start = time.perf_counter()
+        response = handler(_environ(path, cookie), lambda status, headers, exc_info=None: statuses.append(status))
+        b"".join(response)
+        response.close()  # request_finished: closes the thread's connection like a server would
+        return (time.perf_counter() - start) * 1000, int(statuses[0][:3])
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(call, requests))
+
+
+async def _run_asgi(requests, concurrency):
+    """Like an ASGI server: one event loop, at most ``concurrency`` requests in flight."""
+    handler = ASGIHandler()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def call(path, cookie):
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": query.encode(), "root_path": "",
+            "headers": [(b"host", b"localhost"), (b"cookie", cookie.encode())],
+            "server": ("localhost", 80), "client": ("127.0.0.1", 0),
+        }
+        finished = asyncio.Event()
+        received = False
+        statuses = []
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        async with slots:
+            start = time.perf_counter()
+            await handler(scope, receive, send)
+            elapsed = (time.perf_counter() - start) * 1000
+        finished.set()
+        return elapsed, statuses[0]
+
+    return await asyncio.gather(*(call(path, cookie) for path, cookie in requests))
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the hot views through Django\'s WSGI handler (sync views, a thread per '
+        'request in flight) and its ASGI handler (the async variants on one event loop). '
+        'Each mode runs in its own process with DIARY_ASYNC_VIEWS set accordingly. Run it '
+        'against a database filled by seed_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help='Requests per mode')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--modes', default='wsgi,asgi', help=f'Comma separated, from: {", ".join(MODES)}')
+        parser.add_argument('--worker', choices=MODES, help='Internal: run one mode in this process')
+        parser.add_argument('--plan', help='Internal: JSON list of [path, cookie] pairs for --worker')
+
+    def _cookie(self, user):
+        client = Client(HTTP_HOST="localhost")
+        client.force_login(user)
+        return f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    def _plan(self):
+        owner = (
+            User.objects.annotate(sessions=Count('question_sets__answer_sessions'))
+            .filter(sessions__gt=0).order_by('-sessions').first()
+        )
+        if owner is None:
+            raise CommandError("No responses to benchmark against; run seed_data first.")
+        respondent = User.objects.exclude(pk=owner.pk).first()
+        if respondent is None:
+            raise CommandError("Need at least two users; run seed_data first.")
+        quota.reset_answers([respondent])
+        question_set = owner.question_sets.first()
+        owner_cookie, respondent_cookie = self._cookie(owner), self._cookie(respondent)
+        return [
+            [reverse("pages:home"), owner_cookie],
+            [reverse("users:profile"), owner_cookie],
+            [reverse("diary:fetch_responses"), owner_cookie],
+            [reverse("diary:answer_question_set_shared", args=[question_set.share_uuid]), respondent_cookie],
+        ]
+
+    def _work(self, mode, plan, total, concurrency):
+        # per-request log lines would be part of what is measured
+        logging.getLogger("diary.perf").setLevel(logging.CRITICAL)
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+        warm_up()
+        requests = [tuple(plan[i % len(plan)]) for i in range(total)]
+        run = _run_wsgi if mode == "wsgi" else lambda r, c: asyncio.run(_run_asgi(r, c))
+        run([tuple(item) for item in plan], 1)  # first-request costs (sessions, registries)
+
+        start = time.perf_counter()
+        results = run(requests, concurrency)
+        elapsed = time.perf_counter() - start
+
+        timings = [ms for ms, _status in results]
+        statuses = sorted({status for _ms, status in results})
+        per_path = {}
+        for (path, _cookie), (ms, _status) in zip(requests, results):
+            per_path.setdefault(path, []).append(ms)
+        return {
+            "mode": mode,
+            "requests": total,
+            "concurrency": concurrency,
+            "req_per_s": round(total / elapsed, 1),
+            "p50_ms": round(_percentile(timings, 50), 1),
+            "p95_ms": round(_percentile(timings, 95), 1),
+            "statuses": statuses,
+            "p95_ms_by_path": {path: round(_percentile(ms, 95), 1) for path, ms in per_path.items()},
+        }
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            report = self._work(options['worker'], json.loads(options['plan']),
+                                options['requests'], options['concurrency'])
+            self.stdout.write(json.dumps(report))
+            return
+
+        modes = [name.strip() for name in options['modes'].split(',')]
+        for name in modes:
+            if name not in MODES:
+                raise CommandError(f"Unknown mode {name!r}")
+        plan = json.dumps(self._plan())
+
+        reports = []
+        for mode in modes:
+            env = dict(os.environ, DIARY_ASYNC_VIEWS=MODES[mode])
+            result = subprocess.run(
+                [sys.executable, os.path.join(settings.BASE_DIR, "manage.py"), "bench_asgi",
+                 "--worker", mode, "--plan", plan, "--skip-checks",
+                 "--requests", str(options['requests']), "--concurrency", str(options['concurrency'])],
+                env=env, capture_output=True, text=True,
+            )
+            if result.returncode:
+                raise CommandError(f"{mode} worker failed:\n{result.stderr}")
+            reports.append(json.loads(result.stdout.strip().splitlines()[-1]))
+        self.stdout.write(json.dumps(reports, indent=2))
@@ -0,0 +1,66 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from playwright.sync_api import sync_playwright
+
+from diary.rendering import get_pool, render_pdf
+
+SAMPLE_HTML = """
+<html><body style="font-family: Georgia, serif">
+  <h1>Benchmark diary</h1>
+  {rows}
+</body></html>
+"""
+
+
+def cold_render_pdf(html_content):
+    """The old per-request path: launch Chromium, render once, close it."""
+    with sync_playwright() as p:
+        browser = p.chromium.launch()
+        page = browser.new_page()
+        page.set_content(html_content, wait_until="networkidle")
+        pdf_bytes = page.pdf(format="A4", print_background=True)
+        browser.close()
+    return pdf_bytes
+
+
+class Command(BaseCommand):
+    help = 'Compare cold-launch PDF rendering with the warm browser pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--questions', type=int, default=20)
+
+    def _time(self, func, html_content, iterations):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func(html_content)
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def _report(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        self.stdout.write(
+            f"{label:<8} mean={statistics.mean(timings):8.1f}ms "
+            f"p50={statistics.median(timings):8.1f}ms p95={p95:8.1f}ms"
+        )
+
+    def handle(self, *args, **options):
+        rows = "".join(
+            f"<p><b>Question {i}</b><br>Answer number {i}</p>" for i in range(options['questions'])
+        )
+        html_content = SAMPLE_HTML.format(rows=rows)
+        iterations = options['iterations']
+
+        cold = self._time(cold_render_pdf, html_content, iterations)
+
+        render_pdf(html_content)  # warm the pool before measuring
+        pooled = self._time(render_pdf, html_content, iterations)
+        get_pool().shutdown()
+
+        self._report("cold", cold)
+        self._report("pooled", pooled)
+        self.stdout.write(f"speedup x{statistics.mean(cold) / statistics.mean(pooled):.1f}")
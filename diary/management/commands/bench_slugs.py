@@ -0,0 +1,66 @@
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils.text import slugify
+from unidecode import unidecode
+
+from diary.models import QuestionSet
+
+User = get_user_model()
+
+
+def legacy_slug(title):
+    """The old probing loop: one exists() query per collision."""
+    base_slug = slugify(unidecode(title))
+    slug = base_slug
+    counter = 1
+    while QuestionSet.objects.filter(slug=slug).exists():
+        slug = f"{base_slug}-{counter}"
+        counter += 1
+    return slug
+
+
+class Command(BaseCommand):
+    help = 'Benchmark creating many question sets with the same title'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000)
+        parser.add_argument('--legacy-count', type=int, default=500,
+                            help='Creates to time with the old O(n) probing loop (0 to skip)')
+
+    def _run(self, owner, title, count, slug_func=None):
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            for _ in range(count):
+                question_set = QuestionSet(owner=owner, title=title)
+                if slug_func:
+                    question_set.slug = slug_func(title)
+                question_set.save()
+        elapsed = time.perf_counter() - start
+        return elapsed, queries
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        owner = User.objects.create_user(username=f"bench-slugs-{tag}", password=tag)
+        try:
+            rows = [("allocator", options['count'], None)]
+            if options['legacy_count']:
+                rows.append(("legacy", options['legacy_count'], legacy_slug))
+            for label, count, slug_func in rows:
+                elapsed, queries = self._run(owner, f"Same title {label} {tag}", count, slug_func)
+                self.stdout.write(
+                    f"{label:<10} {count:>6} creates  {elapsed:8.2f}s  "
+                    f"{elapsed / count * 1000:7.2f}ms/create  {queries / count:8.1f} queries/create"
+                )
+        finally:
+            owner.delete()
@@ -0,0 +1,142 @@
+import multiprocessing
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+
+from DiaryProject.pagination import keyset_page
+from DiaryProject.sqlite import PROFILES, apply_profile
+from users import quota
+from users.notifications import inbox_page
+from diary.models import QuestionSet, Question, AnswerSession
+from diary.submissions import submit_answers
+
+User = get_user_model()
+
+
+def _p95(values):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(round(0.95 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Concurrent-writer load test: writer processes submit answers while reader processes page '
+        'through responses and notifications. Reports throughput and "database is locked" rates '
+        'per database profile (DiaryProject/sqlite.py). Use a file database, not :memory:.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='development,production',
+                            help=f'Comma separated, from: {", ".join(PROFILES)}')
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--questions', type=int, default=10)
+
+    def _run(self, context, worker, count, deadline, results):
+        """One process per worker (like separate app server workers), each with its own connection."""
+        def loop(index):
+            timings, locked, failed = [], 0, 0
+            try:
+                while time.monotonic() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        worker(index)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    except OperationalError as exc:
+                        if "locked" not in str(exc):
+                            raise
+                        locked += 1
+            except Exception:
+                failed += 1
+            finally:
+                connections.close_all()
+            results.put((timings, locked, failed))
+
+        return [context.Process(target=loop, args=(i,)) for i in range(count)]
+
+    def handle(self, *args, **options):
+        profiles = [name.strip() for name in options['profiles'].split(',')]
+        for name in profiles:
+            if name not in PROFILES:
+                raise CommandError(f"Unknown profile {name!r}")
+        database = connections['default'].settings_dict
+        if str(database['NAME']).startswith(':memory:') or 'mode=memory' in str(database['NAME']):
+            raise CommandError("Needs a file database to measure locking.")
+
+        tag = uuid.uuid4().hex[:8]
+        owner = User.objects.create_user(username=f"bench-owner-{tag}", password=tag)
+        respondents = [
+            User.objects.create_user(username=f"bench-writer-{tag}-{i}", password=tag)
+            for i in range(options['writers'])
+        ]
+        question_set = QuestionSet.objects.create(owner=owner, title=f"bench {tag}")
+        questions = Question.objects.bulk_create([
+            Question(question_set=question_set, text=f"Question {i}", order=i)
+            for i in range(options['questions'])
+        ])
+        answers = [(question, f"Answer {question.order}") for question in questions]
+
+        def write(index):
+            # a quota reset plus one full submission transaction
+            quota.reset_answers([respondents[index]])
+            submit_answers(question_set, respondents[index], answers)
+
+        def read(index):
+            sessions = AnswerSession.objects.filter(question_set__owner=owner).order_by("-created_at", "-id")
+            keyset_page(sessions.prefetch_related("answers"), None, 10)
+            inbox_page(owner)
+
+        original = {key: database.get(key) for key in ("CONN_MAX_AGE", "CONN_HEALTH_CHECKS", "OPTIONS", "PRAGMAS")}
+        self.stdout.write(
+            f"{'profile':<12} {'writes/s':>9} {'write p95':>10} {'locked':>7} "
+            f"{'reads/s':>9} {'read p95':>10} {'locked':>7} {'failed':>7}"
+        )
+        try:
+            for name in profiles:
+                connections.close_all()
+                apply_profile(database, name)
+                if not database['PRAGMAS'].get('journal_mode'):
+                    # WAL is stored in the file; put it back so the baseline really is rollback-journal
+                    with connections['default'].cursor() as cursor:
+                        cursor.execute("PRAGMA journal_mode = DELETE")
+
+                # children must open their own connections
+                connections.close_all()
+                context = multiprocessing.get_context("fork")
+                deadline = time.monotonic() + options['seconds']
+                queues = {"write": context.Queue(), "read": context.Queue()}
+                workers = (self._run(context, write, options['writers'], deadline, queues["write"])
+                           + self._run(context, read, options['readers'], deadline, queues["read"]))
+                start = time.monotonic()
+                for worker in workers:
+                    worker.start()
+                write_results = [queues["write"].get() for _ in range(options['writers'])]
+                read_results = [queues["read"].get() for _ in range(options['readers'])]
+                for worker in workers:
+                    worker.join()
+                elapsed = time.monotonic() - start
+
+                columns = []
+                failed = 0
+                for results in (write_results, read_results):
+                    timings = [ms for thread_timings, _, _ in results for ms in thread_timings]
+                    locked = sum(result[1] for result in results)
+                    failed += sum(result[2] for result in results)
+                    columns.append(
+                        f"{len(timings) / elapsed:>9.1f} {_p95(timings):>8.1f}ms "
+                        f"{locked / max(len(timings) + locked, 1):>7.1%}"
+                    )
+                self.stdout.write(f"{name:<12} {columns[0]} {columns[1]} {failed:>7}")
+        finally:
+            connections.close_all()
+            database.update(original)
+            AnswerSession.objects.filter(question_set=question_set).delete()
+            owner.delete()
+            for respondent in respondents:
+                respondent.delete()
@@ -0,0 +1,70 @@
+import statistics
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from users import quota
+from users.models import Notification, NotificationType
+from diary.models import QuestionSet, Question, Answer, AnswerSession
+from diary.submissions import submit_answers
+
+User = get_user_model()
+
+
+def legacy_submit(question_set, respondent, answers):
+    """The old per-row autocommit path, kept here for comparison."""
+    session = AnswerSession.objects.create(respondent=respondent, question_set=question_set)
+    for question, text in answers:
+        Answer.objects.create(session=session, question=question, text=text)
+    quota.consume_answer(respondent)
+    Notification.objects.create(
+        user=question_set.owner, actor=respondent, type=NotificationType.RECEIVED_RESPONSE,
+        message="bench", question_set=question_set, related_object_id=session.pk,
+    )
+    Notification.objects.create(
+        user=respondent, type=NotificationType.ANSWERED_DIARY,
+        message="bench", question_set=question_set, related_object_id=session.pk,
+    )
+    return session
+
+
+class Command(BaseCommand):
+    help = 'Measure answer submission latency against question count (legacy vs bulk path)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='5,20,50,100', help='Comma separated question counts')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        owner = User.objects.create_user(username=f"bench-owner-{tag}", password=tag)
+        respondent = User.objects.create_user(username=f"bench-friend-{tag}", password=tag)
+        try:
+            self.stdout.write(f"{'questions':>9} {'legacy p50':>12} {'bulk p50':>12} {'speedup':>8}")
+            for size in [int(n) for n in options['sizes'].split(',')]:
+                question_set = QuestionSet.objects.create(owner=owner, title=f"bench {tag} {size}")
+                questions = Question.objects.bulk_create(
+                    [Question(question_set=question_set, text=f"Question {i}", order=i) for i in range(size)]
+                )
+                answers = [(question, f"Answer {question.order}") for question in questions]
+
+                results = {}
+                for label, func in (("legacy", legacy_submit), ("bulk", submit_answers)):
+                    timings = []
+                    for _ in range(options['iterations']):
+                        quota.reset_answers([respondent])
+                        start = time.perf_counter()
+                        func(question_set, respondent, answers)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    results[label] = statistics.median(timings)
+
+                self.stdout.write(
+                    f"{size:>9} {results['legacy']:>10.1f}ms {results['bulk']:>10.1f}ms "
+                    f"{results['legacy'] / results['bulk']:>7.1f}x"
+                )
+        finally:
+            AnswerSession.objects.filter(respondent=respondent).delete()
+            owner.delete()
+            respondent.delete()
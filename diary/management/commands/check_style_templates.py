@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+
+from diary.models import QuestionSetStyle
+from diary.styles import style_template
+
+
+class Command(BaseCommand):
+    help = 'Check that every QuestionSetStyle.template_name (and the default style) resolves and compiles'
+
+    def handle(self, *args, **options):
+        checks = [(style.name, style_template(style)) for style in QuestionSetStyle.objects.all()]
+        checks.append(("(no style)", style_template(None)))
+
+        failures = 0
+        for name, template in checks:
+            try:
+                get_template(template)
+            except (TemplateDoesNotExist, TemplateSyntaxError) as exc:
+                failures += 1
+                self.stderr.write(f"{name}: {template} FAILED ({exc.__class__.__name__}: {exc})")
+            else:
+                self.stdout.write(f"{name}: {template} ok")
+
+        if failures:
+            raise CommandError(f"{failures} style template(s) do not resolve.")
+        self.stdout.write(self.style.SUCCESS(f"All {len(checks)} style templates resolve."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from diary.exports import DEFAULT_CHUNK_SIZE, EXPORT_FORMATS, iter_export
+from diary.models import QuestionSet
+
+
+class Command(BaseCommand):
+    help = 'Stream every response to a question set as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slug', help='Slug of the question set to export')
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help='File to write to (defaults to stdout)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            question_set = QuestionSet.objects.get(slug=options['slug'])
+        except QuestionSet.DoesNotExist:
+            raise CommandError(f"No question set with slug '{options['slug']}'")
+
+        lines = iter_export(question_set, options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+                out.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
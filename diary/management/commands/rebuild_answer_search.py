@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from diary import search
+
+
+class Command(BaseCommand):
+    help = 'Repopulate the answer full-text index (diary/search.py) from the answers table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--optimize-only', action='store_true',
+                            help='Only merge the index segments, e.g. after a bulk import')
+
+    def handle(self, *args, **options):
+        if options['optimize_only']:
+            search.optimize_index()
+            self.stdout.write("Answer search index optimized.")
+            return
+        rows = search.rebuild_index()
+        self.stdout.write(f"Answer search index rebuilt: {rows} rows.")
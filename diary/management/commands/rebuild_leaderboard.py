@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from diary import leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Recompute the leaderboard snapshot from answer sessions to repair drift'
+
+    def handle(self, *args, **kwargs):
+        rows = leaderboard.rebuild()
+        self.stdout.write(f"Leaderboard rebuilt: {rows} rows.")
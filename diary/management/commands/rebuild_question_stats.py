@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from diary import analytics
+
+
+class Command(BaseCommand):
+    help = 'Recompute every question\'s answer rollup (diary/analytics.py) from the answers table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=analytics.REBUILD_BATCH_SIZE,
+                            help='Answers fetched and counted per batch')
+
+    def handle(self, *args, **options):
+        rows = analytics.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(f"Question stats rebuilt: {rows} questions.")
@@ -0,0 +1,164 @@
+import json
+import logging
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from diary.models import QuestionSet, AnswerSession, Answer
+from users import quota
+from users.models import Notification
+
+User = get_user_model()
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive the main views through the test client and report p50/p95 latency and '
+        'query counts per view as JSON. Run it against a database filled by seed_data; '
+        'the answer submission step writes real rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def _pick_users(self):
+        owner = (
+            User.objects.annotate(sessions=Count('question_sets__answer_sessions'))
+            .filter(sessions__gt=0).order_by('-sessions').first()
+        )
+        if owner is None:
+            raise CommandError("No responses to benchmark against; run seed_data first.")
+        respondent = User.objects.exclude(pk=owner.pk).first()
+        if respondent is None:
+            raise CommandError("Need at least two users; run seed_data first.")
+        return owner, respondent
+
+    def _client(self, user=None):
+        client = Client(HTTP_HOST="localhost", raise_request_exception=False)
+        if user is not None:
+            client.force_login(user)
+        return client
+
+    def _measure(self, client, method, url, data, before, iterations, warmup):
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        # only successful responses are timed: an error page's figures are not the view's
+        timings, query_counts, statuses, errors = [], [], set(), 0
+        for i in range(warmup + iterations):
+            if before:
+                before()
+            queries = 0
+            start = time.perf_counter()
+            with connection.execute_wrapper(count_queries):
+                response = getattr(client, method)(url, data or {})
+            elapsed = (time.perf_counter() - start) * 1000
+            if i < warmup:
+                continue
+            statuses.add(response.status_code)
+            if response.status_code >= 400:
+                errors += 1
+                continue
+            timings.append(elapsed)
+            query_counts.append(queries)
+        if not timings:
+            return {"status": sorted(statuses), "errors": errors}
+        return {
+            "p50_ms": round(statistics.median(timings), 2),
+            "p95_ms": round(_percentile(timings, 95), 2),
+            "queries_p50": statistics.median(query_counts),
+            "queries_max": max(query_counts),
+            "status": sorted(statuses),
+            "errors": errors,
+        }
+
+    def handle(self, *args, **options):
+        owner, respondent = self._pick_users()
+        question_set = owner.question_sets.annotate(n=Count('answer_sessions')).order_by('-n').first()
+        target = QuestionSet.objects.exclude(owner=respondent).order_by('pk').first()
+        target_answers = {f"question_{q.pk}": "Benchmark answer" for q in target.questions.all()}
+
+        anonymous = self._client()
+        as_owner = self._client(owner)
+        as_respondent = self._client(respondent)
+
+        def reset_quota():
+            quota.reset_answers([respondent])
+
+        views = [
+            ("home_anonymous", anonymous, "get", reverse("pages:home"), None, None),
+            ("home", as_owner, "get", reverse("pages:home"), None, None),
+            ("profile", as_owner, "get", reverse("users:profile"), None, None),
+            ("question_set_list", as_owner, "get", reverse("diary:question_set_list"), None, None),
+            ("view_question_set_owner", as_owner, "get",
+             reverse("diary:question_set_detail", args=[question_set.slug]), None, None),
+            ("view_all_responses", as_owner, "get", reverse("diary:view_all_responses"), None, None),
+            ("fetch_responses", as_owner, "get", reverse("diary:fetch_responses"), None, None),
+            ("answer_submission", as_respondent, "post",
+             reverse("diary:answer_question_set_shared", args=[target.share_uuid]), target_answers, reset_quota),
+        ]
+
+        # the report carries timings and status codes; keep per-request logs out of it
+        logging.getLogger("diary.perf").setLevel(logging.CRITICAL)
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+        results = {}
+        for name, client, method, url, data, before in views:
+            results[name] = self._measure(
+                client, method, url, data, before, options['iterations'], options['warmup']
+            )
+
+        report = {
+            "commit": _git_commit(),
+            "database": str(settings.DATABASES['default']['NAME']),
+            "iterations": options['iterations'],
+            "rows": {
+                "users": User.objects.count(),
+                "question_sets": QuestionSet.objects.count(),
+                "answer_sessions": AnswerSession.objects.count(),
+                "answers": Answer.objects.count(),
+                "notifications": Notification.objects.count(),
+            },
+            "views": results,
+        }
+        failing = sorted(name for name, result in results.items() if result["errors"])
+        if failing:
+            self.stderr.write(
+                f"Error responses, left out of the timings: {', '.join(failing)}. "
+                f"Views without any successful response have no figures."
+            )
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as out:
+                out.write(output + "\n")
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,127 @@
+import random
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from diary import analytics, leaderboard
+from diary.models import QuestionSet, Question, AnswerSession, Answer
+from diary.snapshots import snapshot_questions, take_snapshots
+from users import quota
+from users.models import UserProfile, Notification, NotificationType
+from users.notifications import recount_unread
+
+User = get_user_model()
+
+WORDS = (
+    "friend summer music dream travel family coffee book movie city ocean "
+    "mountain memory school song favourite secret weekend holiday rain"
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Seed the database with synthetic users, diaries, questions, responses and notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--sets-per-user', type=int, default=1)
+        parser.add_argument('--questions-per-set', type=int, default=10)
+        parser.add_argument('--sessions-per-set', type=int, default=20)
+        parser.add_argument('--no-notifications', dest='notifications', action='store_false',
+                            help='Skip the two notifications every submission creates')
+        parser.add_argument('--prefix', default='seed', help='Seeded usernames are <prefix>-<n>')
+        parser.add_argument('--password', default='password', help='Password given to every seeded user')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, for reproducible data')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def _text(self, rng, words):
+        return " ".join(rng.choice(WORDS) for _ in range(words))
+
+    def _respondent(self, rng, users, owner_index):
+        """Any seeded user but the set's owner, who cannot answer it."""
+        i = rng.randrange(len(users) - 1)
+        return users[i + (i >= owner_index)]
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        if options['users'] < 2 and options['sessions_per_set'] > 0:
+            raise CommandError("Seeding responses needs at least two users: nobody answers their own set.")
+        rng = random.Random(options['seed'])
+        batch = options['batch_size']
+        prefix = options['prefix']
+
+        # bulk_create skips save() and signals, so profiles, slugs and snapshots are filled in here
+        password = make_password(options['password'])
+        users = User.objects.bulk_create([
+            User(username=f"{prefix}-{i}", password=password, name="Seed", surname=str(i))
+            for i in range(options['users'])
+        ], batch_size=batch)
+        UserProfile.objects.bulk_create([
+            UserProfile(user=user, plan='premium' if i % 5 == 0 else 'free') for i, user in enumerate(users)
+        ], batch_size=batch)
+
+        question_sets = QuestionSet.objects.bulk_create([
+            QuestionSet(owner=user, title=f"Diary {n} of {user.username}", slug=f"{user.username}-{n}",
+                        share_uuid=uuid.UUID(int=rng.getrandbits(128)))
+            for user in users
+            for n in range(options['sets_per_user'])
+        ], batch_size=batch)
+        questions = [
+            Question(question_set=qset, text=self._text(rng, 6) + "?", order=order)
+            for qset in question_sets
+            for order in range(options['questions_per_set'])
+        ]
+        snapshot_questions(questions)
+        questions = Question.objects.bulk_create(questions, batch_size=batch)
+        questions_by_set = {}
+        for question in questions:
+            questions_by_set.setdefault(question.question_set_id, []).append(question)
+
+        user_index = {user.pk: i for i, user in enumerate(users)}
+        sessions = AnswerSession.objects.bulk_create([
+            AnswerSession(respondent=self._respondent(rng, users, user_index[qset.owner_id]), question_set=qset)
+            for qset in question_sets
+            for _ in range(options['sessions_per_set'])
+        ], batch_size=batch)
+
+        answers = 0
+        notifications = 0
+        owners = {qset.pk: qset.owner for qset in question_sets}
+        for start in range(0, len(sessions), batch):
+            chunk = sessions[start:start + batch]
+            created = [
+                Answer(session=session, question=question, text=self._text(rng, rng.randint(3, 30)))
+                for session in chunk
+                for question in questions_by_set.get(session.question_set_id, [])
+            ]
+            take_snapshots(created)
+            created = Answer.objects.bulk_create(created, batch_size=batch)
+            answers += len(created)
+            if options['notifications']:
+                created = Notification.objects.bulk_create([
+                    notification
+                    for session in chunk
+                    for notification in (
+                        Notification(user=owners[session.question_set_id], actor=session.respondent,
+                                     type=NotificationType.RECEIVED_RESPONSE, message="Seeded response",
+                                     question_set_id=session.question_set_id, related_object_id=session.pk),
+                        Notification(user=session.respondent, type=NotificationType.ANSWERED_DIARY,
+                                     message="Seeded answer", question_set_id=session.question_set_id,
+                                     related_object_id=session.pk),
+                    )
+                ], batch_size=batch)
+                notifications += len(created)
+
+        # the counters submit_answers keeps up to date
+        leaderboard.rebuild()
+        analytics.rebuild()
+        quota.rebuild()
+        recount_unread(users)
+
+        self.stdout.write(
+            f"Seeded {len(users)} users, {len(question_sets)} question sets, {len(questions)} questions, "
+            f"{len(sessions)} sessions, {answers} answers, {notifications} notifications "
+            f"(usernames {prefix}-N, password '{options['password']}')."
+        )
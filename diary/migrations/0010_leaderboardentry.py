@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F
+
+
+def backfill_all_time(apps, schema_editor):
+    AnswerSession = apps.get_model('diary', 'AnswerSession')
+    LeaderboardEntry = apps.get_model('diary', 'LeaderboardEntry')
+    totals = (
+        AnswerSession.objects.filter(question_set__isnull=False)
+        .values(owner=F('question_set__owner'))
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    LeaderboardEntry.objects.bulk_create(
+        [LeaderboardEntry(user_id=row['owner'], period='all', response_count=row['count']) for row in totals],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary', '0009_alter_answersession_question_set'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(help_text="'all' or the Monday starting the week, e.g. 2025-09-01.", max_length=10, verbose_name='Period')),
+                ('response_count', models.PositiveIntegerField(default=0, verbose_name='Responses')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Leaderboard Entry',
+                'verbose_name_plural': 'Leaderboard Entries',
+                'indexes': [models.Index(fields=['period', '-response_count', 'user'], name='leaderboard_period_count_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'period'), name='unique_leaderboard_user_period')],
+            },
+        ),
+        migrations.RunPython(backfill_all_time, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary', '0010_leaderboardentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answersession',
+            index=models.Index(fields=['question_set', 'created_at'], name='session_set_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answersession',
+            index=models.Index(fields=['respondent', 'created_at'], name='session_respondent_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsitem',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['display_order', '-created_at'], name='newsitem_carousel_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['question_set', 'order'], name='question_set_order_idx'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Full-text index over answers, kept in sync by triggers (see diary/search.py)
+
+from django.db import migrations
+
+CREATE = [
+    """
+    CREATE VIRTUAL TABLE diary_answer_fts USING fts5(
+        text, question_text, owner, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    # every write path, bulk_create and queryset.update() included, goes through these
+    """
+    CREATE TRIGGER diary_answer_fts_insert AFTER INSERT ON diary_answer BEGIN
+        INSERT INTO diary_answer_fts (rowid, text, question_text, owner)
+        SELECT new.id, new.text, new.question_text, qs.owner_id
+        FROM diary_answersession s JOIN diary_questionset qs ON qs.id = s.question_set_id
+        WHERE s.id = new.session_id;
+    END
+    """,
+    """
+    CREATE TRIGGER diary_answer_fts_delete AFTER DELETE ON diary_answer BEGIN
+        DELETE FROM diary_answer_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER diary_answer_fts_update AFTER UPDATE OF text, question_text, session_id ON diary_answer
+    WHEN old.text IS NOT new.text OR old.question_text IS NOT new.question_text
+         OR old.session_id IS NOT new.session_id
+    BEGIN
+        DELETE FROM diary_answer_fts WHERE rowid = old.id;
+        INSERT INTO diary_answer_fts (rowid, text, question_text, owner)
+        SELECT new.id, new.text, new.question_text, qs.owner_id
+        FROM diary_answersession s JOIN diary_questionset qs ON qs.id = s.question_set_id
+        WHERE s.id = new.session_id;
+    END
+    """,
+    # a session moving set, or losing it when its set is deleted (SET NULL)
+    """
+    CREATE TRIGGER diary_answersession_fts_move AFTER UPDATE OF question_set_id ON diary_answersession
+    WHEN old.question_set_id IS NOT new.question_set_id
+    BEGIN
+        DELETE FROM diary_answer_fts WHERE rowid IN (SELECT id FROM diary_answer WHERE session_id = new.id);
+        INSERT INTO diary_answer_fts (rowid, text, question_text, owner)
+        SELECT a.id, a.text, a.question_text, qs.owner_id
+        FROM diary_answer a JOIN diary_questionset qs ON qs.id = new.question_set_id
+        WHERE a.session_id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER diary_questionset_fts_owner AFTER UPDATE OF owner_id ON diary_questionset
+    WHEN old.owner_id IS NOT new.owner_id
+    BEGIN
+        UPDATE diary_answer_fts SET owner = new.owner_id WHERE rowid IN (
+            SELECT a.id FROM diary_answer a JOIN diary_answersession s ON s.id = a.session_id
+            WHERE s.question_set_id = new.id
+        );
+    END
+    """,
+    """
+    INSERT INTO diary_answer_fts (rowid, text, question_text, owner)
+    SELECT a.id, a.text, a.question_text, qs.owner_id
+    FROM diary_answer a
+    JOIN diary_answersession s ON s.id = a.session_id
+    JOIN diary_questionset qs ON qs.id = s.question_set_id
+    """,
+]
+
+DROP = [
+    "DROP TRIGGER IF EXISTS diary_questionset_fts_owner",
+    "DROP TRIGGER IF EXISTS diary_answersession_fts_move",
+    "DROP TRIGGER IF EXISTS diary_answer_fts_update",
+    "DROP TRIGGER IF EXISTS diary_answer_fts_delete",
+    "DROP TRIGGER IF EXISTS diary_answer_fts_insert",
+    "DROP TABLE IF EXISTS diary_answer_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return  # FTS5 is SQLite only
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary', '0011_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE), _run(DROP)),
+    ]
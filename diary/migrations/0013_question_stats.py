@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary', '0012_answer_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='diary.question', verbose_name='Question')),
+                ('response_count', models.PositiveIntegerField(default=0, verbose_name='Responses')),
+                ('total_length', models.PositiveBigIntegerField(default=0, verbose_name='Total answer length')),
+                ('length_histogram', models.JSONField(default=list, help_text='Answers per length bucket, see LENGTH_BUCKETS.', verbose_name='Answer length histogram')),
+                ('term_counts', models.JSONField(default=dict, help_text='Number of answers using each of the most frequent terms.', verbose_name='Term counts')),
+                ('recent_answers', models.JSONField(default=list, help_text='The latest answers, newest first.', verbose_name='Recent answers')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+            ],
+            options={
+                'verbose_name': 'Question Statistics',
+                'verbose_name_plural': 'Question Statistics',
+            },
+        ),
+    ]
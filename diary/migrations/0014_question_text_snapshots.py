@@ -0,0 +1,216 @@
+# Answer.question_text moves to a shared, content-addressed QuestionText row (see diary/snapshots.py)
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+# The FTS triggers of 0012 read diary_answer.question_text; they are dropped
+# while the column goes and recreated to read the snapshot instead. All of
+# them go, since SQLite cannot rebuild a table (as Django does to add the
+# column back when migrating backwards) that a trigger still refers to.
+OWNER_TRIGGER = """
+    CREATE TRIGGER diary_questionset_fts_owner AFTER UPDATE OF owner_id ON diary_questionset
+    WHEN old.owner_id IS NOT new.owner_id
+    BEGIN
+        UPDATE diary_answer_fts SET owner = new.owner_id WHERE rowid IN (
+            SELECT a.id FROM diary_answer a JOIN diary_answersession s ON s.id = a.session_id
+            WHERE s.question_set_id = new.id
+        );
+    END
+"""
+
+DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS diary_questionset_fts_owner",
+    "DROP TRIGGER IF EXISTS diary_answersession_fts_move",
+    "DROP TRIGGER IF EXISTS diary_answer_fts_update",
+    "DROP TRIGGER IF EXISTS diary_answer_fts_delete",
+    "DROP TRIGGER IF EXISTS diary_answer_fts_insert",
+]
+
+CREATE_TRIGGERS = [
+    """
+    CREATE TRIGGER diary_answer_fts_insert AFTER INSERT ON diary_answer BEGIN
+        INSERT INTO diary_answer_fts (rowid, text, question_text, owner)
+        SELECT new.id, new.text, coalesce(qt.text, ''), qs.owner_id
+        FROM diary_answersession s JOIN diary_questionset qs ON qs.id = s.question_set_id
+        LEFT JOIN diary_questiontext qt ON qt.id = new.question_snapshot_id
+        WHERE s.id = new.session_id;
+    END
+    """,
+    """
+    CREATE TRIGGER diary_answer_fts_delete AFTER DELETE ON diary_answer BEGIN
+        DELETE FROM diary_answer_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER diary_answer_fts_update AFTER UPDATE OF text, question_snapshot_id, session_id ON diary_answer
+    WHEN old.text IS NOT new.text OR old.question_snapshot_id IS NOT new.question_snapshot_id
+         OR old.session_id IS NOT new.session_id
+    BEGIN
+        DELETE FROM diary_answer_fts WHERE rowid = old.id;
+        INSERT INTO diary_answer_fts (rowid, text, question_text, owner)
+        SELECT new.id, new.text, coalesce(qt.text, ''), qs.owner_id
+        FROM diary_answersession s JOIN diary_questionset qs ON qs.id = s.question_set_id
+        LEFT JOIN diary_questiontext qt ON qt.id = new.question_snapshot_id
+        WHERE s.id = new.session_id;
+    END
+    """,
+    """
+    CREATE TRIGGER diary_answersession_fts_move AFTER UPDATE OF question_set_id ON diary_answersession
+    WHEN old.question_set_id IS NOT new.question_set_id
+    BEGIN
+        DELETE FROM diary_answer_fts WHERE rowid IN (SELECT id FROM diary_answer WHERE session_id = new.id);
+        INSERT INTO diary_answer_fts (rowid, text, question_text, owner)
+        SELECT a.id, a.text, coalesce(qt.text, ''), qs.owner_id
+        FROM diary_answer a JOIN diary_questionset qs ON qs.id = new.question_set_id
+        LEFT JOIN diary_questiontext qt ON qt.id = a.question_snapshot_id
+        WHERE a.session_id = new.id;
+    END
+    """,
+    OWNER_TRIGGER,
+]
+
+# the 0012 versions, for migrating back
+CREATE_OLD_TRIGGERS = [
+    """
+    CREATE TRIGGER diary_answer_fts_insert AFTER INSERT ON diary_answer BEGIN
+        INSERT INTO diary_answer_fts (rowid, text, question_text, owner)
+        SELECT new.id, new.text, new.question_text, qs.owner_id
+        FROM diary_answersession s JOIN diary_questionset qs ON qs.id = s.question_set_id
+        WHERE s.id = new.session_id;
+    END
+    """,
+    """
+    CREATE TRIGGER diary_answer_fts_delete AFTER DELETE ON diary_answer BEGIN
+        DELETE FROM diary_answer_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER diary_answer_fts_update AFTER UPDATE OF text, question_text, session_id ON diary_answer
+    WHEN old.text IS NOT new.text OR old.question_text IS NOT new.question_text
+         OR old.session_id IS NOT new.session_id
+    BEGIN
+        DELETE FROM diary_answer_fts WHERE rowid = old.id;
+        INSERT INTO diary_answer_fts (rowid, text, question_text, owner)
+        SELECT new.id, new.text, new.question_text, qs.owner_id
+        FROM diary_answersession s JOIN diary_questionset qs ON qs.id = s.question_set_id
+        WHERE s.id = new.session_id;
+    END
+    """,
+    """
+    CREATE TRIGGER diary_answersession_fts_move AFTER UPDATE OF question_set_id ON diary_answersession
+    WHEN old.question_set_id IS NOT new.question_set_id
+    BEGIN
+        DELETE FROM diary_answer_fts WHERE rowid IN (SELECT id FROM diary_answer WHERE session_id = new.id);
+        INSERT INTO diary_answer_fts (rowid, text, question_text, owner)
+        SELECT a.id, a.text, a.question_text, qs.owner_id
+        FROM diary_answer a JOIN diary_questionset qs ON qs.id = new.question_set_id
+        WHERE a.session_id = new.id;
+    END
+    """,
+    OWNER_TRIGGER,
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return  # FTS5 is SQLite only
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def fill_snapshots(apps, schema_editor):
+    """
+    Point every answer at the QuestionText row for its question_text.
+
+    Walks the answers in primary key order BATCH_SIZE rows at a time, so
+    memory holds one batch plus one id per distinct text, and sets each
+    answer's snapshot with a primary key UPDATE.
+    """
+    Answer = apps.get_model('diary', 'Answer')
+    QuestionText = apps.get_model('diary', 'QuestionText')
+    connection = schema_editor.connection
+    update = (
+        f"UPDATE {connection.ops.quote_name(Answer._meta.db_table)} "
+        f"SET question_snapshot_id = %s WHERE id = %s"
+    )
+    snapshot_ids = {}  # digest -> QuestionText id
+    last_pk = 0
+    while True:
+        batch = list(
+            Answer.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'question_text')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+
+        rows = [(pk, text, hashlib.sha256(text.encode('utf-8')).hexdigest()) for pk, text in batch if text]
+        new = {digest: text for _pk, text, digest in rows if digest not in snapshot_ids}
+        if new:
+            QuestionText.objects.bulk_create(
+                [QuestionText(digest=digest, text=text) for digest, text in new.items()],
+                batch_size=500, ignore_conflicts=True,
+            )
+            digests = list(new)
+            for start in range(0, len(digests), 500):
+                snapshot_ids.update(
+                    QuestionText.objects.filter(digest__in=digests[start:start + 500]).values_list('digest', 'pk')
+                )
+        with connection.cursor() as cursor:
+            cursor.executemany(update, [(snapshot_ids[digest], pk) for pk, _text, digest in rows])
+
+
+def copy_snapshots_back(apps, schema_editor):
+    Answer = apps.get_model('diary', 'Answer')
+    connection = schema_editor.connection
+    update = f"UPDATE {connection.ops.quote_name(Answer._meta.db_table)} SET question_text = %s WHERE id = %s"
+    last_pk = 0
+    while True:
+        batch = list(
+            Answer.objects.filter(pk__gt=last_pk, question_snapshot__isnull=False).order_by('pk')
+            .values_list('pk', 'question_snapshot__text')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        with connection.cursor() as cursor:
+            cursor.executemany(update, [(text, pk) for pk, text in batch])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary', '0013_question_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(editable=False, max_length=64, unique=True)),
+                ('text', models.TextField(editable=False)),
+            ],
+            options={
+                'verbose_name': 'Question Text Snapshot',
+                'verbose_name_plural': 'Question Text Snapshots',
+            },
+        ),
+        migrations.RunPython(_run(DROP_TRIGGERS), _run(CREATE_OLD_TRIGGERS)),
+        migrations.AddField(
+            model_name='answer',
+            name='question_snapshot',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='Stores the question text at the time of answering.', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='answers', to='diary.questiontext', verbose_name='Original Question Text'),
+        ),
+        migrations.RunPython(fill_snapshots, copy_snapshots_back),
+        migrations.RemoveField(
+            model_name='answer',
+            name='question_text',
+        ),
+        migrations.RunPython(_run(CREATE_TRIGGERS), _run(DROP_TRIGGERS)),
+    ]
@@ -0,0 +1,122 @@
+# QuestionStats' histogram becomes plain counter columns that writers can add to
+# in SQL, and deleted answers are taken off the rollups by a trigger (see diary/analytics.py)
+
+from django.db import migrations, models
+
+BUCKETS = (20, 50, 100, 200, 500)
+FIELDS = [f'length_bucket_{i}' for i in range(len(BUCKETS) + 1)]
+
+
+def _bucket_conditions():
+    bounds = (0,) + BUCKETS + (None,)
+    for low, high in zip(bounds, bounds[1:]):
+        if high is None:
+            yield f"length(old.text) >= {low}"
+        else:
+            yield f"(length(old.text) >= {low} AND length(old.text) < {high})"
+
+
+CREATE_TRIGGER = """
+    CREATE TRIGGER diary_answer_stats_delete AFTER DELETE ON diary_answer
+    WHEN old.question_id IS NOT NULL
+    BEGIN
+        UPDATE diary_questionstats SET
+            response_count = max(response_count - 1, 0),
+            total_length = max(total_length - length(old.text), 0),
+            {buckets},
+            recent_answers = (
+                SELECT json_group_array(json(value)) FROM json_each(recent_answers)
+                WHERE json_extract(value, '$.session') IS NOT old.session_id
+            )
+        WHERE question_id = old.question_id;
+    END
+""".format(buckets=",\n            ".join(
+    f"{field} = max({field} - {condition}, 0)" for field, condition in zip(FIELDS, _bucket_conditions())
+))
+
+DROP_TRIGGER = "DROP TRIGGER IF EXISTS diary_answer_stats_delete"
+
+
+def _run(statement):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return  # other databases rely on rebuild_question_stats after deletes
+        schema_editor.execute(statement)
+    return run
+
+
+def histogram_to_columns(apps, schema_editor):
+    QuestionStats = apps.get_model('diary', 'QuestionStats')
+    rows = []
+    for stats in QuestionStats.objects.iterator(chunk_size=500):
+        histogram = list(stats.length_histogram or []) + [0] * len(FIELDS)
+        for field, count in zip(FIELDS, histogram):
+            setattr(stats, field, count)
+        rows.append(stats)
+    QuestionStats.objects.bulk_update(rows, FIELDS, batch_size=500)
+
+
+def columns_to_histogram(apps, schema_editor):
+    QuestionStats = apps.get_model('diary', 'QuestionStats')
+    rows = []
+    for stats in QuestionStats.objects.iterator(chunk_size=500):
+        stats.length_histogram = [getattr(stats, field) for field in FIELDS]
+        rows.append(stats)
+    QuestionStats.objects.bulk_update(rows, ['length_histogram'], batch_size=500)
+
+
+def create_missing_rows(apps, schema_editor):
+    # record_answers expects every question to have its row
+    Question = apps.get_model('diary', 'Question')
+    QuestionStats = apps.get_model('diary', 'QuestionStats')
+    QuestionStats.objects.bulk_create(
+        [QuestionStats(question_id=pk) for pk in Question.objects.filter(stats__isnull=True).values_list('pk', flat=True)],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary', '0014_question_text_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionstats',
+            name='length_bucket_0',
+            field=models.PositiveIntegerField(default=0, verbose_name='Answers of 0–19 characters'),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='length_bucket_1',
+            field=models.PositiveIntegerField(default=0, verbose_name='Answers of 20–49 characters'),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='length_bucket_2',
+            field=models.PositiveIntegerField(default=0, verbose_name='Answers of 50–99 characters'),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='length_bucket_3',
+            field=models.PositiveIntegerField(default=0, verbose_name='Answers of 100–199 characters'),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='length_bucket_4',
+            field=models.PositiveIntegerField(default=0, verbose_name='Answers of 200–499 characters'),
+        ),
+        migrations.AddField(
+            model_name='questionstats',
+            name='length_bucket_5',
+            field=models.PositiveIntegerField(default=0, verbose_name='Answers of 500+ characters'),
+        ),
+        migrations.RunPython(histogram_to_columns, columns_to_histogram),
+        migrations.RemoveField(
+            model_name='questionstats',
+            name='length_histogram',
+        ),
+        migrations.RunPython(create_missing_rows, migrations.RunPython.noop),
+        migrations.RunPython(_run(CREATE_TRIGGER), _run(DROP_TRIGGER)),
+    ]
@@ -0,0 +1,50 @@
+# Questions point at the snapshot of their current text, so answers copy it (see diary/snapshots.py)
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def fill_question_snapshots(apps, schema_editor):
+    Question = apps.get_model('diary', 'Question')
+    QuestionText = apps.get_model('diary', 'QuestionText')
+    last_pk = 0
+    while True:
+        batch = list(Question.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'text')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        texts = {hashlib.sha256(question.text.encode('utf-8')).hexdigest(): question.text for question in batch}
+        QuestionText.objects.bulk_create(
+            [QuestionText(digest=digest, text=text) for digest, text in texts.items()],
+            batch_size=500, ignore_conflicts=True,
+        )
+        snapshot_ids = {}
+        digests = list(texts)
+        for start in range(0, len(digests), 500):
+            snapshot_ids.update(
+                QuestionText.objects.filter(digest__in=digests[start:start + 500]).values_list('digest', 'pk')
+            )
+        for question in batch:
+            question.snapshot_id = snapshot_ids[hashlib.sha256(question.text.encode('utf-8')).hexdigest()]
+        Question.objects.bulk_update(batch, ['snapshot'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary', '0015_question_stats_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='snapshot',
+            field=models.ForeignKey(blank=True, db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='diary.questiontext', verbose_name='Current Text Snapshot'),
+        ),
+        migrations.RunPython(fill_question_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,11 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import uuid
-from django.utils.text import slugify
-from unidecode import unidecode
+from .slugs import allocate_slug
+
+SLUG_ALLOCATION_ATTEMPTS = 5
 
 
 class QuestionSetStyle(models.Model):
@@ -77,15 +78,19 @@ class QuestionSet(models.Model):
         return f"{self.title} ({self.owner.username})"
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.title)
-            slug = base_slug
-            counter = 1
-            while QuestionSet.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slugify(unidecode(self.title))
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        # Another request may grab the same slug between allocation and insert
+        for attempt in range(SLUG_ALLOCATION_ATTEMPTS):
+            self.slug = allocate_slug(QuestionSet, self.title)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                if attempt == SLUG_ALLOCATION_ATTEMPTS - 1 or not QuestionSet.objects.filter(slug=self.slug).exists():
+                    self.slug = ""
+                    raise
 
     def get_absolute_url(self):
         from django.urls import reverse
@@ -108,15 +113,40 @@ class Question(models.Model):
         verbose_name=_("Order"),
         help_text=_("Order of the question in the set.")
     )
+    # The snapshot of the current text, which answers to the question copy
+    # without a lookup. Set by save(); see diary.snapshots.
+    snapshot = models.ForeignKey(
+        "QuestionText",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        editable=False,
+        db_index=False,
+        related_name="+",
+        verbose_name=_("Current Text Snapshot")
+    )
 
     class Meta:
         verbose_name = _("Question")
         verbose_name_plural = _("Questions")
         ordering = ["order"]
+        indexes = [
+            # a set's questions in order, without a sort step
+            models.Index(fields=["question_set", "order"], name="question_set_order_idx"),
+        ]
 
     def __str__(self):
         return f"Q{self.order + 1}: {self.text[:50]}"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "text" in update_fields:
+            from .snapshots import snapshot_questions
+            snapshot_questions([self])
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "snapshot"}
+        super().save(*args, **kwargs)
+
 
 class AnswerSession(models.Model):
     """A session where a friend answers a full question set."""
@@ -146,10 +176,42 @@ class AnswerSession(models.Model):
         verbose_name = _("Answer Session")
         verbose_name_plural = _("Answer Sessions")
         ordering = ["-created_at"]
+        indexes = [
+            # one set's responses, newest first
+            models.Index(fields=["question_set", "created_at"], name="session_set_created_idx"),
+            # one respondent's sessions within a period
+            models.Index(fields=["respondent", "created_at"], name="session_respondent_created_idx"),
+        ]
 
     def __str__(self):
         return f"Session by {self.respondent or 'Anonymous'} on {self.created_at.strftime('%Y-%m-%d')}"
 
+class QuestionText(models.Model):
+    """
+    The text of a question as it was when answered, stored once per distinct text.
+
+    Rows are content-addressed (``digest`` is the SHA-256 of ``text``) and never
+    change: an edited question gets a new row and older answers keep pointing
+    at the old one. See ``diary.snapshots``.
+    """
+    digest = models.CharField(max_length=64, unique=True, editable=False)
+    text = models.TextField(editable=False)
+
+    class Meta:
+        verbose_name = _("Question Text Snapshot")
+        verbose_name_plural = _("Question Text Snapshots")
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Question text snapshots are immutable.")
+        from .snapshots import text_digest
+        self.digest = text_digest(self.text)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.text[:50]
+
+
 class Answer(models.Model):
     """An individual answer to a question, part of a session."""
     session = models.ForeignKey(
@@ -166,11 +228,18 @@ class Answer(models.Model):
         related_name="answers",
         verbose_name=_("Question")
     )
-    # Snapshot field: keeps original question text at the time of answering
-    question_text = models.TextField(
+    # Snapshot: the question text at the time of answering, shared by every
+    # answer given to the same text. Not indexed: nothing looks answers up by
+    # snapshot, and the app never deletes one (PROTECT would scan to check).
+    question_snapshot = models.ForeignKey(
+        QuestionText,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name="answers",
         verbose_name=_("Original Question Text"),
-        help_text=_("Stores the question text at the time of answering."),
-        default=""
+        help_text=_("Stores the question text at the time of answering.")
     )
     text = models.TextField(
         verbose_name=_("Answer Text"),
@@ -182,12 +251,18 @@ class Answer(models.Model):
         verbose_name_plural = _("Answers")
         unique_together = ("session", "question")
 
+    @property
+    def question_text(self):
+        """The snapshot's text; select_related("question_snapshot") when reading many answers."""
+        return self.question_snapshot.text if self.question_snapshot_id else ""
+
     def save(self, *args, **kwargs):
         """
-        On save, if no snapshot exists yet, copy the current question text.
+        On save, if no snapshot exists yet, take one of the current question text.
         """
-        if self.question and not self.question_text:
-            self.question_text = self.question.text
+        if self.question and not self.question_snapshot_id:
+            from .snapshots import take_snapshots
+            take_snapshots([self])
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -223,6 +298,135 @@ class NewsItem(models.Model):
         verbose_name = _("News Item")
         verbose_name_plural = _("News Items")
         ordering = ['display_order', '-created_at']  # manual order first, newest after
+        indexes = [
+            # the home page carousel: active items in display order. Partial, because
+            # Django filters booleans as a bare "WHERE is_active", which SQLite can
+            # match against an index condition but not against an index column.
+            models.Index(
+                fields=["display_order", "-created_at"], condition=models.Q(is_active=True),
+                name="newsitem_carousel_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.display_order} - {self.title}"
+
+class LeaderboardEntry(models.Model):
+    """
+    Denormalized count of responses a user's question sets have received.
+
+    One row per user and period: ``period`` is either ``"all"`` for all-time
+    totals or the ISO date of the Monday that starts a week. Maintained
+    incrementally by ``diary.leaderboard`` and repaired by ``rebuild_leaderboard``.
+    """
+    ALL_TIME = "all"
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="leaderboard_entries",
+        verbose_name=_("User")
+    )
+    period = models.CharField(
+        max_length=10,
+        verbose_name=_("Period"),
+        help_text=_("'all' or the Monday starting the week, e.g. 2025-09-01.")
+    )
+    response_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Responses")
+    )
+
+    class Meta:
+        verbose_name = _("Leaderboard Entry")
+        verbose_name_plural = _("Leaderboard Entries")
+        constraints = [
+            models.UniqueConstraint(fields=["user", "period"], name="unique_leaderboard_user_period"),
+        ]
+        indexes = [
+            models.Index(fields=["period", "-response_count", "user"], name="leaderboard_period_count_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} [{self.period}]: {self.response_count}"
+
+
+class QuestionStats(models.Model):
+    """
+    Precomputed rollup of the answers one question has received.
+
+    Maintained incrementally by ``diary.analytics`` as responses come in and
+    repaired by ``rebuild_question_stats``, so the owner's view of a set reads
+    one row per question instead of every answer. The counters are plain
+    columns so that writers can add to them with a single UPDATE.
+    """
+    # upper bounds, in characters, of the answer-length buckets; the last bucket is open
+    LENGTH_BUCKETS = (20, 50, 100, 200, 500)
+    LENGTH_BUCKET_FIELDS = tuple(f"length_bucket_{i}" for i in range(len(LENGTH_BUCKETS) + 1))
+    TOP_TERMS = 10
+
+    question = models.OneToOneField(
+        Question,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name=_("Question")
+    )
+    response_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Responses")
+    )
+    total_length = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name=_("Total answer length")
+    )
+    length_bucket_0 = models.PositiveIntegerField(default=0, verbose_name=_("Answers of 0–19 characters"))
+    length_bucket_1 = models.PositiveIntegerField(default=0, verbose_name=_("Answers of 20–49 characters"))
+    length_bucket_2 = models.PositiveIntegerField(default=0, verbose_name=_("Answers of 50–99 characters"))
+    length_bucket_3 = models.PositiveIntegerField(default=0, verbose_name=_("Answers of 100–199 characters"))
+    length_bucket_4 = models.PositiveIntegerField(default=0, verbose_name=_("Answers of 200–499 characters"))
+    length_bucket_5 = models.PositiveIntegerField(default=0, verbose_name=_("Answers of 500+ characters"))
+    term_counts = models.JSONField(
+        default=dict,
+        verbose_name=_("Term counts"),
+        help_text=_("Number of answers using each of the most frequent terms.")
+    )
+    recent_answers = models.JSONField(
+        default=list,
+        verbose_name=_("Recent answers"),
+        help_text=_("The latest answers, newest first.")
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_("Updated At")
+    )
+
+    class Meta:
+        verbose_name = _("Question Statistics")
+        verbose_name_plural = _("Question Statistics")
 
     def __str__(self):
-        return f"{self.display_order} - {self.title}"
\ No newline at end of file
+        return f"{self.question_id}: {self.response_count} responses"
+
+    @property
+    def average_length(self):
+        return round(self.total_length / self.response_count) if self.response_count else 0
+
+    @property
+    def length_histogram(self):
+        """Answers per length bucket, see LENGTH_BUCKETS."""
+        return [getattr(self, field) for field in self.LENGTH_BUCKET_FIELDS]
+
+    @property
+    def top_terms(self):
+        """The ``TOP_TERMS`` most used terms as (term, answers) pairs."""
+        return sorted(self.term_counts.items(), key=lambda item: (-item[1], item[0]))[:self.TOP_TERMS]
+
+    @property
+    def length_distribution(self):
+        """(label, answers, percent) per length bucket."""
+        bounds = (0,) + self.LENGTH_BUCKETS
+        labels = [f"{low}–{high - 1}" for low, high in zip(bounds, bounds[1:])] + [f"{bounds[-1]}+"]
+        counts = self.length_histogram
+        total = self.response_count or 1
+        return [(label, count, round(100 * count / total)) for label, count in zip(labels, counts)]
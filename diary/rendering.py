@@ -0,0 +1,219 @@
+# diary/rendering.py
+"""
+Headless-browser rendering for PDF downloads and share cards.
+
+Playwright's sync API binds every object to the thread that created it, so a
+browser cannot simply be shared between request threads. Instead the pool
+starts a fixed number of worker threads, each owning one warm Chromium and one
+browser context. Views submit render jobs to a bounded queue and wait for the
+result; when the queue is full they get ``RenderPoolBusy`` straight away
+instead of piling up behind a slow renderer.
+
+``future.cancel()`` cannot stop a job a worker has already started, so every
+page also gets ``TIMEOUT`` as its Playwright default timeout: a hung
+``set_content`` or ``pdf`` fails there and frees the worker instead of
+holding it for good.
+"""
+import atexit
+import logging
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SETTINGS = {
+    "SIZE": 2,                      # worker threads / warm browsers
+    "QUEUE_SIZE": 8,                # jobs allowed to wait for a worker
+    "MAX_RENDERS_PER_CONTEXT": 50,  # recycle the context after this many renders
+    "TIMEOUT": 30,                  # seconds a view waits for its render
+}
+
+
+class RenderError(Exception):
+    """Base class for rendering failures."""
+
+
+class RenderPoolBusy(RenderError):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+class RenderTimeout(RenderError):
+    """Raised when a render does not finish within the pool timeout."""
+
+
+def get_pool_settings():
+    conf = dict(DEFAULT_POOL_SETTINGS)
+    conf.update(getattr(settings, "RENDER_POOL", {}))
+    return conf
+
+
+class _RenderWorker(threading.Thread):
+    """One thread owning one Playwright instance, browser and context."""
+
+    def __init__(self, pool, index):
+        super().__init__(name=f"render-worker-{index}", daemon=True)
+        self.pool = pool
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.renders = 0
+
+    # -- browser lifecycle -------------------------------------------------
+
+    def _start_browser(self):
+        from playwright.sync_api import sync_playwright
+
+        if self.playwright is None:
+            self.playwright = sync_playwright().start()
+        self.browser = self.playwright.chromium.launch()
+        self._new_context()
+
+    def _new_context(self):
+        if self.context is not None:
+            try:
+                self.context.close()
+            except Exception:
+                logger.warning("Failed to close recycled browser context", exc_info=True)
+        self.context = self.browser.new_context()
+        self.renders = 0
+
+    def _is_healthy(self):
+        return self.browser is not None and self.browser.is_connected()
+
+    def _ensure_ready(self):
+        """Health check before every job: relaunch dead browsers, recycle old contexts."""
+        if not self._is_healthy():
+            logger.warning("%s: browser not connected, relaunching", self.name)
+            self._stop_browser(keep_playwright=True)
+            self._start_browser()
+        elif self.renders >= self.pool.max_renders_per_context:
+            self._new_context()
+
+    def _stop_browser(self, keep_playwright=False):
+        for closer in (self.context, self.browser):
+            if closer is None:
+                continue
+            try:
+                closer.close()
+            except Exception:
+                pass
+        self.context = None
+        self.browser = None
+        if not keep_playwright and self.playwright is not None:
+            try:
+                self.playwright.stop()
+            except Exception:
+                pass
+            self.playwright = None
+
+    # -- job loop ----------------------------------------------------------
+
+    def run(self):
+        while True:
+            job = self.pool._jobs.get()
+            if job is None:
+                break
+            func, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            page = None
+            try:
+                self._ensure_ready()
+                page = self.context.new_page()
+                page.set_default_timeout(self.pool.timeout * 1000)
+                result = func(page)
+            except Exception as exc:
+                future.set_exception(exc)
+                # a failed render may have left the browser in a bad state
+                self._stop_browser(keep_playwright=True)
+            else:
+                future.set_result(result)
+            finally:
+                if page is not None:
+                    try:
+                        page.close()
+                    except Exception:
+                        pass
+                self.renders += 1
+        self._stop_browser()
+
+
+class BrowserPool:
+    """A size-bounded pool of warm browser contexts shared by all views."""
+
+    def __init__(self, size, queue_size, max_renders_per_context, timeout):
+        self.size = size
+        self.max_renders_per_context = max_renders_per_context
+        self.timeout = timeout
+        self._jobs = queue.Queue(maxsize=queue_size)
+        self._workers = [_RenderWorker(self, i) for i in range(size)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, func):
+        """Queue ``func(page)`` for a worker and return a Future."""
+        future = Future()
+        try:
+            self._jobs.put_nowait((func, future))
+        except queue.Full:
+            raise RenderPoolBusy("All renderers are busy, please try again shortly.")
+        return future
+
+    def run(self, func):
+        """Run ``func(page)`` on a pooled page and return its result."""
+        future = self.submit(func)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise RenderTimeout(f"Rendering did not finish within {self.timeout} seconds.")
+
+    def shutdown(self):
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, starting it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                conf = get_pool_settings()
+                _pool = BrowserPool(
+                    size=conf["SIZE"],
+                    queue_size=conf["QUEUE_SIZE"],
+                    max_renders_per_context=conf["MAX_RENDERS_PER_CONTEXT"],
+                    timeout=conf["TIMEOUT"],
+                )
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+def _load(page, html_content):
+    page.set_content(html_content, wait_until="networkidle")
+
+
+def render_pdf(html_content):
+    """Render an HTML document to A4 PDF bytes."""
+    def job(page):
+        _load(page, html_content)
+        return page.pdf(format="A4", print_background=True)
+    return get_pool().run(job)
+
+
+def render_screenshot(html_content, selector):
+    """Render an HTML document and return a PNG screenshot of ``selector``."""
+    def job(page):
+        _load(page, html_content)
+        return page.locator(selector).screenshot()
+    return get_pool().run(job)
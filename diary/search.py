@@ -0,0 +1,159 @@
+# diary/search.py
+"""
+Full-text search over the answers an owner has received (SQLite FTS5).
+
+``diary_answer_fts`` holds, per Answer row (same rowid), the answer text, the
+question text snapshot and the owning user's id. Triggers created by
+migration 0012 (reading the snapshot since 0014) keep it in sync on every
+write, bulk_create included, and when a session changes question set (e.g.
+SET NULL when a set is deleted). The owner is an indexed column so a search
+is ``owner:<id> AND {text question_text}: (terms)``: FTS intersects the
+posting lists instead of matching every user's answers and filtering
+afterwards. ``rebuild_index`` repopulates the table from scratch
+(``manage.py rebuild_answer_search``); ``optimize_index`` only merges its
+segments, which keeps queries fast after large imports.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+
+from .models import Answer, AnswerSession, QuestionSet, QuestionText
+
+FTS_TABLE = "diary_answer_fts"
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+SNIPPET_TOKENS = 12
+
+# bm25 weights for (text, question_text, owner): the answer counts most
+RANK = f"bm25({FTS_TABLE}, 1.0, 0.5, 0.0)"
+
+# FTS returns these around each match; they can't occur in stored text, so the
+# snippet can be escaped as a whole and the markers turned into <mark> after
+_OPEN, _CLOSE = "\x02", "\x03"
+# a word, optionally ending in * for a prefix search
+_TERM = re.compile(r"(\w+)(\*?)", re.UNICODE)
+
+_INDEXED_ROWS = f"""
+    SELECT a.id, a.text, coalesce(qt.text, ''), qs.owner_id
+    FROM {Answer._meta.db_table} a
+    JOIN {AnswerSession._meta.db_table} s ON s.id = a.session_id
+    JOIN {QuestionSet._meta.db_table} qs ON qs.id = s.question_set_id
+    LEFT JOIN {QuestionText._meta.db_table} qt ON qt.id = a.question_snapshot_id
+"""
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query: every word must match.
+
+    Words match whole tokens unless typed with a trailing ``*``. Prefix terms
+    are opt-in because FTS5 merges the doclists of every token sharing the
+    prefix before it can intersect them with the owner's, which for a common
+    word costs several times the exact lookup. Quoting each word keeps FTS5
+    operators and column filters typed by the user literal. Returns None when
+    ``query`` has no searchable words.
+    """
+    terms = _TERM.findall(query or "")
+    if not terms:
+        return None
+    return " ".join(f'"{word}"{star}' for word, star in terms[:16])
+
+
+def _highlight(snippet):
+    return escape(snippet or "").replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def search_answers(owner, query, limit=SEARCH_PAGE_SIZE, offset=0):
+    """
+    Answers to ``owner``'s question sets matching ``query``, best first.
+
+    Each hit is a dict with the session and set it belongs to and HTML-safe
+    ``answer_html`` / ``question_html`` snippets with the matches in <mark>.
+    """
+    terms = match_expression(query)
+    if terms is None:
+        return []
+
+    snippet = "snippet({table}, {column}, %s, %s, '…', {tokens})"
+    sql = f"""
+        SELECT f.rowid, s.id, s.created_at, qs.id, qs.title, qs.slug, u.username,
+               {snippet.format(table=FTS_TABLE, column=0, tokens=SNIPPET_TOKENS)},
+               {snippet.format(table=FTS_TABLE, column=1, tokens=SNIPPET_TOKENS)},
+               {RANK} AS rank
+        FROM {FTS_TABLE} f
+        JOIN {Answer._meta.db_table} a ON a.id = f.rowid
+        JOIN {AnswerSession._meta.db_table} s ON s.id = a.session_id
+        JOIN {QuestionSet._meta.db_table} qs ON qs.id = s.question_set_id AND qs.owner_id = %s
+        LEFT JOIN {get_user_model()._meta.db_table} u
+            ON u.id = s.respondent_id
+        WHERE {FTS_TABLE} MATCH %s
+        ORDER BY rank
+        LIMIT %s OFFSET %s
+    """
+    params = [_OPEN, _CLOSE, _OPEN, _CLOSE, owner.pk, f"owner:{owner.pk} AND {{text question_text}}: ({terms})", limit, offset]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    date_field = AnswerSession._meta.get_field("created_at")
+    hits = []
+    for answer_id, session_id, created_at, set_id, title, slug, respondent, answer, question, rank in rows:
+        created_at = connection.ops.convert_datetimefield_value(created_at, date_field, connection)
+        hits.append({
+            "answer_id": answer_id,
+            "session_id": session_id,
+            "submitted_at": created_at,
+            "question_set_id": set_id,
+            "question_set_title": title,
+            "question_set_slug": slug,
+            "respondent": respondent or "Anonymous",
+            "answer_html": _highlight(answer),
+            "question_html": _highlight(question),
+            "rank": rank,
+        })
+    return hits
+
+
+def filter_matching(queryset, query):
+    """
+    Narrow an Answer queryset to answers whose text or question matches ``query``.
+
+    Not scoped to an owner: this is the admin's search (``AnswerAdmin``).
+    """
+    terms = match_expression(query)
+    if terms is None:
+        return queryset
+    return queryset.filter(pk__in=RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [f"{{text question_text}}: ({terms})"]
+    ))
+
+
+def like_search(owner, query, limit=SEARCH_PAGE_SIZE):
+    """The unindexed ``LIKE '%word%'`` equivalent, kept for the benchmark."""
+    answers = Answer.objects.filter(session__question_set__owner=owner)
+    for word, _star in _TERM.findall(query or ""):
+        answers = answers.filter(text__icontains=word)
+    return list(answers.order_by("-session__created_at").values_list("id", flat=True)[:limit])
+
+
+def optimize_index():
+    """Merge the index's b-trees into one; worth running after bulk loads."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+
+@transaction.atomic
+def rebuild_index():
+    """Repopulate the index from the answers table; returns the number of rows indexed."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, text, question_text, owner) {_INDEXED_ROWS}"
+        )
+        cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+        rows = cursor.fetchone()[0]
+    optimize_index()
+    return rows
@@ -0,0 +1,70 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.db import transaction
+from django.dispatch import receiver
+
+from . import analytics, leaderboard, styles
+from .artifacts import get_store
+from .models import Answer, AnswerSession, Question, QuestionSet, QuestionSetStyle
+
+
+# Rendered PDFs are filed per session and share cards per question set, and
+# every input printed on them is part of their key, so a change never serves
+# a stale file; these handlers only clear out files that can no longer be
+# hit, where that costs a single directory. Answers deleted in bulk (a session
+# or user cascade) and set edits leave theirs to age out through eviction.
+# Question edits need no handler: the PDF prints each answer's question text
+# snapshot, not the live question.
+
+@receiver(post_save, sender=Answer)
+def invalidate_response_pdf(sender, instance, **kwargs):
+    get_store().invalidate("responses", instance.session_id)
+
+
+@receiver(post_delete, sender=AnswerSession)
+def drop_session_artifacts(sender, instance, **kwargs):
+    get_store().invalidate("responses", instance.pk)
+
+
+@receiver([post_save, post_delete], sender=QuestionSet)
+def invalidate_question_set_artifacts(sender, instance, created=False, **kwargs):
+    if not created:
+        get_store().invalidate("share-cards", instance.pk)
+
+
+@receiver(post_save, sender=Answer)
+def count_new_answer(sender, instance, created, **kwargs):
+    # submit_answers bulk-creates its answers and records them itself; deleted
+    # answers are taken off by a database trigger (see diary.analytics)
+    if created:
+        with transaction.atomic():
+            analytics.record_answers([instance], instance.session)
+
+
+@receiver(post_save, sender=Question)
+def create_question_stats(sender, instance, created, **kwargs):
+    if created:
+        analytics.create_stats([instance.pk])
+
+
+@receiver(post_save, sender=AnswerSession)
+def count_new_session(sender, instance, created, **kwargs):
+    if created:
+        leaderboard.record_session(instance, 1)
+
+
+@receiver(post_delete, sender=AnswerSession)
+def uncount_deleted_session(sender, instance, **kwargs):
+    leaderboard.record_session(instance, -1)
+
+
+@receiver(pre_delete, sender=QuestionSet)
+def uncount_question_set_sessions(sender, instance, **kwargs):
+    # the sessions survive with question_set=NULL and no longer count for the owner
+    leaderboard.forget_question_set(instance)
+
+
+@receiver([post_save, post_delete], sender=QuestionSetStyle)
+def invalidate_style_registry(sender, **kwargs):
+    styles.bump_version()
+    # and again once committed, in case another process reloaded the old rows in between
+    transaction.on_commit(styles.bump_version)
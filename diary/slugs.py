@@ -0,0 +1,43 @@
+# diary/slugs.py
+"""
+Slug allocation for QuestionSet.
+
+Titles are transliterated with unidecode first, so Georgian or Russian titles
+get readable Latin slugs. The next free ``<base>-<n>`` is found with one query:
+a range scan over the unique slug index covering ``base-0`` up to ``base-9...``
+(':' sorts right after '9') that returns the highest numeric suffix in use.
+A slug such as ``base-2-extra`` from another title casts to 2 and at worst
+makes us skip a number; ``max + 1`` is always free.
+"""
+from django.db.models import Case, Count, IntegerField, Max, Q, Value, When
+from django.db.models.functions import Cast, Substr
+from django.utils.text import slugify
+from unidecode import unidecode
+
+SLUG_MAX_LENGTH = 255
+SUFFIX_ROOM = 11  # "-" plus up to ten digits
+FALLBACK_SLUG = "diary"
+
+
+def base_slug(title):
+    slug = slugify(unidecode(title or ""))[:SLUG_MAX_LENGTH - SUFFIX_ROOM].strip("-")
+    return slug or FALLBACK_SLUG
+
+
+def allocate_slug(model, title):
+    """Return ``base_slug(title)`` or, if taken, the next free ``<base>-<n>``."""
+    base = base_slug(title)
+    suffix = Cast(Substr("slug", len(base) + 2), IntegerField())
+    taken = (
+        model._default_manager.filter(
+            Q(slug=base)
+            | Q(slug__gte=f"{base}-0", slug__lt=f"{base}-:")
+        )
+        .aggregate(
+            count=Count("pk"),
+            top=Max(Case(When(slug=base, then=Value(0)), default=suffix, output_field=IntegerField())),
+        )
+    )
+    if not taken["count"]:
+        return base
+    return f"{base}-{(taken['top'] or 0) + 1}"
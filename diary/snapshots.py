@@ -0,0 +1,77 @@
+# diary/snapshots.py
+"""
+Question text snapshots (``QuestionText``).
+
+An answer keeps the question text it was given for, so that editing or
+deleting the question later does not change what the answer was to. The text
+is stored once per distinct value in ``QuestionText``, keyed by its SHA-256,
+and every answer to it references that row: a question answered 10,000 times
+stores its text once instead of in each answer row.
+
+Each question also points at the snapshot of its current text
+(``Question.snapshot``, kept up to date by ``Question.save``), so answering
+it copies the snapshot from the question already in memory and a submission
+runs no snapshot queries at all; load the questions with
+select_related("snapshot") when the answers' texts are read back. ``take_snapshots`` falls back to interning
+the texts of questions without one, such as bulk-created questions (call
+``snapshot_questions`` before bulk-creating them to avoid that). Looking up
+texts that already have a row costs one query; new texts add one upsert on
+the digest, so concurrent writers of the same new text end up sharing one
+row and the insert still returns its id. The upsert's no-op "update" of the
+digest is the only write a snapshot row ever sees after its insert, and
+answers and questions protect the rows from deletion.
+"""
+import hashlib
+
+from .models import Question, QuestionText
+
+LOOKUP_BATCH_SIZE = 500
+
+
+def text_digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _by_digest(digests):
+    found = {}
+    digests = list(digests)
+    for start in range(0, len(digests), LOOKUP_BATCH_SIZE):
+        found.update(
+            (snapshot.digest, snapshot)
+            for snapshot in QuestionText.objects.filter(digest__in=digests[start:start + LOOKUP_BATCH_SIZE])
+        )
+    return found
+
+
+def intern(texts):
+    """Map each of ``texts`` to its ``QuestionText``, creating the missing ones."""
+    digests = {text_digest(text): text for text in set(texts)}
+    found = _by_digest(digests)
+    missing = [QuestionText(digest=digest, text=text) for digest, text in digests.items() if digest not in found]
+    if missing:
+        QuestionText.objects.bulk_create(
+            missing, batch_size=LOOKUP_BATCH_SIZE,
+            update_conflicts=True, unique_fields=["digest"], update_fields=["digest"],
+        )
+        found.update((snapshot.digest, snapshot) for snapshot in missing)
+    return {text: found[digest] for digest, text in digests.items()}
+
+
+def snapshot_questions(questions):
+    """Point each of ``questions`` at the snapshot of its current text."""
+    snapshots = intern(question.text for question in questions)
+    for question in questions:
+        question.snapshot = snapshots[question.text]
+
+
+def take_snapshots(answers):
+    """Point every answer in ``answers`` that has a question but no snapshot at its question's current text."""
+    pending = [answer for answer in answers if answer.question is not None and answer.question_snapshot_id is None]
+    unresolved = [answer.question for answer in pending if answer.question.snapshot_id is None]
+    if unresolved:
+        snapshot_questions(unresolved)
+    for answer in pending:
+        if Question.snapshot.is_cached(answer.question):
+            answer.question_snapshot = answer.question.snapshot
+        else:
+            answer.question_snapshot_id = answer.question.snapshot_id
@@ -0,0 +1,87 @@
+# diary/styles.py
+"""
+Process-local registry of QuestionSetStyle rows.
+
+Styles change rarely, so each process loads the whole table once and serves
+the form, ``style_list`` and every template lookup from memory. A version
+number in the shared cache is bumped by ``diary.signals`` whenever a style is
+saved or deleted (the admin included); each read compares it with the version
+the registry was loaded at and reloads on mismatch. The cached instances are
+shared between requests and must be treated as read-only.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+from .models import QuestionSetStyle
+
+VERSION_KEY = "question-set-styles:version"
+DEFAULT_TEMPLATE = "style_classic.html"
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # start from the clock, not 1, so a flushed cache never matches a loaded registry
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # not in the cache (first write, or evicted): any fresh value invalidates
+        cache.set(VERSION_KEY, current_version() + 1, timeout=None)
+
+
+class StyleRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._styles = []
+        self._by_pk = {}
+
+    def _load(self):
+        version = current_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            styles = list(QuestionSetStyle.objects.all())
+            self._styles = styles
+            self._by_pk = {style.pk: style for style in styles}
+            self._version = version
+
+    def all(self):
+        self._load()
+        return list(self._styles)
+
+    def get(self, pk):
+        self._load()
+        return self._by_pk.get(pk)
+
+
+registry = StyleRegistry()
+
+
+def all_styles():
+    """Every style, in the model's default order."""
+    return registry.all()
+
+
+def get_style(pk):
+    return registry.get(pk) if pk is not None else None
+
+
+def style_template(style):
+    """Template path for ``style``, or the default template for None."""
+    return f"diary/{style.template_name if style else DEFAULT_TEMPLATE}"
+
+
+def template_for(question_set):
+    """Template path for rendering ``question_set``, without touching ``question_set.style``."""
+    return style_template(get_style(question_set.style_id))
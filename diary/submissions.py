@@ -0,0 +1,83 @@
+# diary/submissions.py
+"""
+Write path for answering a shared question set.
+
+A submission is one transaction: consume the respondent's weekly quota, create
+the session, bulk-create every answer pointing at the snapshot of its
+question's text (``diary.snapshots``, taken from the questions already in
+memory), fold the answers into their questions'
+rollups (``diary.analytics``), and bulk-create both notifications
+(bumping the unread counters). On SQLite that is a single commit instead of
+one per row. Once it commits, the owner's open event streams get the new
+response (``diary.live``).
+"""
+from functools import partial
+
+from django.db import transaction
+
+from users import quota
+from users.models import Notification, NotificationType
+from users.notifications import notify
+from . import analytics
+from .live import publish_response
+from .models import Answer, AnswerSession
+from .snapshots import take_snapshots
+
+
+class QuotaExceeded(Exception):
+    """The respondent has no answers left this week."""
+
+
+def collect_answers(questions, data):
+    """Map each question to its non-empty answer in ``data`` (e.g. request.POST)."""
+    answers = []
+    for question in questions:
+        answer_text = data.get(f"question_{question.id}", "").strip()
+        if answer_text:
+            answers.append((question, answer_text))
+    return answers
+
+
+@transaction.atomic
+def submit_answers(question_set, respondent, answers):
+    """
+    Store one response to ``question_set``.
+
+    ``answers`` is a list of (question, text) pairs, see ``collect_answers``.
+    ``question_set.owner`` should already be loaded (select_related) since it
+    is used for the notification text. Raises QuotaExceeded, writing nothing,
+    when the respondent is out of answers for the week.
+    """
+    if not quota.consume_answer(respondent):
+        raise QuotaExceeded
+
+    session = AnswerSession.objects.create(respondent=respondent, question_set=question_set)
+
+    # bulk_create skips Answer.save(), so take the snapshots here
+    created = [Answer(session=session, question=question, text=text) for question, text in answers]
+    take_snapshots(created)
+    created = Answer.objects.bulk_create(created)
+    analytics.record_answers(created, session)
+    transaction.on_commit(partial(publish_response, session, created))
+
+    owner = question_set.owner
+    notify([
+        # Notify diary owner
+        Notification(
+            user=owner,
+            actor=respondent,
+            type=NotificationType.RECEIVED_RESPONSE,
+            message=f"{respondent.username} answered your diary '{question_set.title}'.",
+            question_set=question_set,
+            related_object_id=session.pk,
+        ),
+        # Notify the answering user (optional confirmation)
+        Notification(
+            user=respondent,
+            type=NotificationType.ANSWERED_DIARY,
+            message=f"You answered {owner.username}'s diary '{question_set.title}'.",
+            question_set=question_set,
+            related_object_id=session.pk,
+        ),
+    ])
+    return session
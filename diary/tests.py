@@ -1,3 +1,1035 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import io
+import logging
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin import site
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import ProtectedError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+
+from DiaryProject import admin_tools, events, instrumentation, sqlite, warmup
+from DiaryProject.queryplans import plan_problems, query_plan
+from users.models import Notification, WeeklyAnswerQuota
+from . import analytics, artifacts, leaderboard, rendering, search, snapshots, styles
+from .forms import QuestionSetCreateForm
+from .models import (
+    QuestionSet, QuestionSetStyle, Question, AnswerSession, Answer, LeaderboardEntry, NewsItem, QuestionStats,
+    QuestionText,
+)
+from .slugs import allocate_slug
+from .submissions import submit_answers
+
+User = get_user_model()
+
+
+class FetchResponsesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="pw")
+        cls.friend = User.objects.create_user(username="friend", password="pw")
+        for s in range(3):
+            qset = QuestionSet.objects.create(owner=cls.owner, title=f"Diary {s}")
+            questions = [Question.objects.create(question_set=qset, text=f"Q{i}", order=i) for i in range(4)]
+            for _ in range(4):
+                session = AnswerSession.objects.create(respondent=cls.friend, question_set=qset)
+                for question in questions:
+                    Answer.objects.create(session=session, question=question, text="yes")
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def _fetch(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("diary:fetch_responses"), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(ctx.captured_queries)
+
+    def test_walks_every_session_once_newest_first(self):
+        seen = []
+        data, _ = self._fetch(limit=5)
+        seen += data["responses"]
+        while data["next_cursor"]:
+            data, _ = self._fetch(limit=5, cursor=data["next_cursor"])
+            seen += data["responses"]
+
+        expected = list(
+            AnswerSession.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual([r["id"] for r in seen], expected)
+        self.assertTrue(all(len(r["answers"]) == 4 for r in seen))
+
+    def test_query_count_is_constant_per_page(self):
+        first, small = self._fetch(limit=1)
+        _, large = self._fetch(limit=10)
+        _, deep = self._fetch(limit=10, cursor=first["next_cursor"])
+        self.assertEqual(small, large)
+        self.assertEqual(large, deep)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("diary:fetch_responses"), {"cursor": "nope"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportResponsesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="pw")
+        cls.friend = User.objects.create_user(username="friend", password="pw")
+        cls.qset = QuestionSet.objects.create(owner=cls.owner, title="Export me")
+        cls.questions = [
+            Question.objects.create(question_set=cls.qset, text=f"Q{i}", order=i) for i in range(2)
+        ]
+        session = AnswerSession.objects.create(respondent=cls.friend, question_set=cls.qset)
+        for question in cls.questions:
+            Answer.objects.create(session=session, question=question, text=f"A to {question.text}")
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def _export(self, fmt):
+        response = self.client.get(reverse("diary:export_responses", args=[self.qset.slug, fmt]))
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_has_one_column_per_question(self):
+        self.questions[1].delete()  # snapshot survives as its own column
+        header, row = self._export("csv").splitlines()
+        self.assertEqual(header, "session_id,respondent,submitted_at,Q0,Q1")
+        cells = row.split(",")
+        self.assertEqual(cells[1], "friend")
+        self.assertEqual(cells[3:], ["A to Q0", "A to Q1"])
+
+    def test_ndjson_one_line_per_session(self):
+        lines = self._export("ndjson").splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn('"answer": "A to Q1"', lines[0])
+
+    def test_other_users_cannot_export(self):
+        self.client.force_login(self.friend)
+        response = self.client.get(reverse("diary:export_responses", args=[self.qset.slug, "csv"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pw")
+        self.friend = User.objects.create_user(username="friend", password="pw")
+        self.qset = QuestionSet.objects.create(owner=self.owner, title="Popular")
+
+    def _counts(self):
+        return dict(
+            LeaderboardEntry.objects.filter(user=self.owner).values_list("period", "response_count")
+        )
+
+    def test_sessions_update_all_time_and_weekly_rows(self):
+        sessions = [
+            AnswerSession.objects.create(respondent=self.friend, question_set=self.qset) for _ in range(3)
+        ]
+        week = leaderboard.week_period()
+        self.assertEqual(self._counts(), {"all": 3, week: 3})
+
+        sessions[0].delete()
+        self.assertEqual(self._counts(), {"all": 2, week: 2})
+
+        self.qset.delete()
+        self.assertEqual(self._counts(), {"all": 0, week: 0})
+        self.assertEqual(list(leaderboard.top_entries()), [])
+
+    def test_rebuild_repairs_drift(self):
+        AnswerSession.objects.create(respondent=self.friend, question_set=self.qset)
+        LeaderboardEntry.objects.filter(user=self.owner).update(response_count=42)
+        leaderboard.rebuild()
+        self.assertEqual(self._counts(), {"all": 1, leaderboard.week_period(): 1})
+
+
+class SlugAllocationTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pw")
+
+    def _create(self, title):
+        return QuestionSet.objects.create(owner=self.owner, title=title).slug
+
+    def test_same_title_gets_next_suffix(self):
+        slugs = [self._create("My Diary") for _ in range(3)]
+        self.assertEqual(slugs, ["my-diary", "my-diary-1", "my-diary-2"])
+        # unrelated slugs sharing the prefix do not count as suffixes
+        self._create("My Diary Extra")
+        self.assertEqual(self._create("My Diary"), "my-diary-3")
+
+    def test_transliterates_georgian_and_russian_titles(self):
+        self.assertEqual(self._create("ჩემი დღიური"), "chemi-dgiuri")
+        self.assertEqual(self._create("Мой дневник"), "moi-dnevnik")
+        self.assertEqual(self._create("Мой дневник"), "moi-dnevnik-1")
+
+    def test_allocation_is_one_query(self):
+        for _ in range(5):
+            self._create("Popular")
+        with self.assertNumQueries(1):
+            self.assertEqual(allocate_slug(QuestionSet, "Popular"), "popular-5")
+
+
+class InstrumentationMiddlewareTests(TestCase):
+    def setUp(self):
+        instrumentation.stats.reset()
+        self.user = User.objects.create_user(username="owner", password="pw")
+        self.client.force_login(self.user)
+
+    def test_records_view_samples(self):
+        self.client.get(reverse("diary:fetch_responses"))
+        report = instrumentation.snapshot()["diary:fetch_responses"]
+        self.assertEqual(report["count"], 1)
+        self.assertGreater(report["queries_max"], 0)
+
+    def test_warns_when_budget_exceeded(self):
+        perf = {"BUDGETS": {"diary:fetch_responses": 0}}
+        with self.settings(PERF_INSTRUMENTATION=perf), self.assertLogs("diary.perf", "WARNING") as logs:
+            # the middleware reads its settings once, when the handler loads it
+            self.client.handler.load_middleware()
+            self.client.get(reverse("diary:fetch_responses"))
+        self.assertIn("query_budget_exceeded", logs.output[0])
+
+    def test_nothing_is_serialised_when_nothing_is_logged(self):
+        perf_logger = logging.getLogger("diary.perf")
+        self.addCleanup(perf_logger.setLevel, perf_logger.level)
+        perf_logger.setLevel(logging.ERROR)
+        with mock.patch.object(instrumentation, "json") as json_module:
+            self.client.get(reverse("diary:fetch_responses"))
+        json_module.dumps.assert_not_called()
+        self.assertEqual(instrumentation.snapshot()["diary:fetch_responses"]["count"], 1)
+
+    def test_first_answer_of_the_week_is_within_budget(self):
+        question_set = QuestionSet.objects.create(owner=self.user, title="Budget")
+        questions = [Question.objects.create(question_set=question_set, text=f"Q{i}?", order=i) for i in range(3)]
+        friend = User.objects.create_user(username="friend", password="pw")
+        self.client.force_login(friend)
+        response = self.client.post(
+            reverse("diary:answer_question_set_shared", args=[question_set.share_uuid]),
+            {f"question_{q.id}": "yes" for q in questions},
+        )
+        self.assertEqual(response.status_code, 302)
+        report = instrumentation.snapshot()["diary:answer_question_set_shared"]
+        self.assertLessEqual(
+            report["queries_max"], settings.PERF_INSTRUMENTATION["BUDGETS"]["diary:answer_question_set_shared"]
+        )
+
+
+class StyleRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="stylist", password="pw")
+        self.basic = QuestionSetStyle.objects.create(name="basic", template_name="style_basic.html")
+        self.retro = QuestionSetStyle.objects.create(
+            name="retro", template_name="style_retro.html", is_premium=True
+        )
+
+    def test_styles_load_once_until_one_changes(self):
+        styles.all_styles()
+        qset = QuestionSet.objects.create(owner=self.owner, title="Styled", style=self.retro)
+        with self.assertNumQueries(0):
+            self.assertEqual([s.name for s in styles.all_styles()], ["basic", "retro"])
+            self.assertEqual(styles.template_for(qset), "diary/style_retro.html")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.retro.template_name = "style_grunge.html"
+            self.retro.save()
+        self.assertEqual(styles.template_for(qset), "diary/style_grunge.html")
+
+    def test_sets_without_style_use_the_classic_template(self):
+        qset = QuestionSet.objects.create(owner=self.owner, title="Plain")
+        respondent = User.objects.create_user(username="visitor", password="pw")
+        self.client.force_login(respondent)
+        response = self.client.get(reverse("diary:answer_question_set_shared", args=[qset.share_uuid]))
+        self.assertTemplateUsed(response, "diary/style_classic.html")
+
+    def test_create_form_reads_choices_from_registry(self):
+        styles.all_styles()
+        with CaptureQueriesContext(connection) as ctx:
+            form = QuestionSetCreateForm(user=self.owner)
+            choices = list(form.fields["style"].choices)
+        self.assertFalse([q for q in ctx.captured_queries if "diary_questionsetstyle" in q["sql"]])
+        self.assertIn((self.retro.pk, "retro (Premium)"), choices)
+
+
+class TemplateWarmupTests(TestCase):
+    def test_warm_up_compiles_styles_includes_and_base_templates(self):
+        QuestionSetStyle.objects.create(name="basic", template_name="style_basic.html")
+        timings = warmup.warm_templates()
+        for name in ("base.html", "includes/leaderboard.html", "diary/style_basic.html",
+                     "diary/style_classic.html", "diary/style_grunge.html", "diary/style_retro.html"):
+            self.assertIn(name, timings)
+
+    def test_check_command_reports_missing_templates(self):
+        QuestionSetStyle.objects.create(name="basic", template_name="style_basic.html")
+        call_command("check_style_templates", stdout=io.StringIO())
+
+        QuestionSetStyle.objects.create(name="ghost", template_name="style_missing.html")
+        with self.assertRaises(CommandError):
+            call_command("check_style_templates", stdout=io.StringIO(), stderr=io.StringIO())
+
+
+class ArtifactStoreTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = artifacts.ArtifactStore(directory.name, max_bytes=100)
+        patcher = mock.patch.object(artifacts, "_store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.owner = User.objects.create_user(username="owner", password="pw")
+        self.question_set = QuestionSet.objects.create(owner=self.owner, title="Printable")
+        question = Question.objects.create(question_set=self.question_set, text="Why?", order=0)
+        friend = User.objects.create_user(username="friend", password="pw")
+        self.session = AnswerSession.objects.create(question_set=self.question_set, respondent=friend)
+        self.answer = Answer.objects.create(session=self.session, question=question, text="Because")
+        self.client.force_login(self.owner)
+
+    def _download(self):
+        response = self.client.get(reverse("diary:download_single_response", args=[self.session.pk]))
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    @mock.patch("diary.views.render_pdf", return_value=b"%PDF-1")
+    def test_repeat_download_is_served_from_disk(self, render_pdf):
+        self.assertEqual(self._download(), b"%PDF-1")
+        self.assertEqual(self._download(), b"%PDF-1")
+        self.assertEqual(render_pdf.call_count, 1)
+
+    @mock.patch("diary.views.render_pdf", side_effect=[b"%PDF-1", b"%PDF-2"])
+    def test_answer_edit_invalidates_the_pdf(self, render_pdf):
+        self._download()
+        self.answer.text = "Just because"
+        self.answer.save()
+        self.assertFalse((self.store.root / "responses" / str(self.session.pk)).exists())
+        self.assertEqual(self._download(), b"%PDF-2")
+        self.assertEqual(render_pdf.call_count, 2)
+
+    @mock.patch("pages.views.render_screenshot", return_value=b"PNG")
+    def test_share_card_is_cached(self, render_screenshot):
+        url = reverse("pages:share_card", args=[self.question_set.pk])
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertEqual(b"".join(response.streaming_content), b"PNG")
+        self.assertEqual(render_screenshot.call_count, 1)
+
+    def test_going_over_max_bytes_evicts_the_oldest(self):
+        for i in range(4):
+            self.store.put("ns", "scope", f"file-{i}", b"x" * 30)
+            path = self.store.path_for("ns", "scope", f"file-{i}")
+            os.utime(path, (1000 + i, 1000 + i))
+        # the fourth write makes 120 bytes > 100: the oldest go until the store is back to 90
+        self.assertIsNone(self.store.get("ns", "scope", "file-0"))
+        for i in range(1, 4):
+            self.assertEqual(self.store.get("ns", "scope", f"file-{i}"), b"x" * 30)
+        self.assertEqual(self.store._size, 90)
+
+    def test_writes_under_the_limit_do_not_walk_the_tree(self):
+        self.store.put("ns", "scope", "first", b"x")
+        with mock.patch.object(self.store, "_files", side_effect=AssertionError("walked")):
+            self.store.put("ns", "scope", "second", b"x")
+        self.assertEqual(self.store._size, 2)
+        self.store.invalidate("ns", "scope")
+        self.assertEqual(self.store._size, 0)
+
+
+class _FakePage:
+    def __init__(self, context):
+        self.context = context
+        self.timeout = None
+
+    def set_default_timeout(self, timeout):
+        self.timeout = timeout
+
+    def close(self):
+        pass
+
+
+class _FakeContext:
+    def new_page(self):
+        return _FakePage(self)
+
+    def close(self):
+        pass
+
+
+class _FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+
+    def is_connected(self):
+        return True
+
+    def new_context(self):
+        self.contexts.append(_FakeContext())
+        return self.contexts[-1]
+
+    def close(self):
+        pass
+
+
+class BrowserPoolTests(TestCase):
+    """The pool's queueing and lifecycle, with a fake browser instead of Playwright."""
+
+    def setUp(self):
+        self.browsers = []
+
+        def start_browser(worker):
+            worker.browser = _FakeBrowser()
+            self.browsers.append(worker.browser)
+            worker._new_context()
+
+        patcher = mock.patch.object(rendering._RenderWorker, "_start_browser", start_browser)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def _pool(self, **options):
+        options = {"size": 1, "queue_size": 1, "max_renders_per_context": 50, "timeout": 5, **options}
+        pool = rendering.BrowserPool(**options)
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def _blocking_job(self, started):
+        def job(page):
+            started.set()
+            self.release.wait(5)
+            return page
+        return job
+
+    def test_full_queue_raises_busy(self):
+        pool = self._pool()
+        started = threading.Event()
+        running = pool.submit(self._blocking_job(started))
+        self.assertTrue(started.wait(5))
+        waiting = pool.submit(lambda page: "queued")
+        with self.assertRaises(rendering.RenderPoolBusy):
+            pool.submit(lambda page: "one too many")
+        self.release.set()
+        running.result(5)
+        self.assertEqual(waiting.result(5), "queued")
+
+    def test_slow_render_times_out(self):
+        pool = self._pool(timeout=0.1)
+        with self.assertRaises(rendering.RenderTimeout):
+            pool.run(self._blocking_job(threading.Event()))
+        self.release.set()
+        # the page got the same limit as its Playwright default timeout
+        self.assertEqual(pool.run(lambda page: page.timeout), 100)
+
+    def test_context_is_recycled_after_max_renders(self):
+        pool = self._pool(max_renders_per_context=2)
+        contexts = [pool.run(lambda page: page.context) for _ in range(5)]
+        self.assertEqual(len(set(map(id, contexts))), 3)
+        self.assertEqual(len(self.browsers), 1)
+
+
+class SQLiteProfileTests(TestCase):
+    def test_production_profile_applies_pragmas_on_connect(self):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        with tempfile.TemporaryDirectory() as directory:
+            settings_dict = dict(connection.settings_dict, NAME=os.path.join(directory, "profile.sqlite3"))
+            sqlite.apply_profile(settings_dict, "production")
+            wrapper = DatabaseWrapper(settings_dict, alias="profile-test")
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    self.assertEqual(cursor.fetchone()[0], "wal")
+                    cursor.execute("PRAGMA busy_timeout")
+                    self.assertEqual(cursor.fetchone()[0], 5000)
+                    cursor.execute("PRAGMA synchronous")
+                    self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            finally:
+                wrapper.close()
+        self.assertEqual(settings_dict["CONN_MAX_AGE"], 600)
+        self.assertEqual(settings_dict["OPTIONS"], {"transaction_mode": "IMMEDIATE"})
+
+    def test_unknown_profile_is_rejected(self):
+        with self.assertRaises(ValueError):
+            sqlite.apply_profile({}, "turbo")
+
+
+class QueryPlanTests(TestCase):
+    """The main query of each hot view must be served by an index, not a scan or a sort."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="pw")
+        cls.friend = User.objects.create_user(username="friend", password="pw")
+        cls.question_set = QuestionSet.objects.create(owner=cls.owner, title="Diary")
+        Question.objects.create(question_set=cls.question_set, text="Q", order=0)
+        AnswerSession.objects.create(respondent=cls.friend, question_set=cls.question_set)
+        NewsItem.objects.create(title="News", description="...")
+
+    def assertIndexed(self, queryset, **allowances):
+        plan = query_plan(queryset)
+        self.assertEqual(plan_problems(plan, **allowances), [], plan)
+
+    def test_answer_page_questions(self):
+        self.assertIndexed(self.question_set.questions.all().order_by("order"))
+
+    def test_question_set_responses(self):
+        self.assertIndexed(self.question_set.answer_sessions.all().order_by("-created_at"))
+
+    def test_fetch_responses_pages(self):
+        sessions = AnswerSession.objects.filter(question_set__owner=self.owner).order_by("-created_at", "-id")
+        page = sessions.filter(created_at__lt=timezone.now())[:11]
+        # the newest sessions across all of the owner's sets are merged in a sort;
+        # what matters is that only the owner's sessions are read, through the index
+        plan = query_plan(page)
+        self.assertEqual(plan_problems(plan, allow_sort=True), [], plan)
+        self.assertTrue(any("INDEX session_set_created_idx" in step for step in plan), plan)
+
+    def test_respondent_sessions_in_a_week(self):
+        self.assertIndexed(AnswerSession.objects.filter(
+            respondent=self.friend, created_at__gte=timezone.now() - timedelta(days=7),
+        ))
+
+    def test_home_carousel(self):
+        self.assertIndexed(
+            NewsItem.objects.filter(is_active=True).order_by("display_order", "-created_at"),
+            allowed_scans=["newsitem_carousel_idx"],
+        )
+
+    def test_home_leaderboard(self):
+        self.assertIndexed(leaderboard.top_entries())
+
+
+def _reload_urlconfs():
+    # the URLconfs pick sync or async views from settings.ASYNC_VIEWS at import time
+    import DiaryProject.urls
+    import diary.urls
+    import pages.urls
+    import users.urls
+
+    for module in (pages.urls, users.urls, diary.urls, DiaryProject.urls):
+        importlib.reload(module)
+    clear_url_caches()
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.enterClassContext(override_settings(ASYNC_VIEWS=True))
+        _reload_urlconfs()
+        cls.addClassCleanup(_reload_urlconfs)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="owner", password="pw")
+        cls.friend = User.objects.create_user(username="friend", password="pw")
+        style = QuestionSetStyle.objects.create(name="Classic", template_name="style_classic.html")
+        cls.question_set = QuestionSet.objects.create(owner=cls.owner, title="Async diary", style=style)
+        cls.questions = [
+            Question.objects.create(question_set=cls.question_set, text=f"Q{i}", order=i) for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        instrumentation.stats.reset()
+
+    def test_urls_route_to_async_views(self):
+        for url in (
+            reverse("pages:home"),
+            reverse("users:profile"),
+            reverse("diary:fetch_responses"),
+            reverse("diary:answer_question_set_shared", args=[self.question_set.share_uuid]),
+        ):
+            self.assertTrue(resolve(url).func.__name__.endswith("_async"), url)
+
+    async def test_home_page(self):
+        response = await self.async_client.get(reverse("pages:home"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("csrftoken", response.cookies)
+
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(reverse("pages:home"))
+        self.assertEqual(response.status_code, 200)
+
+    async def test_answer_submission_and_responses(self):
+        url = reverse("diary:answer_question_set_shared", args=[self.question_set.share_uuid])
+        await self.async_client.aforce_login(self.friend)
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Q2")
+
+        response = await self.async_client.post(url, {f"question_{q.id}": "yes" for q in self.questions})
+        self.assertEqual(response.status_code, 302)
+        session = await AnswerSession.objects.aget(respondent=self.friend)
+        self.assertEqual(await session.answers.acount(), 3)
+        self.assertEqual(await WeeklyAnswerQuota.objects.filter(user=self.friend).values_list("used", flat=True).aget(), 1)
+        self.assertEqual(await Notification.objects.filter(user=self.owner).acount(), 1)
+
+        await self.async_client.aforce_login(self.owner)
+        data = (await self.async_client.get(reverse("diary:fetch_responses"))).json()
+        self.assertEqual([r["id"] for r in data["responses"]], [session.id])
+        self.assertEqual(len(data["responses"][0]["answers"]), 3)
+        response = await self.async_client.get(reverse("diary:fetch_responses"), {"cursor": "nope"})
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.async_client.get(reverse("users:profile"), {"cursor": "nope"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["unread_count"], 1)
+        self.assertEqual(len(response.context["notifications"]), 1)
+
+    async def test_middleware_records_async_requests(self):
+        await self.async_client.aforce_login(self.owner)
+        await self.async_client.get(reverse("diary:fetch_responses"))
+        report = instrumentation.snapshot()["diary:fetch_responses"]
+        self.assertEqual(report["count"], 1)
+        self.assertGreater(report["queries_max"], 0)
+
+
+class LiveResponseTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pw")
+        self.friend = User.objects.create_user(username="friend", password="pw")
+        self.question_set = QuestionSet.objects.create(owner=self.owner, title="Live diary")
+        self.question = Question.objects.create(question_set=self.question_set, text="Q", order=0)
+
+    def test_submission_is_published_after_commit(self):
+        with mock.patch.object(events, "publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                session = submit_answers(self.question_set, self.friend, [(self.question, "yes")])
+                publish.assert_not_called()
+
+        by_type = {call.args[1]: call.args for call in publish.call_args_list}
+        user_id, _type, payload = by_type["response"]
+        self.assertEqual(user_id, self.owner.pk)
+        self.assertEqual(payload["id"], session.pk)
+        self.assertEqual(payload["answers"], [{"question": "Q", "answer": "yes"}])
+
+        # the popup splices live responses into pages loaded from fetch_responses
+        self.client.force_login(self.owner)
+        listed = self.client.get(reverse("diary:fetch_responses")).json()["responses"][0]
+        self.assertEqual(listed, payload)
+
+
+class AnswerSearchTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pw")
+        self.other = User.objects.create_user(username="other", password="pw")
+        self.friend = User.objects.create_user(username="friend", password="pw")
+        self.question_set = QuestionSet.objects.create(owner=self.owner, title="Holidays")
+        self.question = Question.objects.create(question_set=self.question_set, text="Favourite place?", order=0)
+        self.session = AnswerSession.objects.create(question_set=self.question_set, respondent=self.friend)
+
+    def _ids(self, user, query):
+        return [hit["answer_id"] for hit in search.search_answers(user, query)]
+
+    def test_index_follows_writes(self):
+        answer = Answer.objects.create(session=self.session, question=self.question, text="Sunny beaches")
+        food = snapshots.intern(["Food?"])["Food?"]
+        bulk = Answer.objects.bulk_create([Answer(session=self.session, question_snapshot=food, text="Mango sorbet")])
+        self.assertEqual(self._ids(self.owner, "beaches"), [answer.pk])
+        self.assertEqual(self._ids(self.owner, "beach"), [])
+        self.assertEqual(self._ids(self.owner, "beach*"), [answer.pk])
+        self.assertEqual(self._ids(self.owner, "SORBET"), [bulk[0].pk])
+        self.assertEqual(self._ids(self.owner, "favourite"), [answer.pk])  # the question text is indexed too
+
+        Answer.objects.filter(pk=answer.pk).update(text="Snowy mountains")
+        self.assertEqual(self._ids(self.owner, "beaches"), [])
+        self.assertEqual(self._ids(self.owner, "mountains"), [answer.pk])
+
+        answer.delete()
+        self.assertEqual(self._ids(self.owner, "mountains"), [])
+
+    def test_results_are_scoped_to_the_owner(self):
+        Answer.objects.create(session=self.session, question=self.question, text="Secret garden")
+        self.assertEqual(self._ids(self.other, "garden"), [])
+
+        self.question_set.owner = self.other
+        self.question_set.save()
+        self.assertEqual(len(self._ids(self.other, "garden")), 1)
+        self.assertEqual(self._ids(self.owner, "garden"), [])
+
+        # deleting the set detaches its sessions (SET NULL): nobody owns the answers any more
+        self.question_set.delete()
+        self.assertEqual(self._ids(self.other, "garden"), [])
+
+    def test_snippets_are_escaped_and_highlighted(self):
+        Answer.objects.create(session=self.session, question=self.question, text="<script>alert(1)</script> paris")
+        hit = search.search_answers(self.owner, "paris")[0]
+        self.assertEqual(hit["answer_html"], "&lt;script&gt;alert(1)&lt;/script&gt; <mark>paris</mark>")
+        self.assertEqual(hit["respondent"], "friend")
+        self.assertEqual(hit["question_set_slug"], self.question_set.slug)
+
+    def test_query_syntax_is_literal(self):
+        Answer.objects.create(session=self.session, question=self.question, text="owner of a lonely heart")
+        self.assertEqual(search.match_expression('owner:1 OR "x*'), '"owner" "1" "OR" "x"*')
+        self.assertEqual(search.search_answers(self.owner, 'owner: NOT ('), search.search_answers(self.owner, "owner NOT"))
+        self.assertEqual(search.search_answers(self.owner, "owner NOT"), [])
+        # the owner column itself is never searched
+        self.assertEqual(search.search_answers(self.owner, str(self.owner.pk)), [])
+        self.assertEqual(search.search_answers(self.owner, "  ?! "), [])
+
+    def test_rebuild(self):
+        Answer.objects.create(session=self.session, question=self.question, text="Lisbon")
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.FTS_TABLE}")
+        self.assertEqual(self._ids(self.owner, "lisbon"), [])
+
+        out = io.StringIO()
+        call_command("rebuild_answer_search", stdout=out)
+        self.assertIn("1 rows", out.getvalue())
+        self.assertEqual(len(self._ids(self.owner, "lisbon")), 1)
+
+    def test_views(self):
+        Answer.objects.bulk_create([Answer(session=self.session, text=f"rome trip {i}") for i in range(3)])
+        self.client.force_login(self.owner)
+
+        page = self.client.get(reverse("diary:search_responses"), {"q": "rome"})
+        self.assertContains(page, "<mark>rome</mark>", count=3)
+
+        data = self.client.get(reverse("diary:search_responses_api"), {"q": "rome", "limit": 2}).json()
+        self.assertEqual(len(data["results"]), 2)
+        self.assertEqual(data["next_offset"], 2)
+        rest = self.client.get(
+            reverse("diary:search_responses_api"), {"q": "rome", "limit": 2, "offset": 2}
+        ).json()
+        self.assertEqual(len(rest["results"]), 1)
+        self.assertIsNone(rest["next_offset"])
+
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(reverse("diary:search_responses_api"), {"q": "rome"}).json()["results"], [])
+
+
+class QuestionStatsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pw")
+        self.friends = [User.objects.create_user(username=f"friend{i}", password="pw") for i in range(3)]
+        self.question_set = QuestionSet.objects.create(owner=self.owner, title="Stats")
+        self.first = Question.objects.create(question_set=self.question_set, text="Favourite food?", order=0)
+        self.second = Question.objects.create(question_set=self.question_set, text="Why?", order=1)
+
+    def _submit(self, friend, first, second):
+        return submit_answers(self.question_set, friend, [(self.first, first), (self.second, second)])
+
+    def _fields(self, stats):
+        return (stats.response_count, stats.total_length, stats.length_histogram,
+                stats.term_counts, stats.recent_answers)
+
+    def test_submissions_update_rollups(self):
+        self._submit(self.friends[0], "Pizza and pasta", "Because pizza is the best thing ever made " * 2)
+        session = self._submit(self.friends[1], "Pizza", "x" * 600)
+
+        stats = QuestionStats.objects.get(question=self.first)
+        self.assertEqual(stats.response_count, 2)
+        self.assertEqual(stats.total_length, len("Pizza and pasta") + len("Pizza"))
+        self.assertEqual(stats.length_histogram, [2, 0, 0, 0, 0, 0])
+        self.assertEqual(stats.top_terms, [("pizza", 2), ("pasta", 1)])  # "and" is a stopword
+        self.assertEqual([a["respondent"] for a in stats.recent_answers], ["friend1", "friend0"])
+
+        second = QuestionStats.objects.get(question=self.second)
+        self.assertEqual(second.length_histogram, [0, 0, 1, 0, 0, 1])
+        self.assertEqual(second.recent_answers[0]["text"], "x" * analytics.EXCERPT_LENGTH)
+        self.assertEqual(second.length_distribution[-1], ("500+", 1, 50))
+
+        with CaptureQueriesContext(connection) as queries:
+            session.delete()
+        # the trigger does the bookkeeping, Django does not even load the answers
+        self.assertFalse([q for q in queries.captured_queries if "diary_questionstats" in q["sql"]])
+        self.assertFalse([q for q in queries.captured_queries if q["sql"].startswith("SELECT") and '"diary_answer"' in q["sql"]])
+        stats.refresh_from_db()
+        self.assertEqual(stats.response_count, 1)
+        self.assertEqual(stats.total_length, len("Pizza and pasta"))
+        self.assertEqual(stats.length_histogram, [1, 0, 0, 0, 0, 0])
+        self.assertEqual([a["respondent"] for a in stats.recent_answers], ["friend0"])
+        self.assertEqual(stats.term_counts, {"pizza": 2, "pasta": 1})  # until the next rebuild
+        second.refresh_from_db()
+        self.assertEqual(second.length_histogram, [0, 0, 1, 0, 0, 0])
+
+    def test_submission_is_one_update(self):
+        self._submit(self.friends[1], "Soup", "Cold")
+        with CaptureQueriesContext(connection) as queries:
+            self._submit(self.friends[0], "Soup and bread", "Warm")
+        stats_queries = [q["sql"] for q in queries.captured_queries if "diary_questionstats" in q["sql"]]
+        self.assertEqual(len(stats_queries), 1)
+        self.assertTrue(stats_queries[0].startswith("UPDATE"))
+        stats = QuestionStats.objects.get(question=self.first)
+        self.assertEqual(stats.response_count, 2)
+        self.assertEqual(stats.term_counts, {"soup": 2, "bread": 1})
+        self.assertEqual([a["text"] for a in stats.recent_answers], ["Soup and bread", "Soup"])
+
+    def test_json_columns_stay_trimmed(self):
+        with mock.patch.object(analytics, "TRACKED_TERMS", 2), mock.patch.object(analytics, "RECENT_ANSWERS", 2):
+            self._submit(self.friends[0], "banana", "One")
+            self._submit(self.friends[1], "banana cherry", "Two")
+            self._submit(self.friends[2], "cherry banana apple", "Three")
+        stats = QuestionStats.objects.get(question=self.first)
+        self.assertEqual(stats.term_counts, {"banana": 3, "cherry": 2})
+        self.assertEqual([a["respondent"] for a in stats.recent_answers], ["friend2", "friend1"])
+
+    def test_questions_without_a_row_get_one(self):
+        QuestionStats.objects.filter(question=self.first).delete()
+        self._submit(self.friends[0], "Noodles", "Quick")
+        self.assertEqual(QuestionStats.objects.get(question=self.first).top_terms, [("noodles", 1)])
+
+    def test_single_saves_are_counted(self):
+        session = AnswerSession.objects.create(question_set=self.question_set, respondent=self.friends[0])
+        Answer.objects.create(session=session, question=self.first, text="Sushi")
+        self.assertEqual(QuestionStats.objects.get(question=self.first).term_counts, {"sushi": 1})
+
+    def test_rebuild_matches_incremental(self):
+        for i, friend in enumerate(self.friends):
+            self._submit(friend, f"Tacos number {i} with salsa", "Spicy " * (i * 20))
+        incremental = {s.question_id: self._fields(s) for s in QuestionStats.objects.all()}
+
+        QuestionStats.objects.all().delete()
+        out = io.StringIO()
+        call_command("rebuild_question_stats", "--batch-size", "2", stdout=out)
+        self.assertIn("2 questions", out.getvalue())
+        rebuilt = {s.question_id: self._fields(s) for s in QuestionStats.objects.all()}
+        self.assertEqual(rebuilt, incremental)
+
+    def test_tracked_terms_are_bounded(self):
+        with mock.patch.object(analytics, "TRACKED_TERMS", 3):
+            self._submit(self.friends[0], "apple banana cherry", "-")
+            self._submit(self.friends[1], "apple banana durian elderberry", "-")
+        self.assertEqual(QuestionStats.objects.get(question=self.first).term_counts,
+                         {"apple": 2, "banana": 2, "cherry": 1})
+
+    def test_owner_view_reads_rollups_not_answers(self):
+        self._submit(self.friends[0], "Ramen", "Warm")
+        self.client.force_login(self.owner)
+        url = reverse("diary:question_set_detail", args=[self.question_set.slug])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, "ramen (1)")
+        self.assertFalse([q["sql"] for q in queries.captured_queries if '"diary_answer"' in q["sql"]])
+
+
+class SeedDataCommandTests(TestCase):
+    def test_seeds_a_consistent_database(self):
+        out = io.StringIO()
+        call_command(
+            "seed_data", "--users", "4", "--questions-per-set", "2", "--sessions-per-set", "3",
+            "--prefix", "smoke", stdout=out,
+        )
+        self.assertIn("Seeded 4 users, 4 question sets, 8 questions, 12 sessions, 24 answers", out.getvalue())
+
+        sessions = AnswerSession.objects.select_related("question_set")
+        self.assertFalse([s for s in sessions if s.respondent_id == s.question_set.owner_id])
+        self.assertEqual(QuestionStats.objects.count(), 8)
+        self.assertEqual(sum(s.response_count for s in QuestionStats.objects.all()), 24)
+        self.assertEqual(sum(WeeklyAnswerQuota.objects.values_list("used", flat=True)), 12)
+        self.assertEqual(
+            LeaderboardEntry.objects.get(user__username="smoke-0", period=LeaderboardEntry.ALL_TIME).response_count, 3
+        )
+        self.assertFalse(Answer.objects.filter(question_snapshot__isnull=True).exists())
+
+    def test_needs_two_users_for_responses(self):
+        with self.assertRaises(CommandError):
+            call_command("seed_data", "--users", "1", stdout=io.StringIO())
+
+
+class QuestionTextSnapshotTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pw")
+        self.friends = [User.objects.create_user(username=f"friend{i}", password="pw") for i in range(2)]
+        self.question_set = QuestionSet.objects.create(owner=self.owner, title="Snapshots")
+        self.question = Question.objects.create(question_set=self.question_set, text="Favourite colour?", order=0)
+
+    def test_answers_share_one_row_per_text(self):
+        first = submit_answers(self.question_set, self.friends[0], [(self.question, "Blue")])
+        second = submit_answers(self.question_set, self.friends[1], [(self.question, "Red")])
+        snapshot = QuestionText.objects.get()
+        self.assertEqual(snapshot.text, "Favourite colour?")
+        self.assertEqual(snapshot.digest, snapshots.text_digest("Favourite colour?"))
+        self.assertEqual(
+            {first.answers.get().question_snapshot_id, second.answers.get().question_snapshot_id}, {snapshot.pk}
+        )
+
+    def test_snapshot_outlives_edits_and_deletion(self):
+        session = AnswerSession.objects.create(question_set=self.question_set, respondent=self.friends[0])
+        answer = Answer.objects.create(session=session, question=self.question, text="Green")
+        self.question.text = "Least favourite colour?"
+        self.question.save()
+        submit_answers(self.question_set, self.friends[1], [(self.question, "Beige")])
+        self.question.delete()
+
+        answer.refresh_from_db()
+        self.assertIsNone(answer.question_id)
+        self.assertEqual(answer.question_text, "Favourite colour?")
+        self.assertEqual(QuestionText.objects.count(), 2)
+        self.assertEqual(search.search_answers(self.owner, "favourite")[0]["answer_id"], answer.pk)
+
+    def test_snapshots_are_immutable_and_protected(self):
+        submit_answers(self.question_set, self.friends[0], [(self.question, "Blue")])
+        snapshot = QuestionText.objects.get()
+        snapshot.text = "Changed?"
+        with self.assertRaises(ValueError):
+            snapshot.save()
+        with self.assertRaises(ProtectedError):
+            snapshot.delete()
+
+    def test_submission_copies_the_questions_snapshots(self):
+        snapshot = self.question.snapshot
+        self.assertEqual(snapshot.text, "Favourite colour?")
+        with CaptureQueriesContext(connection) as queries:
+            session = submit_answers(self.question_set, self.friends[0], [(self.question, "Blue")])
+        self.assertFalse([q for q in queries.captured_queries if "diary_questiontext" in q["sql"]])
+        self.assertEqual(session.answers.get().question_snapshot_id, snapshot.pk)
+
+        self.question.text = "Favourite color?"
+        self.question.save(update_fields=["text"])
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.snapshot.text, "Favourite color?")
+
+    def test_bulk_created_questions_are_snapshotted_on_answer(self):
+        question, = Question.objects.bulk_create([Question(question_set=self.question_set, text="Pet?", order=1)])
+        session = submit_answers(self.question_set, self.friends[0], [(question, "Cat")])
+        self.assertEqual(session.answers.get().question_text, "Pet?")
+
+    def test_interning_known_texts_is_one_query(self):
+        snapshots.intern(["A?", "B?"])
+        with self.assertNumQueries(1):
+            found = snapshots.intern(["A?", "B?", "A?"])
+        self.assertEqual(sorted(s.text for s in found.values()), ["A?", "B?"])
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="pw", email="a@example.com")
+        self.client.force_login(self.admin)
+        self.question_set = QuestionSet.objects.create(owner=self.admin, title="Admin")
+        self.question = Question.objects.create(question_set=self.question_set, text="Colour?")
+
+    def _respond(self, count, text="blue"):
+        for i in range(count):
+            friend = User.objects.create_user(username=f"friend-{AnswerSession.objects.count()}", password="pw")
+            session = AnswerSession.objects.create(question_set=self.question_set, respondent=friend)
+            Answer.objects.bulk_create([Answer(session=session, question=self.question, text=f"{text} {i}")])
+
+    def _get(self, name, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(f"admin:{name}"), params)
+        self.assertEqual(response.status_code, 200)
+        return response, [q["sql"] for q in queries.captured_queries]
+
+    def test_changelists_do_not_query_per_row(self):
+        self._respond(2)
+        counts = {name: len(self._get(name)[1]) for name in ("diary_answer_changelist", "diary_answersession_changelist")}
+        self._respond(8)
+        self.assertEqual(
+            {name: len(self._get(name)[1]) for name in counts}, counts,
+        )
+
+    def test_unfiltered_count_is_estimated(self):
+        self._respond(5)
+        with mock.patch.object(admin_tools, "COUNT_LIMIT", 2):
+            response, queries = self._get("diary_answer_changelist")
+            self.assertFalse([sql for sql in queries if "COUNT(" in sql.upper()])
+            self.assertEqual(response.context["cl"].result_count, Answer.objects.order_by("-pk")[0].pk)
+
+            # a filtered list counts, but only up to the limit
+            with mock.patch.object(site.get_model_admin(AnswerSession), "list_per_page", 1):
+                _response, queries = self._get("diary_answersession_changelist", respondent__id__exact=self.admin.pk)
+            self.assertTrue([sql for sql in queries if "LIMIT 2" in sql and "COUNT(" in sql.upper()])
+
+    def test_filtered_list_pages_past_the_count_limit(self):
+        self._respond(5)
+        filtered = {"question_set__id__exact": self.question_set.pk}
+        with mock.patch.object(admin_tools, "COUNT_LIMIT", 2), \
+                mock.patch.object(site.get_model_admin(AnswerSession), "list_per_page", 1):
+            response, _queries = self._get("diary_answersession_changelist", **filtered)
+            self.assertContains(response, "2+ Answer Sessions")
+
+            # each page counts one page further, so the next one is always linked
+            response, _queries = self._get("diary_answersession_changelist", p=3, **filtered)
+            self.assertEqual(len(response.context["cl"].result_list), 1)
+            self.assertContains(response, "4+ Answer Sessions")
+            self.assertContains(response, "?p=4")
+
+            response, _queries = self._get("diary_answersession_changelist", p=5, **filtered)
+            self.assertEqual(len(response.context["cl"].result_list), 1)
+            self.assertContains(response, "5 Answer Sessions")
+
+    def test_answer_search_uses_the_full_text_index(self):
+        self._respond(3)
+        self._respond(1, text="crimson")
+        response, queries = self._get("diary_answer_changelist", q="crimson")
+        self.assertEqual([a.text for a in response.context["cl"].result_list], ["crimson 0"])
+        self.assertTrue([sql for sql in queries if search.FTS_TABLE in sql])
+        self.assertFalse([sql for sql in queries if "LIKE" in sql])
+
+
+class EventBrokerTests(TestCase):
+    async def test_publish_from_another_thread(self):
+        broker = events.InProcessBroker(queue_size=2)
+        subscription = broker.subscribe("user:1")
+        for n in range(3):
+            self.assertEqual(await asyncio.to_thread(broker.publish, "user:1", {"n": n}), 1)
+        received = [await asyncio.wait_for(subscription.queue.get(), 1) for _ in range(2)]
+        # a full queue drops the oldest event
+        self.assertEqual(received, [{"n": 1}, {"n": 2}])
+        subscription.close()
+        self.assertEqual(broker.publish("user:1", {"n": 3}), 0)
+
+
+class EventStreamAppTests(TransactionTestCase):
+    """The ASGI stream; transactional because the session is read from a worker thread."""
+
+    def setUp(self):
+        events.get_broker.cache_clear()
+        self.addCleanup(events.get_broker.cache_clear)
+        self.user = User.objects.create_user(username="streamer", password="pw")
+        client = Client()
+        client.force_login(self.user)
+        self.cookie = f"sessionid={client.cookies['sessionid'].value}"
+
+    async def _request(self, app, cookie, messages, disconnect):
+        scope = {"type": "http", "path": reverse("users:events"), "headers": [(b"cookie", cookie.encode())]}
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+
+        await app(scope, receive, send)
+
+    async def test_streams_events_until_disconnect(self):
+        app = events.EventStreamApp(app=None)
+        channel = events.user_channel(self.user.pk)
+        messages, disconnect = [], asyncio.Event()
+        task = asyncio.ensure_future(self._request(app, self.cookie, messages, disconnect))
+        while channel not in events.get_broker()._subscriptions:
+            await asyncio.sleep(0.01)
+
+        await asyncio.to_thread(events.publish, self.user.pk, "notification", {"message": "hi"})
+        while len(messages) < 3:
+            await asyncio.sleep(0.01)
+        disconnect.set()
+        await asyncio.wait_for(task, 5)
+
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), messages[0]["headers"])
+        self.assertEqual(messages[2]["body"], b'event: notification\ndata: {"message":"hi"}\n\n')
+        self.assertNotIn(channel, events.get_broker()._subscriptions)
+
+    async def test_anonymous_request_is_refused(self):
+        messages = []
+        await self._request(events.EventStreamApp(app=None), "", messages, asyncio.Event())
+        self.assertEqual(messages[0]["status"], 403)
+
+    def test_wsgi_view_tells_the_browser_to_stop(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("users:events")).status_code, 204)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -14,17 +15,28 @@ urlpatterns = [
     path('my-question-set/<slug:slug>/', views.view_question_set_owner, name='question_set_detail'),
 
     # Publicly answer a question set using its UUID share link
-    path('answer/share/<uuid:share_uuid>/', views.answer_shared_question_set, name='answer_question_set_shared'),
+    path(
+        'answer/share/<uuid:share_uuid>/',
+        views.answer_shared_question_set_async if settings.ASYNC_VIEWS else views.answer_shared_question_set,
+        name='answer_question_set_shared',
+    ),
 
     # Responses
     path('my-responses/', views.view_all_responses, name='view_all_responses'),
     path('responses/<int:pk>/', views.view_responses, name='view_responses'),
     path('response/<int:session_id>/', views.view_single_response, name='view_single_response'),
+    path('my-responses/search/', views.search_responses, name='search_responses'),
+    path('api/responses/search/', views.search_responses_api, name='search_responses_api'),
 
     # Question actions (edit, delete)
     path('question/<int:pk>/edit/', views.edit_question, name='edit_question'),
     path("question/<int:pk>/delete/", views.delete_question, name="delete_question"),
-    path('fetch_responses/', views.fetch_responses, name='fetch_responses'),
+    path(
+        'fetch_responses/',
+        views.fetch_responses_async if settings.ASYNC_VIEWS else views.fetch_responses,
+        name='fetch_responses',
+    ),
+    path('my-question-set/<slug:slug>/export/<str:fmt>/', views.export_responses, name='export_responses'),
     # Before (expects UUID)
     path("response/<uuid:session_id>/download/", views.download_single_response, name="download_single_response"),
 
@@ -1,21 +1,38 @@
 # diary/views.py
+import asyncio
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from django.contrib import messages
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from users.models import Notification, NotificationType
-from .models import QuestionSet, Question, Answer, AnswerSession, QuestionSetStyle
+from .models import QuestionSet, Question, Answer, AnswerSession
 from .forms import QuestionSetCreateForm,  QuestionForm
 from django.http import HttpResponseForbidden, Http404
+from users import quota
+from users.backends import aload_user
 from users.utils import  can_create_qset
 from django.http import JsonResponse
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from playwright.sync_api import sync_playwright
+from django.db.models import Prefetch
+from django.utils import translation
+from DiaryProject.pagination import akeyset_page, keyset_page
+from .artifacts import get_store, make_key
+from .exports import EXPORT_FORMATS, iter_export
+from .live import session_payload
+from .rendering import render_pdf, RenderError
+from .search import SEARCH_MAX_PAGE_SIZE, SEARCH_PAGE_SIZE, search_answers
+from .styles import all_styles, template_for
+from .submissions import QuotaExceeded, collect_answers, submit_answers
 from django.template.loader import render_to_string
 
 
 User = get_user_model()
+
+QUOTA_EXCEEDED_MESSAGE = "You have reached your weekly answer limit. Please wait for the next week or upgrade to premium."
+
 @login_required(login_url='users:login')
 def question_set_create(request):
     if not can_create_qset(request.user):
@@ -49,77 +66,92 @@ def question_set_list(request):
 # Shared answering view
 @login_required(login_url='users:login')
 def answer_shared_question_set(request, share_uuid):
-    question_set = get_object_or_404(QuestionSet,  share_uuid=share_uuid)
-    questions = question_set.questions.all().order_by('order')
-    profile = request.user.userprofile  # or request.user.profile depending on your related_name
-    # 🔹 Step 1: Reset weekly answers if a week has passed
-    profile.reset_weekly_answers()
-
-    # 🔹 Step 2: Check if user has remaining answers
-    if profile.remaining_answers <= 0:
-        messages.error(request, "You have reached your weekly answer limit. Please wait for the next week or upgrade to premium.")
+    question_set = get_object_or_404(
+        QuestionSet.objects.select_related('owner'), share_uuid=share_uuid
+    )
+    # with the snapshots of their texts, which the answers copy (diary.snapshots)
+    questions = list(question_set.questions.select_related('snapshot').order_by('order'))
+    # Check if user has remaining answers (read-only; the POST consumes one atomically)
+    if quota.remaining_answers(request.user) <= 0:
+        messages.error(request, QUOTA_EXCEEDED_MESSAGE)
         return redirect("users:profile")
 
     # Prevent owner from answering their own set
-    if question_set.owner == request.user:
+    if question_set.owner_id == request.user.pk:
         return HttpResponseForbidden("You cannot answer your own question set.")
 
     if request.method == "POST":
-        # Create a new AnswerSession
-        session = AnswerSession.objects.create(
-            respondent=request.user if request.user.is_authenticated else None,
-            question_set=question_set
-        )
-
-        # Save answers for each question
-        for question in questions:
-            answer_text = request.POST.get(f"question_{question.id}", "").strip()
-            if answer_text:
-                Answer.objects.create(
-                    session=session,
-                    question=question,
-                    text=answer_text
-                )
-        request.user.userprofile.weekly_answer_count += 1
-        request.user.userprofile.save()
-
-        # Notify diary owner
-        Notification.objects.create(
-            user=question_set.owner,
-            actor=request.user,
-            type=NotificationType.RECEIVED_RESPONSE,
-            message=f"{request.user.username} answered your diary '{question_set.title}'.",
-            question_set=question_set,  # Use the foreign key instead of `link`
-            related_object_id=session.pk,  # Optionally link to the session
-        )
-
-        # Notify the answering user (optional confirmation)
-        Notification.objects.create(
-            user=request.user,
-            type=NotificationType.ANSWERED_DIARY,
-            message=f"You answered {question_set.owner.username}'s diary '{question_set.title}'.",
-            question_set=question_set,
-            related_object_id=session.pk,
-        )
+        try:
+            submit_answers(question_set, request.user, collect_answers(questions, request.POST))
+        except QuotaExceeded:
+            messages.error(request, QUOTA_EXCEEDED_MESSAGE)
+            return redirect("users:profile")
 
         return redirect("pages:home")  # or a thank-you page
 
     # Render template with input fields for each question
-    template = question_set.style.template_name if question_set.style else "diary/style_classic.html"
+    return render(request, template_for(question_set), _answer_context(question_set, questions))
+
 
-    return render(request, f"diary/{template}", {
+def _answer_context(question_set, questions):
+    return {
         "question_set": question_set,
         "questions": questions,
         "form": None,
         "respondents": None,
         "mode": "answer"
-    })
+    }
+
+
+@login_required(login_url='users:login')
+async def answer_shared_question_set_async(request, share_uuid):
+    """
+    Async ``answer_shared_question_set``. The set, its questions and the
+    remaining quota are read concurrently; the submission transaction and the
+    rendering run in a worker thread, since neither is async-capable.
+    """
+    user = await aload_user(request)
+    try:
+        question_set, questions, used = await asyncio.gather(
+            QuestionSet.objects.select_related('owner').aget(share_uuid=share_uuid),
+            _alist(
+                Question.objects.filter(question_set__share_uuid=share_uuid)
+                .select_related('snapshot').order_by('order')
+            ),
+            quota.aanswers_used(user),
+        )
+    except QuestionSet.DoesNotExist:
+        raise Http404("No QuestionSet matches the given query.")
+    if quota.answer_limit(user) - used <= 0:
+        messages.error(request, QUOTA_EXCEEDED_MESSAGE)
+        return redirect("users:profile")
+
+    if question_set.owner_id == user.pk:
+        return HttpResponseForbidden("You cannot answer your own question set.")
+
+    if request.method == "POST":
+        try:
+            await sync_to_async(submit_answers)(question_set, user, collect_answers(questions, request.POST))
+        except QuotaExceeded:
+            messages.error(request, QUOTA_EXCEEDED_MESSAGE)
+            return redirect("users:profile")
+
+        return redirect("pages:home")
+
+    template = await sync_to_async(template_for)(question_set)
+    return await sync_to_async(render)(request, template, _answer_context(question_set, questions))
+
+
+async def _alist(queryset):
+    return [row async for row in queryset]
+
 
 # Owner's view of question set + editing
 @login_required(login_url='users:login')
 def view_question_set_owner(request, slug):
     question_set = get_object_or_404(QuestionSet, slug = slug, owner=request.user)
-    questions = question_set.questions.all()
+    # each question's answer rollup (diary.analytics) comes along in the same query
+    questions = question_set.questions.select_related("stats")
     form = QuestionForm()
 
     if request.method == "POST":
@@ -132,9 +164,7 @@ def view_question_set_owner(request, slug):
 
     respondents = question_set.answer_sessions.all()
 
-    template_name = question_set.style.template_name if question_set.style else "style_classic.html"
-
-    return render(request, f"diary/{template_name}", {
+    return render(request, template_for(question_set), {
         "question_set": question_set,
         "questions": questions,
         "form": form,
@@ -162,7 +192,7 @@ def view_responses(request, slug):
 @login_required(login_url='users:login')
 def view_single_response(request, session_id):
     session = (
-        AnswerSession.objects.select_related("question_set__style")
+        AnswerSession.objects.select_related("question_set")
         .filter(id=session_id, question_set__owner=request.user)
         .first()
     )
@@ -170,13 +200,11 @@ def view_single_response(request, session_id):
         raise Http404("Answer session not found or access denied")
     # Get answers ordered by the original question order
     questions = session.question_set.questions.all().order_by('order')
-    answers = session.answers.select_related('question').order_by('question__order')
-
-    template = session.question_set.style.template_name if session.question_set.style else "diary/style_classic.html"
+    answers = session.answers.select_related('question_snapshot').order_by('question__order')
 
-    return render(request, f"diary/{template}", {
+    return render(request, template_for(session.question_set), {
         "question_set": session.question_set,
-        "questions": session.question_set.questions.all().order_by('order'),
+        "questions": questions,
         "answers": answers,  # <-- pass the queryset here
         "respondent": session.respondent,
         "mode": "view_answers",
@@ -216,7 +244,7 @@ def delete_question(request, pk):
     return redirect('diary:question_set_detail', slug=question.question_set.slug)
 
 def style_list(request):
-    styles = QuestionSetStyle.objects.all()
+    styles = all_styles()
     user_plan = request.user.userprofile.plan
     return render(request, 'diary/style_list.html', {
         'styles': styles,
@@ -236,57 +264,165 @@ def delete_question_set(request, slug):
     return redirect('diary:question_set_detail', slug=slug)  # fallback for non-POST
 
 
+RESPONSES_PAGE_SIZE = 5
+RESPONSES_MAX_PAGE_SIZE = 50
+
+
+@login_required(login_url='users:login')
+def export_responses(request, slug, fmt):
+    """Stream every response to one of the user's question sets as CSV or NDJSON."""
+    question_set = get_object_or_404(QuestionSet, slug=slug, owner=request.user)
+    if fmt not in EXPORT_FORMATS:
+        raise Http404("Unknown export format")
+
+    response = StreamingHttpResponse(
+        iter_export(question_set, fmt), content_type=EXPORT_FORMATS[fmt]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{question_set.slug}-responses.{fmt}"'
+    return response
+
+
+def _responses_page_limit(request):
+    try:
+        limit = min(int(request.GET.get("limit", RESPONSES_PAGE_SIZE)), RESPONSES_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = RESPONSES_PAGE_SIZE
+    return max(limit, 1)
+
+
+def _owner_sessions(user):
+    return (
+        AnswerSession.objects.filter(question_set__owner=user)
+        .select_related("question_set", "respondent")
+        .prefetch_related(Prefetch("answers", queryset=Answer.objects.select_related("question_snapshot").order_by("id")))
+        .order_by("-created_at", "-id")
+    )
+
+
+def _responses_json(page, next_cursor):
+    return JsonResponse({
+        "responses": [session_payload(session, session.answers.all()) for session in page],
+        "next_cursor": next_cursor,
+    })
+
+
 @login_required(login_url='users:login')
 def fetch_responses(request):
-    question_sets = QuestionSet.objects.filter(owner=request.user)
-
-    data = []
-    for qs in question_sets:
-        sessions = qs.answer_sessions.all().order_by('-created_at')
-        session_data = []
-        for session in sessions:
-            session_data.append({
-                "id": session.id,
-                "respondent": session.respondent.username if session.respondent else "Anonymous",
-                "submitted_at": session.created_at.strftime("%b %d, %Y %H:%M"),
-                "answers": [
-                    {"question": a.question_text, "answer": a.text} for a in session.answers.all()
-                ]
-            })
-        data.append({
-            "question_set_id": qs.id,
-            "question_set_title": qs.title,
-            "responses": session_data
-        })
+    """
+    One page of responses to the user's question sets, newest first.
+
+    Keyset pagination on (created_at, id): pass the returned ``next_cursor`` back
+    as ``?cursor=`` to get the next page. Every page costs the same two queries
+    (sessions joined with set and respondent, then their answers) however deep it is.
+    """
+    try:
+        page, next_cursor = keyset_page(
+            _owner_sessions(request.user), request.GET.get("cursor"), _responses_page_limit(request)
+        )
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    return _responses_json(page, next_cursor)
+
+
+@login_required(login_url='users:login')
+async def fetch_responses_async(request):
+    """Async ``fetch_responses``, served under ASGI (see ``settings.ASYNC_VIEWS``)."""
+    user = await request.auser()
+    try:
+        page, next_cursor = await akeyset_page(
+            _owner_sessions(user), request.GET.get("cursor"), _responses_page_limit(request)
+        )
+    except ValueError:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    return _responses_json(page, next_cursor)
+
+
+def _search_window(request, default_limit):
+    try:
+        limit = min(int(request.GET.get("limit", default_limit)), SEARCH_MAX_PAGE_SIZE)
+        offset = int(request.GET.get("offset", 0))
+    except ValueError:
+        limit, offset = default_limit, 0
+    return max(limit, 1), max(offset, 0)
+
 
-    return JsonResponse({"question_sets": data})
+def _search(request, default_limit):
+    """(query, hits, limit, offset, has_more); one extra hit is fetched to tell if there is a next page."""
+    query = request.GET.get("q", "").strip()
+    limit, offset = _search_window(request, default_limit)
+    hits = search_answers(request.user, query, limit + 1, offset)
+    return query, hits[:limit], limit, offset, len(hits) > limit
+
+
+@login_required(login_url='users:login')
+def search_responses(request):
+    """Full-text search over the answers to the user's question sets (see diary/search.py)."""
+    query, hits, limit, offset, has_more = _search(request, SEARCH_PAGE_SIZE)
+    return render(request, 'diary/search_responses.html', {
+        'query': query,
+        'hits': hits,
+        'previous_offset': max(offset - limit, 0) if offset else None,
+        'next_offset': offset + limit if has_more else None,
+    })
+
+
+@login_required(login_url='users:login')
+def search_responses_api(request):
+    """JSON variant of ``search_responses``; page with ``?limit=&offset=``."""
+    query, hits, limit, offset, has_more = _search(request, SEARCH_PAGE_SIZE)
+    return JsonResponse({
+        "query": query,
+        "results": [
+            {**hit, "submitted_at": hit["submitted_at"].isoformat() if hit["submitted_at"] else None}
+            for hit in hits
+        ],
+        "next_offset": offset + limit if has_more else None,
+    })
 
 
 @login_required(login_url='users:login')
 def download_single_response(request, session_id):
-    session = get_object_or_404(AnswerSession, pk=session_id)
-    if session.question_set.owner != request.user:
+    session = get_object_or_404(
+        AnswerSession.objects.select_related('question_set', 'respondent'), pk=session_id
+    )
+    if session.question_set is None or session.question_set.owner != request.user:
         raise Http404("Access denied")
 
-    html_content = render_to_string("diary/style_basic.html", {
-        "question_set": session.question_set,
-        "questions": session.question_set.questions.all().order_by('order'),
-        "answers": session.answers.all().order_by('question__order'),
-        "respondent": session.respondent,
-        "mode": "view_answers",
-        "session": session,
-        "is_owner": True,
-        "request": request,  # <--- pass request so template can build absolute URL
-        "pdf_mode": True  # <--- new flag for PDF only styling
-    })
+    question_set = session.question_set
+    template_name = "diary/style_basic.html"
+    answers = list(session.answers.select_related('question_snapshot').order_by('question__order'))
+    respondent = session.respondent
+    key = make_key(
+        session.pk, template_name, translation.get_language(),
+        question_set.title, question_set.description, session.created_at,
+        respondent.username if respondent else None,
+        respondent.get_full_name() if respondent else None,
+        [(a.question_text, a.text) for a in answers],
+    )
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page()
-        page.set_content(html_content, wait_until="networkidle")
-        pdf_bytes = page.pdf(format="A4", print_background=True)
-        browser.close()
+    def build_pdf():
+        html_content = render_to_string(template_name, {
+            "question_set": question_set,
+            "answers": answers,
+            "respondent": respondent,
+            "mode": "view_answers",
+            "session": session,
+            "is_owner": True,
+            "request": request,  # <--- pass request so template can build absolute URL
+            "pdf_mode": True  # <--- new flag for PDF only styling
+        })
+        return render_pdf(html_content)
 
-    response = HttpResponse(pdf_bytes, content_type="application/pdf")
-    response['Content-Disposition'] = f'attachment; filename="{session.question_set.title}.pdf"'
-    return response
+    try:
+        pdf = get_store().get_or_create(
+            "responses", session.pk, f"response-{key}.pdf", build_pdf
+        )
+    except RenderError as exc:
+        response = HttpResponse(str(exc), status=503, content_type="text/plain")
+        response['Retry-After'] = "5"
+        return response
+
+    return FileResponse(
+        BytesIO(pdf), as_attachment=True,
+        filename=f"{question_set.title}.pdf", content_type="application/pdf",
+    )
@@ -0,0 +1,121 @@
+"""
+Caching for the home page.
+
+The carousel and leaderboard includes are template fragments cached per
+language (``{% cache %}`` in the includes themselves), and the whole page is
+cached per language for anonymous visitors, for whom nothing else varies.
+``pages.signals`` drops the affected entries when a NewsItem or AnswerSession
+changes, so the timeouts in ``settings.HOME_CACHE`` only bound staleness for
+changes no signal sees (e.g. a renamed user on the leaderboard).
+"""
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils import translation
+
+from diary import leaderboard
+
+DEFAULT_SETTINGS = {
+    "FRAGMENT_TIMEOUT": 300,
+    "PAGE_TIMEOUT": 60,
+}
+
+CAROUSEL_FRAGMENT = "home_carousel"
+LEADERBOARD_FRAGMENT = "home_leaderboard"
+
+
+def get_settings():
+    conf = dict(DEFAULT_SETTINGS)
+    conf.update(getattr(settings, "HOME_CACHE", {}))
+    return conf
+
+
+def _languages():
+    return [code for code, _name in settings.LANGUAGES]
+
+
+def page_key(name, language):
+    return f"anonymous-page:{name}:{language}"
+
+
+def invalidate_pages(name="home"):
+    cache.delete_many([page_key(name, language) for language in _languages()])
+
+
+def invalidate_carousel():
+    cache.delete_many([make_template_fragment_key(CAROUSEL_FRAGMENT, [lang]) for lang in _languages()])
+    invalidate_pages()
+
+
+def invalidate_leaderboard():
+    week = leaderboard.week_period()
+    cache.delete_many([
+        make_template_fragment_key(LEADERBOARD_FRAGMENT, [lang, week]) for lang in _languages()
+    ])
+    invalidate_pages()
+
+
+def _serve_cached(cached):
+    content, content_type = cached
+    return HttpResponse(content, content_type=content_type)
+
+
+def _finish(request, response):
+    get_token(request)
+    response["Vary"] = "Cookie, Accept-Language"
+    return response
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def cache_anonymous_page(name):
+    """
+    Serve a view's GET responses to anonymous visitors from the cache, per
+    active language. Signed-in users always get a fresh render. Works on
+    sync and async views.
+
+    The cached HTML must not embed a CSRF token; templates read it from the
+    csrftoken cookie instead, which is issued here on every cached response.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method != "GET" or (await request.auser()).is_authenticated:
+                    return await view(request, *args, **kwargs)
+
+                key = page_key(name, translation.get_language())
+                cached = await cache.aget(key)
+                if cached is not None:
+                    return _finish(request, _serve_cached(cached))
+                response = await view(request, *args, **kwargs)
+                if _cacheable(response):
+                    await cache.aset(
+                        key, (response.content, response["Content-Type"]), get_settings()["PAGE_TIMEOUT"]
+                    )
+                return _finish(request, response)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "GET" or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+
+            key = page_key(name, translation.get_language())
+            cached = cache.get(key)
+            if cached is not None:
+                return _finish(request, _serve_cached(cached))
+            response = view(request, *args, **kwargs)
+            if _cacheable(response):
+                cache.set(key, (response.content, response["Content-Type"]), get_settings()["PAGE_TIMEOUT"])
+            return _finish(request, response)
+        return wrapper
+    return decorator
@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from diary.models import AnswerSession, NewsItem
+from .caching import invalidate_carousel, invalidate_leaderboard
+
+
+@receiver([post_save, post_delete], sender=NewsItem)
+def news_changed(sender, **kwargs):
+    invalidate_carousel()
+
+
+@receiver(post_save, sender=AnswerSession)
+def session_created(sender, instance, created, **kwargs):
+    if created:
+        invalidate_leaderboard()
+
+
+@receiver(post_delete, sender=AnswerSession)
+def session_deleted(sender, **kwargs):
+    invalidate_leaderboard()
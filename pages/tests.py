@@ -1,3 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from diary.models import AnswerSession, NewsItem, QuestionSet
+
+User = get_user_model()
+
+
+class HomeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("pages:home")
+
+    def _tables_queried(self, ctx):
+        return {table for q in ctx.captured_queries
+                for table in ("diary_newsitem", "diary_leaderboardentry") if table in q["sql"]}
+
+    def test_anonymous_page_is_served_from_cache_per_language(self):
+        NewsItem.objects.create(title="Cached headline", description="News")
+        first = self.client.get(self.url)
+        self.assertContains(first, "Cached headline")
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.content, first.content)
+        self.assertIn("csrftoken", second.cookies)
+        self.assertNotIn(second.cookies["csrftoken"].value, second.content.decode())
+
+        self.client.cookies["django_language"] = "de"
+        german = self.client.get(self.url)
+        self.assertIn('currentLang = "de"', german.content.decode())
+
+    def test_news_change_invalidates_carousel(self):
+        self.client.get(self.url)
+        NewsItem.objects.create(title="Fresh headline", description="News")
+        self.assertContains(self.client.get(self.url), "Fresh headline")
+
+    def test_signed_in_users_reuse_fragments_until_a_response_arrives(self):
+        owner = User.objects.create_user(username="star", password="pw")
+        qset = QuestionSet.objects.create(owner=owner, title="Famous diary")
+        self.client.force_login(owner)
+        self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(self.url)
+        self.assertEqual(self._tables_queried(ctx), set())
+
+        AnswerSession.objects.create(question_set=qset, respondent=owner)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(self._tables_queried(ctx), {"diary_leaderboardentry"})
+        self.assertContains(response, "1 response")
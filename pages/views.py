@@ -1,14 +1,24 @@
 # Import Django's shortcut to render templates
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse
 from django.shortcuts import render, get_object_or_404
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
 from django.template.loader import render_to_string
-from playwright.sync_api import sync_playwright
 
-from diary.models import NewsItem, QuestionSet
-from users.models import CustomUser
+from diary import leaderboard
+from diary.models import NewsItem, QuestionSet, LeaderboardEntry
+from django.utils import translation
+from diary.artifacts import get_store, make_key
+from diary.rendering import render_screenshot, RenderError
+from users.backends import aload_user
+from .caching import (
+    CAROUSEL_FRAGMENT, LEADERBOARD_FRAGMENT, cache_anonymous_page, get_settings as get_home_cache_settings,
+)
 from .models import Page
-from django.db.models import Count
 import qrcode
 from io import BytesIO
 import base64
@@ -17,34 +27,66 @@ import base64
 # Define a view function for the home page
 
 
+def _home_context(week):
+    # Both querysets stay lazy: they only run when their cached fragment is missing
+    return {
+        "news_items": NewsItem.objects.filter(is_active=True).order_by('display_order', '-created_at'),
+        # Leaderboard: read the precomputed rows maintained by diary.leaderboard
+        "popular_users": leaderboard.top_entries(LeaderboardEntry.ALL_TIME, limit=5),
+        "weekly_users": leaderboard.top_entries(week, limit=5),
+        "current_qset_count": 0,
+        "leaderboard_week": week,
+        "fragment_timeout": get_home_cache_settings()["FRAGMENT_TIMEOUT"],
+    }
+
+
+@cache_anonymous_page("home")
 def home_view(request):
     # This function returns the rendered 'home.html' template
-    news_items = NewsItem.objects.filter(is_active=True).order_by('display_order', '-created_at')
-    # Popular users: count responses grouped by user
-    # Leaderboard: count AnswerSessions for each user's QuestionSets
-    popular_users = (
-        CustomUser.objects.annotate(
-            response_count=Count('question_sets__answer_sessions', distinct=True)
-        )
-        .order_by('-response_count')[:5]
-    )
+    context = _home_context(leaderboard.week_period())
     if request.user.is_authenticated:
-        current_qset_count = QuestionSet.objects.filter(owner=request.user).count()
-    else:
-        current_qset_count = 0
-
-    return render(request, 'home.html',{
-        "news_items": news_items,
-        "popular_users": popular_users,
-        "current_qset_count": current_qset_count
-    })
+        context["current_qset_count"] = QuestionSet.objects.filter(owner=request.user).count()
+    return render(request, 'home.html', context)
+
+
+@cache_anonymous_page("home")
+async def home_view_async(request):
+    """
+    Async ``home_view``. The queries for fragments that are not cached and the
+    user's question set count run concurrently; rendering runs in a worker
+    thread.
+    """
+    user = await aload_user(request)
+    week = leaderboard.week_period()
+    context = _home_context(week)
+    language = translation.get_language()
+    carousel_key = make_template_fragment_key(CAROUSEL_FRAGMENT, [language])
+    leaderboard_key = make_template_fragment_key(LEADERBOARD_FRAGMENT, [language, week])
+    cached = await cache.aget_many([carousel_key, leaderboard_key])
+
+    queries = {}
+    if carousel_key not in cached:
+        queries["news_items"] = _alist(context["news_items"])
+    if leaderboard_key not in cached:
+        queries["popular_users"] = _alist(context["popular_users"])
+        queries["weekly_users"] = _alist(context["weekly_users"])
+    if user.is_authenticated:
+        queries["current_qset_count"] = QuestionSet.objects.filter(owner=user).acount()
+    context.update(zip(queries, await asyncio.gather(*queries.values())))
+    return await sync_to_async(render)(request, 'home.html', context)
+
+
+async def _alist(queryset):
+    return [row async for row in queryset]
+
+
 def page_detail(request, slug):
     page = get_object_or_404(Page, slug=slug, is_published=True)
     return render(request, 'pages/page_detail.html', {
         'page': page
     })
 
-def generate_qr_code(url):
+def _encode_qr_png(url):
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_H,
@@ -58,33 +100,50 @@ def generate_qr_code(url):
 
     buffer = BytesIO()
     img.save(buffer, format="PNG")
-    img_str = base64.b64encode(buffer.getvalue()).decode()
-    return f"data:image/png;base64,{img_str}"
+    return buffer.getvalue()
+
+
+def generate_qr_code(url):
+    # The data URI only depends on the URL, so encode it once and keep it on disk
+    key = make_key(url)
+    return get_store().get_or_create(
+        "qr", key[:2], f"qr-{key}.txt",
+        lambda: b"data:image/png;base64," + base64.b64encode(_encode_qr_png(url)),
+    ).decode()
 
 
 @login_required(login_url='users:login')
 def download_share_card(request, question_set_id):
     question_set = get_object_or_404(QuestionSet, id=question_set_id)
-    # Generate QR code linking to answer page
-    qr_data_uri = generate_qr_code(request.build_absolute_uri(
+    answer_url = request.build_absolute_uri(
         f"/answer/share/{question_set.share_uuid}/"
-    ))
-
-    html_content = render_to_string("share_card.html", {
-        "question_set": question_set,
-        "qr_data_uri": qr_data_uri,
-    },
-        request=request  # <-- Pass the request here!
-                                    )
-
-    # Use Playwright to render HTML to PNG directly
-    with sync_playwright() as p:
-        browser = p.chromium.launch()
-        page = browser.new_page()
-        page.set_content(html_content, wait_until="networkidle")
-        image_bytes = page.locator("#share-card").screenshot()
-        browser.close()
-
-    response = HttpResponse(image_bytes, content_type="image/png")
-    response['Content-Disposition'] = f'attachment; filename="{question_set.title}_share_card.png"'
-    return response
+    )
+    key = make_key(
+        question_set.share_uuid, question_set.title, answer_url, translation.get_language(),
+        request.user.get_full_name(), request.user.username,
+    )
+
+    def build_card():
+        # Generate QR code linking to answer page
+        html_content = render_to_string("share_card.html", {
+            "question_set": question_set,
+            "qr_data_uri": generate_qr_code(answer_url),
+        },
+            request=request  # <-- Pass the request here!
+                                        )
+        # Render HTML to PNG on a warm pooled browser
+        return render_screenshot(html_content, "#share-card")
+
+    try:
+        card = get_store().get_or_create(
+            "share-cards", question_set.pk, f"card-{key}.png", build_card
+        )
+    except RenderError as exc:
+        response = HttpResponse(str(exc), status=503, content_type="text/plain")
+        response['Retry-After'] = "5"
+        return response
+
+    return FileResponse(
+        BytesIO(card), as_attachment=True,
+        filename=f"{question_set.title}_share_card.png", content_type="image/png",
+    )
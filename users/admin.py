@@ -1,7 +1,11 @@
 # admin.py
 from django.contrib import admin
+from django.db.models import OuterRef, Subquery
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import CustomUser, UserProfile, Notification
+from DiaryProject.admin_tools import LargeTableAdmin
+from .models import CustomUser, UserProfile, Notification, WeeklyAnswerQuota
+from .notifications import mark_read
+from .quota import reset_answers, week_start
 from django.utils.translation import gettext_lazy as _
 
 
@@ -33,37 +37,56 @@ class CustomUserAdmin(BaseUserAdmin):
 
 # --- UserProfile Admin ---
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ('user', 'plan', 'weekly_answer_count', 'next_reset')
+class UserProfileAdmin(LargeTableAdmin):
+    list_display = ('user', 'plan', 'answers_this_week', 'next_reset')
+    list_select_related = ('user',)
     list_filter = ('plan',)
-    search_fields = ('user__username', 'user__name', 'user__surname')
+    # prefix match through user_username_nocase_idx
+    search_fields = ('^user__username',)
+    search_help_text = _("Username, or the start of it.")
+    raw_id_fields = ('user',)
     readonly_fields = ('next_reset',)
 
+    def get_queryset(self, request):
+        # this week's WeeklyAnswerQuota.used, one indexed lookup per listed row inside the page query
+        used = WeeklyAnswerQuota.objects.filter(user=OuterRef('user'), week_start=week_start()).values('used')[:1]
+        return super().get_queryset(request).annotate(answers_this_week=Subquery(used))
+
+    @admin.display(description=_("Answers this week"), ordering='answers_this_week')
+    def answers_this_week(self, profile):
+        return profile.answers_this_week or 0
+
     # Optional: reset weekly answers from admin
     actions = ['reset_weekly_answers_action']
 
     def reset_weekly_answers_action(self, request, queryset):
-        for profile in queryset:
-            profile.reset_weekly_answers()
-        self.message_user(request, "Selected profiles have been reset.")
+        # one DELETE for the whole selection
+        reset = reset_answers(queryset.values('user'))
+        self.message_user(request, f"{reset} weekly quotas reset.")
 
     reset_weekly_answers_action.short_description = "Reset weekly answers for selected users"
 
 
 # --- Notification Admin ---
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(LargeTableAdmin):
     list_display = ('user', 'actor', 'type', 'message', 'is_read', 'created_at')
+    list_select_related = ('user', 'actor')
     list_filter = ('type', 'is_read')
-    search_fields = ('user__username', 'actor__username', 'message')
+    # prefix match on the recipient through user_username_nocase_idx, then notification_inbox_idx
+    search_fields = ('^user__username',)
+    search_help_text = _("Recipient username, or the start of it.")
+    raw_id_fields = ('user', 'actor', 'question_set', 'answer_session')
     readonly_fields = ('created_at',)
-    ordering = ('-created_at',)
+    # newest first by id: -created_at has no index of its own
+    ordering = ('-pk',)
 
     # Optional: mark notifications as read in bulk
     actions = ['mark_as_read']
 
     def mark_as_read(self, request, queryset):
-        updated = queryset.update(is_read=True)
+        # one UPDATE for the rows plus one for the unread counters (users.notifications.mark_read)
+        updated = mark_read(queryset)
         self.message_user(request, f"{updated} notifications marked as read.")
 
     mark_as_read.short_description = "Mark selected notifications as read"
@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .models import UserProfile
+
+
+class ProfileModelBackend(ModelBackend):
+    """
+    ModelBackend that loads the user's UserProfile in the same query.
+
+    AuthenticationMiddleware calls ``get_user`` lazily, on first access to
+    ``request.user``, so requests that never look at the user pay nothing and
+    the rest get ``request.user.userprofile`` without a second query.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related("userprofile").get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        # request.auser(), used by async views
+        UserModel = get_user_model()
+        try:
+            user = await UserModel._default_manager.select_related("userprofile").aget(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+async def aload_user(request):
+    """
+    ``request.auser()`` for async views, with ``userprofile`` loaded.
+
+    The user is also set as ``request.user`` so that templates and context
+    processors rendered afterwards don't load it a second time. Should the
+    user come from another backend (e.g. a plain ModelBackend configuration),
+    the profile is fetched here, since async code can't load it lazily.
+    """
+    user = await request.auser()
+    if user.is_authenticated and not type(user).userprofile.is_cached(user):
+        try:
+            user.userprofile = await UserProfile.objects.aget(user=user)
+        except UserProfile.DoesNotExist:
+            pass
+    request.user = user
+    return user
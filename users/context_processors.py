@@ -1,13 +1,20 @@
+from django.utils.functional import SimpleLazyObject
+
 from .models import UserProfile
+from .quota import get_quota
+
+def _get_profile(request):
+    if not request.user.is_authenticated:
+        return None
+    try:
+        return request.user.userprofile  # loaded with the user by ProfileModelBackend
+    except UserProfile.DoesNotExist:
+        return None
 
 def user_profile(request):
-    if request.user.is_authenticated:
-        try:
-            profile = request.user.userprofile  # Adjust if your related_name is different
-        except UserProfile.DoesNotExist:
-            profile = None
-    else:
-        profile = None
+    # both are lazy: pages that never show the profile or the weekly answers don't touch the database
+    profile = SimpleLazyObject(lambda: _get_profile(request))
     return {
-        'profile': profile
+        'profile': profile,
+        'quota': SimpleLazyObject(lambda: get_quota(request.user) if profile else None),
     }
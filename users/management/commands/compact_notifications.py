@@ -0,0 +1,34 @@
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+
+from users.retention import get_settings, run_retention
+
+
+class Command(BaseCommand):
+    help = (
+        'Coalesce each day\'s response notifications into digests and delete notifications '
+        'older than the retention period (settings.NOTIFICATION_RETENTION, users/retention.py). '
+        'Safe to run from cron.'
+    )
+
+    def add_arguments(self, parser):
+        conf = get_settings()
+        parser.add_argument('--days', type=int, default=conf['DAYS'],
+                            help='Delete notifications older than this many days')
+        parser.add_argument('--batch-size', type=int, default=conf['BATCH_SIZE'],
+                            help='Rows handled per transaction')
+        parser.add_argument('--archive', help='Append deleted notifications to this NDJSON file first')
+        parser.add_argument('--no-coalesce', dest='coalesce', action='store_false',
+                            help='Only delete expired notifications')
+
+    def handle(self, *args, **options):
+        archive = open(options['archive'], 'a', encoding='utf-8') if options['archive'] else nullcontext()
+        with archive as archive:
+            result = run_retention(
+                days=options['days'], batch_size=options['batch_size'],
+                archive=archive, coalesce=options['coalesce'],
+            )
+        if options['coalesce']:
+            self.stdout.write(f"Coalesced {result['coalesced']} notifications into {result['digests']} digests.")
+        self.stdout.write(f"Deleted {result['deleted']} notifications older than {options['days']} days.")
@@ -1,9 +1,21 @@
 from django.core.management.base import BaseCommand
-from users.models import UserProfile
+
+from users import quota
+
 
 class Command(BaseCommand):
-    help = 'Reset weekly answer and question set counts'
+    help = (
+        'Delete past weeks\' answer quota rows and move each passed UserProfile.next_reset on to '
+        'the next Monday, in batches (users/quota.py). Safe to re-run and to run from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=quota.SWEEP_BATCH_SIZE,
+                            help='Rows handled per transaction')
 
-    def handle(self, *args, **kwargs):
-        UserProfile.objects.update(weekly_answer_count=0)
-        self.stdout.write("Weekly limits reset.")
+    def handle(self, *args, **options):
+        result = quota.sweep(batch_size=options['batch_size'])
+        self.stdout.write(
+            f"Weekly limits swept: {result['quota_rows_deleted']} past quota rows deleted, "
+            f"{result['resets_advanced']} profile resets moved to next week."
+        )
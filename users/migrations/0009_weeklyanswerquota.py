@@ -0,0 +1,59 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:30
+
+import django.db.models.deletion
+import users.models
+from django.conf import settings
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def backfill_current_week(apps, schema_editor):
+    # Carry this week's answers over so nobody gets a fresh quota mid-week
+    AnswerSession = apps.get_model('diary', 'AnswerSession')
+    WeeklyAnswerQuota = apps.get_model('users', 'WeeklyAnswerQuota')
+    today = timezone.localdate()
+    monday = today - timedelta(days=today.weekday())
+    used = (
+        AnswerSession.objects.filter(respondent__isnull=False, created_at__date__gte=monday)
+        .values('respondent')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    WeeklyAnswerQuota.objects.bulk_create(
+        [WeeklyAnswerQuota(user_id=row['respondent'], week_start=monday, used=row['count']) for row in used],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_userprofile_next_reset'),
+        ('diary', '0010_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='next_reset',
+            field=models.DateTimeField(default=users.models.default_next_reset),
+        ),
+        migrations.CreateModel(
+            name='WeeklyAnswerQuota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField(verbose_name='Week Start')),
+                ('used', models.PositiveIntegerField(default=0, verbose_name='Answers Used')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_quotas', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Weekly Answer Quota',
+                'verbose_name_plural': 'Weekly Answer Quotas',
+                'constraints': [models.UniqueConstraint(fields=('user', 'week_start'), name='unique_quota_user_week')],
+            },
+        ),
+        migrations.RunPython(backfill_current_week, migrations.RunPython.noop),
+    ]
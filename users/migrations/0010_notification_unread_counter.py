@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:42
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_unread(apps, schema_editor):
+    Notification = apps.get_model('users', 'Notification')
+    UserProfile = apps.get_model('users', 'UserProfile')
+    unread = (
+        Notification.objects.filter(user=OuterRef('user'), is_read=False)
+        .values('user').annotate(count=Count('id')).values('count')
+    )
+    UserProfile.objects.update(unread_notifications=Coalesce(Subquery(unread), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diary', '0010_leaderboardentry'),
+        ('users', '0009_weeklyanswerquota'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0, verbose_name='Unread Notifications'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='notification_inbox_idx'),
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
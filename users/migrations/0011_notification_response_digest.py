@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_notification_unread_counter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='type',
+            field=models.CharField(choices=[('answered_diary', 'Answered Diary'), ('received_response', 'Received Response'), ('system', 'System'), ('response_digest', 'Response Digest')], default='system', max_length=50, verbose_name='Type'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:38
+
+import users.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_notification_unread_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='next_reset',
+            field=models.DateTimeField(db_index=True, default=users.models.default_next_reset),
+        ),
+        migrations.AddIndex(
+            model_name='weeklyanswerquota',
+            index=models.Index(fields=['week_start'], name='quota_week_idx'),
+        ),
+    ]
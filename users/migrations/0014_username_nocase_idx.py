@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:42
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0013_weekly_sweep_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.comparison.Collate('username', 'NOCASE'), name='user_username_nocase_idx'),
+        ),
+    ]
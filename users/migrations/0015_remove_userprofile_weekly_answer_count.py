@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_username_nocase_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='weekly_answer_count',
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 05:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_remove_userprofile_weekly_answer_count'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='weekly_reset_date',
+        ),
+    ]
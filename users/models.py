@@ -1,5 +1,6 @@
 import datetime
 import profile
+from collections import Counter
 from datetime import timedelta
 
 from django.contrib.auth.models import AbstractUser  # Base user model with built-in auth features
@@ -14,6 +15,7 @@ from django.urls import reverse
 from django.utils import timezone
 from datetime import timedelta
 from django.utils.timezone import now
+from django.db.models.functions import Collate
 
 
 
@@ -84,11 +86,19 @@ class CustomUser(AbstractUser):
         verbose_name = _("User")  # Singular name in admin
         verbose_name_plural = _("Users")  # Plural name in admin
         ordering = ['username']  # Default ordering by username
+        indexes = [
+            # case-insensitive prefix search (LIKE 'abc%') in the admin
+            models.Index(Collate("username", "NOCASE"), name="user_username_nocase_idx"),
+        ]
 
 class PlanChoices(models.TextChoices):
     FREE = 'free', _('Free')
     PREMIUM = 'premium', _('Premium')
 
+def default_next_reset():
+    return now() + timedelta(days=7)
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
     plan = models.CharField(
@@ -96,9 +106,11 @@ class UserProfile(models.Model):
         choices=PlanChoices.choices,
         default=PlanChoices.FREE
     )
-    weekly_answer_count = models.PositiveIntegerField(default=0)
-    weekly_reset_date = models.DateField(default=timezone.now)  # track last reset
-    next_reset = models.DateTimeField(default=lambda: now() + timedelta(days=7))  # ✅ 7 days later
+    # weekly usage itself is in WeeklyAnswerQuota (users.quota); this is the
+    # start of the next week, moved on by users.quota.advance_resets
+    next_reset = models.DateTimeField(default=default_next_reset, db_index=True)
+    # denormalized count of unread notifications, kept current by users.notifications
+    unread_notifications = models.PositiveIntegerField(default=0, verbose_name=_("Unread Notifications"))
 
     def __str__(self):
         return f"{self.user.username} - {self.plan}"
@@ -111,33 +123,46 @@ class UserProfile(models.Model):
     @property
     def remaining_answers(self):
         """Return remaining answers for this week."""
-        # figure out max per user type
-        max_allowed = self.max_weekly_answers
+        from .quota import remaining_answers
+        return remaining_answers(self.user)
 
-        # define start of current week (Monday as start, adjust if needed)
-        start_of_week = timezone.now().date() - timedelta(days=timezone.now().weekday())
 
-        # count AnswerSessions directly (not diaries)
-        used = AnswerSession.objects.filter(
-            respondent=self.user,
-            created_at__date__gte=start_of_week
-        ).count()
+class WeeklyAnswerQuota(models.Model):
+    """
+    How many diaries a user has answered in one week (weeks start on Monday).
 
-        return max(max_allowed - used, 0)
+    Written only through ``users.quota.consume_answer``, which increments
+    ``used`` atomically so concurrent submissions cannot overshoot the limit.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="answer_quotas",
+        verbose_name=_("User"),
+    )
+    week_start = models.DateField(verbose_name=_("Week Start"))
+    used = models.PositiveIntegerField(default=0, verbose_name=_("Answers Used"))
 
-    def reset_weekly_answers(self):
-        now_dt = timezone.now()
-        if now_dt >= self.next_reset:
-            self.weekly_answer_count = 0
-            self.weekly_reset_date = now_dt.date()
-            self.next_reset = now_dt + timedelta(days=7)
-            self.save()
+    class Meta:
+        verbose_name = _("Weekly Answer Quota")
+        verbose_name_plural = _("Weekly Answer Quotas")
+        constraints = [
+            models.UniqueConstraint(fields=["user", "week_start"], name="unique_quota_user_week"),
+        ]
+        indexes = [
+            # past weeks' rows, for users.quota.purge_past_weeks
+            models.Index(fields=["week_start"], name="quota_week_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} week of {self.week_start}: {self.used}"
 
 
 class NotificationType(models.TextChoices):
     ANSWERED_DIARY = "answered_diary", _("Answered Diary")   # someone answered your diary
     RECEIVED_RESPONSE = "received_response", _("Received Response")  # you answered someone’s diary
     SYSTEM = "system", _("System")  # for future use
+    RESPONSE_DIGEST = "response_digest", _("Response Digest")  # several responses coalesced by users.retention
 
 
 class Notification(models.Model):
@@ -190,17 +215,61 @@ class Notification(models.Model):
         ordering = ["-created_at"]
         verbose_name = _("Notification")
         verbose_name_plural = _("Notifications")
+        indexes = [
+            # the inbox: one user's notifications, newest first, keyset paged
+            models.Index(fields=["user", "-created_at", "-id"], name="notification_inbox_idx"),
+            # unread counts and mark-all-read; partial for the same reason as NewsItem's
+            models.Index(fields=["user"], condition=models.Q(is_read=False), name="notification_unread_idx"),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user.username}: {self.message}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored = (instance.__dict__.get("user_id"), instance.__dict__.get("is_read"))
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .notifications import adjust_unread, publish_on_commit
+        adding = self._state.adding
+        if adding:
+            super().save(*args, **kwargs)
+            if not self.is_read:
+                adjust_unread({self.user_id: 1})
+            publish_on_commit([self])
+            self._stored = (self.user_id, self.is_read)
+            return
+
+        # an edit (e.g. the admin change form) can flip is_read or move the
+        # row to another user: take the stored row off its counter, add the new one
+        stored_user, stored_read = getattr(self, "_stored", (None, None))
+        if stored_user is None or stored_read is None:
+            stored_user, stored_read = Notification.objects.values_list("user_id", "is_read").get(pk=self.pk)
+        update_fields = kwargs.get("update_fields")
+        user_id = self.user_id if update_fields is None or "user" in update_fields else stored_user
+        is_read = self.is_read if update_fields is None or "is_read" in update_fields else stored_read
+        super().save(*args, **kwargs)
+        deltas = Counter()
+        deltas[stored_user] -= not stored_read
+        deltas[user_id] += not is_read
+        adjust_unread(deltas)
+        self._stored = (user_id, is_read)
+
     def mark_as_read(self):
+        if self.is_read:
+            return
+        from .notifications import mark_read
+        mark_read(Notification.objects.filter(pk=self.pk))
         self.is_read = True
-        self.save(update_fields=["is_read"])
+        self._stored = (self.user_id, True)
 
     def get_link(self):
         if self.type == NotificationType.ANSWERED_DIARY:
             return reverse("diary:response_session_detail", kwargs={"pk": self.related_object_id})
         elif self.type == NotificationType.RECEIVED_RESPONSE:
             return reverse("diary:response_session_detail", kwargs={"pk": self.related_object_id})
+        elif self.type == NotificationType.RESPONSE_DIGEST and self.question_set_id:
+            return reverse("diary:question_set_detail", args=[self.question_set.slug])
         return None
@@ -0,0 +1,112 @@
+"""
+Notification inbox and unread counter.
+
+Each UserProfile carries ``unread_notifications`` so the header badge and the
+profile page never count rows. Every write that can change it goes through
+this module: ``Notification.save`` and ``notify`` on create,
+``Notification.save`` again when an edit (e.g. the admin change form)
+flips ``is_read`` or the recipient, ``Notification.mark_as_read`` and
+``mark_read`` (also used by the admin action) on read, and
+``users.signals`` on delete. ``recount_unread`` rebuilds
+the counters from the table if they are ever suspected to have drifted.
+New notifications are also pushed to their recipients' open event streams
+(``DiaryProject.events``) once the transaction commits.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from DiaryProject import events
+from DiaryProject.pagination import akeyset_page, keyset_page
+from .models import Notification, UserProfile
+
+INBOX_PAGE_SIZE = 10
+
+
+def adjust_unread(deltas):
+    """Apply ``{user_id: delta}`` to the unread counters in one UPDATE, never going below zero."""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    change = Case(*[When(user_id=user_id, then=Value(delta)) for user_id, delta in deltas.items()])
+    UserProfile.objects.filter(user_id__in=deltas).update(
+        unread_notifications=Greatest(F("unread_notifications") + change, Value(0))
+    )
+
+
+@transaction.atomic(savepoint=False)
+def notify(notifications):
+    """Bulk-create ``notifications`` and bump their recipients' unread counters."""
+    created = Notification.objects.bulk_create(notifications)
+    adjust_unread(Counter(n.user_id for n in created if not n.is_read))
+    publish_on_commit(created)
+    return created
+
+
+def notification_payload(notification):
+    return {
+        "id": notification.pk,
+        "type": notification.type,
+        "message": notification.message,
+        "is_read": notification.is_read,
+        "created_at": notification.created_at.isoformat(),
+    }
+
+
+def publish_on_commit(notifications):
+    """Push ``notifications`` to their recipients' event streams after the current transaction commits."""
+    payloads = [(n.user_id, notification_payload(n)) for n in notifications]
+
+    def publish():
+        for user_id, payload in payloads:
+            events.publish(user_id, "notification", payload)
+
+    transaction.on_commit(publish)
+
+
+@transaction.atomic(savepoint=False)
+def mark_read(queryset):
+    """Mark every unread notification in ``queryset`` as read; return how many changed."""
+    unread = queryset.filter(is_read=False)
+    per_user = {
+        row["user"]: -row["count"]
+        for row in unread.values("user").annotate(count=Count("id")).order_by()
+    }
+    updated = unread.update(is_read=True)
+    adjust_unread(per_user)
+    return updated
+
+
+def unread_count(user):
+    return user.userprofile.unread_notifications
+
+
+def inbox_page(user, cursor=None, limit=INBOX_PAGE_SIZE):
+    """
+    One page of ``user``'s notifications, newest first, as ``(rows, next_cursor)``.
+
+    Keyset paged through ``notification_inbox_idx``; raises ValueError for a
+    malformed cursor.
+    """
+    notifications = user.notifications.order_by("-created_at", "-id")
+    return keyset_page(notifications, cursor, limit)
+
+
+async def ainbox_page(user, cursor=None, limit=INBOX_PAGE_SIZE):
+    """Async ``inbox_page``."""
+    notifications = user.notifications.order_by("-created_at", "-id")
+    return await akeyset_page(notifications, cursor, limit)
+
+
+def recount_unread(users=None):
+    """Recompute the unread counters of ``users`` (default: everyone) from the table."""
+    unread = (
+        Notification.objects.filter(user=OuterRef("user"), is_read=False)
+        .values("user").annotate(count=Count("id")).values("count")
+    )
+    profiles = UserProfile.objects.all()
+    if users is not None:
+        profiles = profiles.filter(user__in=users)
+    return profiles.update(unread_notifications=Coalesce(Subquery(unread), 0))
@@ -0,0 +1,190 @@
+"""
+Weekly answer quota.
+
+Usage lives in one WeeklyAnswerQuota row per user and week (weeks start on
+Monday), so reading it is a single indexed lookup and a new week needs no
+reset: it simply has no row yet. Views, templates and the context processor
+all go through this module.
+
+``sweep`` is the scheduled part (``manage.py reset_weekly_limits``): it
+deletes rows of past weeks, which nothing reads, and moves the
+``UserProfile.next_reset`` that has passed on to the next Monday. Both walk
+an index in batches of at most ``SWEEP_BATCH_SIZE`` rows, one short
+transaction each, and re-check their condition in the write, so the job can
+be re-run or overlap another run and live traffic without double counting.
+
+``rebuild`` recounts the current week's rows from the sessions themselves,
+for data written without ``consume_answer`` (e.g. ``manage.py seed_data``).
+"""
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from diary.models import AnswerSession
+from .models import UserProfile, WeeklyAnswerQuota
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 500
+
+
+def week_start(now=None):
+    """Return the date of the Monday starting the current week."""
+    today = timezone.localdate(now) if now else timezone.localdate()
+    return today - timedelta(days=today.weekday())
+
+
+def next_week_start(now=None):
+    """Return the aware datetime at which the next week's quota begins."""
+    monday = week_start(now) + timedelta(days=7)
+    return timezone.make_aware(datetime.combine(monday, time.min))
+
+
+def answer_limit(user):
+    return user.userprofile.max_weekly_answers
+
+
+def answers_used(user, now=None):
+    return (
+        WeeklyAnswerQuota.objects.filter(user=user, week_start=week_start(now))
+        .values_list("used", flat=True)
+        .first()
+    ) or 0
+
+
+async def aanswers_used(user, now=None):
+    return (
+        await WeeklyAnswerQuota.objects.filter(user=user, week_start=week_start(now))
+        .values_list("used", flat=True)
+        .afirst()
+    ) or 0
+
+
+def remaining_answers(user, now=None):
+    return max(answer_limit(user) - answers_used(user, now), 0)
+
+
+def get_quota(user, now=None):
+    """Everything the templates show about a user's weekly answers."""
+    limit = answer_limit(user)
+    used = answers_used(user, now)
+    return {
+        "used": used,
+        "limit": limit,
+        "remaining": max(limit - used, 0),
+        "resets_at": next_week_start(now),
+    }
+
+
+async def aget_quota(user, now=None):
+    """Async ``get_quota``; ``user.userprofile`` must already be loaded (see ``users.backends.aload_user``)."""
+    limit = answer_limit(user)
+    used = await aanswers_used(user, now)
+    return {
+        "used": used,
+        "limit": limit,
+        "remaining": max(limit - used, 0),
+        "resets_at": next_week_start(now),
+    }
+
+
+def reset_answers(users, now=None):
+    """Give ``users`` (a queryset or list) their full quota back for this week."""
+    return WeeklyAnswerQuota.objects.filter(user__in=users, week_start=week_start(now)).delete()[0]
+
+
+def consume_answer(user, now=None):
+    """
+    Use up one answer from this week's quota.
+
+    Returns False without changing anything when the quota is exhausted. The
+    check and the increment are one UPDATE, so call this inside the submission
+    transaction and roll back if the submission fails.
+    """
+    limit = answer_limit(user)
+    week = week_start(now)
+    rows = WeeklyAnswerQuota.objects.filter(user=user, week_start=week)
+    if rows.filter(used__lt=limit).update(used=F("used") + 1):
+        return True
+    if limit <= 0 or rows.exists():
+        return False
+    try:
+        with transaction.atomic():
+            WeeklyAnswerQuota.objects.create(user=user, week_start=week, used=1)
+        return True
+    except IntegrityError:
+        # a concurrent submission created this week's row first
+        return bool(rows.filter(used__lt=limit).update(used=F("used") + 1))
+
+
+def purge_past_weeks(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """Delete quota rows of weeks before the current one; returns the number deleted."""
+    current = week_start(now)
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                WeeklyAnswerQuota.objects.filter(week_start__lt=current)
+                .order_by("week_start").values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            deleted += WeeklyAnswerQuota.objects.filter(pk__in=ids).delete()[0]
+
+
+def advance_resets(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """
+    Move ``next_reset`` of the profiles whose reset has passed to the next Monday.
+
+    Returns the number of profiles moved. The UPDATE repeats the
+    ``next_reset`` condition, so a profile another run already moved on is
+    not counted twice.
+    """
+    now = now or timezone.now()
+    advanced = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                UserProfile.objects.filter(next_reset__lte=now)
+                .order_by("next_reset").values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                return advanced
+            advanced += UserProfile.objects.filter(pk__in=ids, next_reset__lte=now).update(
+                next_reset=next_week_start(now)
+            )
+
+
+def sweep(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """Scheduled-job entry point: purge past weeks, then advance due resets. Returns a summary dict."""
+    result = {
+        "quota_rows_deleted": purge_past_weeks(batch_size, now),
+        "resets_advanced": advance_resets(batch_size, now),
+    }
+    logger.info("Weekly limits swept: %(quota_rows_deleted)d past quota rows deleted, "
+                "%(resets_advanced)d profile resets moved to next week", result)
+    return result
+
+
+@transaction.atomic
+def rebuild(now=None):
+    """
+    Recompute the current week's rows from the sessions each user submitted since Monday.
+
+    Returns the number of rows written.
+    """
+    week = week_start(now)
+    since = timezone.make_aware(datetime.combine(week, time.min))
+    WeeklyAnswerQuota.objects.filter(week_start=week).delete()
+    rows = [
+        WeeklyAnswerQuota(user_id=row["respondent"], week_start=week, used=row["count"])
+        for row in (
+            AnswerSession.objects.filter(respondent__isnull=False, created_at__gte=since)
+            .values("respondent").annotate(count=Count("id")).order_by()
+        )
+    ]
+    WeeklyAnswerQuota.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
@@ -0,0 +1,174 @@
+"""
+Notification retention and compaction.
+
+``run_retention`` is the scheduled-job entry point (the
+``compact_notifications`` command calls it; cron or any scheduler can call
+either). It does two things:
+
+* coalesces the RECEIVED_RESPONSE notifications one user got for one question
+  set on one (finished) day into a single RESPONSE_DIGEST row, e.g.
+  "12 people answered your diary 'Summer'.";
+* deletes notifications older than the retention period, optionally writing
+  them to an NDJSON archive first.
+
+All work happens in batches of at most ``BATCH_SIZE`` rows, each in its own
+short transaction, so SQLite's write lock is never held for long. Unread
+counters are adjusted per batch through ``users.notifications``.
+"""
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Notification, NotificationType
+from .notifications import adjust_unread, mark_read
+
+DEFAULT_SETTINGS = {
+    "DAYS": 180,
+    "COALESCE_AFTER_DAYS": 1,
+    "BATCH_SIZE": 500,
+}
+
+
+def get_settings():
+    conf = dict(DEFAULT_SETTINGS)
+    conf.update(getattr(settings, "NOTIFICATION_RETENTION", {}))
+    return conf
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _archive_row(notification):
+    return json.dumps({
+        "id": notification.pk,
+        "user_id": notification.user_id,
+        "actor_id": notification.actor_id,
+        "type": notification.type,
+        "message": notification.message,
+        "question_set_id": notification.question_set_id,
+        "related_object_id": str(notification.related_object_id) if notification.related_object_id else None,
+        "is_read": notification.is_read,
+        "created_at": notification.created_at.isoformat(),
+    })
+
+
+def purge_expired(days=None, batch_size=None, archive=None, now=None):
+    """
+    Delete notifications older than ``days``, ``batch_size`` rows per transaction.
+
+    If ``archive`` (a text file object) is given, every deleted row is first
+    written to it as one JSON line. Returns the number of rows deleted.
+    """
+    conf = get_settings()
+    days = conf["DAYS"] if days is None else days
+    batch_size = batch_size or conf["BATCH_SIZE"]
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Notification.objects.filter(created_at__lt=cutoff).order_by("pk")[:batch_size]
+            )
+            if not batch:
+                return deleted
+            if archive is not None:
+                archive.write("".join(_archive_row(n) + "\n" for n in batch))
+            rows = Notification.objects.filter(pk__in=[n.pk for n in batch])
+            # one counter UPDATE per batch, so the delete receiver has nothing left to do
+            mark_read(rows)
+            rows.delete()
+        deleted += len(batch)
+
+
+def _coalesce_group(user_id, question_set_id, day, batch_size):
+    """Replace up to ``batch_size`` of one day's responses with a digest; return rows replaced."""
+    with transaction.atomic():
+        group = list(
+            Notification.objects.filter(
+                user_id=user_id,
+                question_set_id=question_set_id,
+                type=NotificationType.RECEIVED_RESPONSE,
+                created_at__gte=_day_start(day),
+                created_at__lt=_day_start(day + timedelta(days=1)),
+            )
+            .select_related("question_set")
+            .order_by("pk")[:batch_size]
+        )
+        if len(group) < 2:
+            return 0
+
+        unread = sum(not n.is_read for n in group)
+        title = group[0].question_set.title if group[0].question_set else ""
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                type=NotificationType.RESPONSE_DIGEST,
+                message=f"{len(group)} people answered your diary '{title}'.",
+                question_set_id=question_set_id,
+                is_read=not unread,
+                created_at=max(n.created_at for n in group),
+            )
+        ])
+        rows = Notification.objects.filter(pk__in=[n.pk for n in group])
+        # marked read first so the delete receiver leaves the counter alone;
+        # the digest then counts as one unread row in place of the group's
+        rows.update(is_read=True)
+        rows.delete()
+        adjust_unread({user_id: (1 if unread else 0) - unread})
+    return len(group)
+
+
+def coalesce_responses(after_days=None, batch_size=None, now=None):
+    """
+    Fold each user's RECEIVED_RESPONSE notifications for one question set on
+    one day into a digest row. Only days that ended at least ``after_days``
+    ago are touched, so a day is coalesced once, when it is complete. Returns
+    ``(digests_created, notifications_replaced)``.
+    """
+    conf = get_settings()
+    after_days = conf["COALESCE_AFTER_DAYS"] if after_days is None else after_days
+    batch_size = batch_size or conf["BATCH_SIZE"]
+    today = timezone.localdate(now) if now else timezone.localdate()
+    cutoff = _day_start(today - timedelta(days=after_days - 1))
+
+    groups = (
+        Notification.objects.filter(
+            type=NotificationType.RECEIVED_RESPONSE,
+            question_set__isnull=False,
+            created_at__lt=cutoff,
+        )
+        .annotate(day=TruncDate("created_at"))
+        .values("user", "question_set", "day")
+        .annotate(count=Count("id"))
+        .filter(count__gte=2)
+        .order_by()
+    )
+
+    digests = replaced = 0
+    for group in list(groups):
+        while True:
+            count = _coalesce_group(group["user"], group["question_set"], group["day"], batch_size)
+            if not count:
+                break
+            digests += 1
+            replaced += count
+    return digests, replaced
+
+
+def run_retention(days=None, batch_size=None, archive=None, coalesce=True, now=None):
+    """
+    Scheduled-job entry point: coalesce (unless ``coalesce`` is False), then
+    purge. Arguments left as None come from settings. Returns a summary dict.
+    """
+    digests = replaced = 0
+    if coalesce:
+        digests, replaced = coalesce_responses(batch_size=batch_size, now=now)
+    deleted = purge_expired(days, batch_size, archive=archive, now=now)
+    return {"digests": digests, "coalesced": replaced, "deleted": deleted}
@@ -1,3 +1,399 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import site
+from django.contrib.auth import BACKEND_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from DiaryProject.queryplans import plan_problems, query_plan
+from diary.models import QuestionSet, QuestionSetStyle, Question, AnswerSession
+from . import notifications, quota, retention
+from .context_processors import user_profile
+from .models import Notification, NotificationType, UserProfile, WeeklyAnswerQuota
+
+User = get_user_model()
+
+
+class AnswerQuotaTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="friend", password="pw")
+
+    def test_consume_stops_at_plan_limit(self):
+        results = [quota.consume_answer(self.user) for _ in range(6)]
+        self.assertEqual(results, [True] * 5 + [False])
+        self.assertEqual(quota.get_quota(self.user)["remaining"], 0)
+
+    def test_new_week_starts_from_zero_without_a_reset(self):
+        last_week = timezone.now() - timedelta(days=7)
+        for _ in range(5):
+            quota.consume_answer(self.user, now=last_week)
+        self.assertEqual(quota.remaining_answers(self.user, now=last_week), 0)
+        self.assertEqual(quota.remaining_answers(self.user), 5)
+        self.assertEqual(WeeklyAnswerQuota.objects.filter(user=self.user).count(), 1)
+
+    def test_submission_consumes_quota(self):
+        owner = User.objects.create_user(username="owner", password="pw")
+        qset = QuestionSet.objects.create(owner=owner, title="Quota diary")
+        question = Question.objects.create(question_set=qset, text="Why?")
+        url = reverse("diary:answer_question_set_shared", args=[qset.share_uuid])
+        self.client.force_login(self.user)
+
+        for _ in range(5):
+            self.client.post(url, {f"question_{question.id}": "Because"})
+        response = self.client.post(url, {f"question_{question.id}": "Because"})
+
+        self.assertRedirects(response, reverse("users:profile"), fetch_redirect_response=False)
+        self.assertEqual(AnswerSession.objects.filter(respondent=self.user).count(), 5)
+        self.assertEqual(quota.answers_used(self.user), 5)
+
+
+class WeeklySweepTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.users = [User.objects.create_user(username=f"user{i}", password="pw") for i in range(5)]
+        # three profiles are due, two are not
+        for i, user in enumerate(self.users):
+            UserProfile.objects.filter(user=user).update(next_reset=self.now + timedelta(days=-1 if i < 3 else 1))
+        this_week = quota.week_start(self.now)
+        WeeklyAnswerQuota.objects.bulk_create(
+            [WeeklyAnswerQuota(user=user, week_start=this_week - timedelta(days=7 * weeks), used=2)
+             for user in self.users for weeks in range(3)]
+        )
+
+    def test_sweep_advances_only_due_profiles_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = quota.sweep(batch_size=2, now=self.now)
+        self.assertEqual(result, {"resets_advanced": 3, "quota_rows_deleted": 10})
+        self.assertFalse([q["sql"] for q in queries.captured_queries
+                          if q["sql"].startswith("UPDATE") and "LIMIT" not in q["sql"] and " IN (" not in q["sql"]])
+
+        profiles = UserProfile.objects.order_by("user__username")
+        self.assertEqual({p.next_reset for p in profiles[:3]}, {quota.next_week_start(self.now)})
+        self.assertTrue(all(p.next_reset > self.now for p in profiles))
+        # this week's usage is untouched
+        self.assertEqual(quota.answers_used(self.users[0], self.now), 2)
+
+        # nothing left to do on a second run
+        self.assertEqual(quota.sweep(now=self.now), {"resets_advanced": 0, "quota_rows_deleted": 0})
+
+    def test_command_reports_counts(self):
+        out = io.StringIO()
+        call_command("reset_weekly_limits", stdout=out)
+        self.assertIn("3 profile resets", out.getvalue())
+
+    def test_sweep_queries_use_indexes(self):
+        for queryset in (
+            UserProfile.objects.filter(next_reset__lte=self.now).order_by("next_reset").values_list("pk")[:500],
+            WeeklyAnswerQuota.objects.filter(week_start__lt=quota.week_start(self.now))
+            .order_by("week_start").values_list("pk")[:500],
+        ):
+            plan = query_plan(queryset)
+            self.assertEqual(plan_problems(plan), [], plan)
+
+
+class NotificationInboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="pw")
+
+    def _unread(self):
+        self.user.userprofile.refresh_from_db()
+        return self.user.userprofile.unread_notifications
+
+    def _notify(self, count):
+        return notifications.notify([
+            Notification(user=self.user, message=f"Note {i}") for i in range(count)
+        ])
+
+    def test_counter_follows_create_read_and_delete(self):
+        Notification.objects.create(user=self.user, message="Single")
+        self._notify(3)
+        self.assertEqual(self._unread(), 4)
+
+        note = Notification.objects.filter(user=self.user).first()
+        note.mark_as_read()
+        note.mark_as_read()
+        self.assertEqual(self._unread(), 3)
+
+        Notification.objects.filter(user=self.user, is_read=False).first().delete()
+        self.assertEqual(self._unread(), 2)
+
+    def test_new_notifications_are_published_after_commit(self):
+        with mock.patch("users.notifications.events.publish") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                created = self._notify(2)
+                Notification.objects.create(user=self.user, message="Single")
+                publish.assert_not_called()
+        self.assertEqual(
+            [(call.args[0], call.args[1], call.args[2]["message"]) for call in publish.call_args_list],
+            [(self.user.pk, "notification", "Note 0"), (self.user.pk, "notification", "Note 1"),
+             (self.user.pk, "notification", "Single")],
+        )
+        self.assertEqual(publish.call_args_list[0].args[2]["id"], created[0].pk)
+
+    def test_admin_action_updates_counter(self):
+        other = User.objects.create_user(username="other", password="pw")
+        self._notify(3)
+        notifications.notify([Notification(user=other, message="Elsewhere")])
+        model_admin = site._registry[Notification]
+
+        with mock.patch.object(model_admin, "message_user"):
+            model_admin.mark_as_read(RequestFactory().post("/"), Notification.objects.all())
+
+        self.assertEqual(self._unread(), 0)
+        other.userprofile.refresh_from_db()
+        self.assertEqual(other.userprofile.unread_notifications, 0)
+
+    def test_edits_through_save_and_the_admin_update_counter(self):
+        other = User.objects.create_user(username="other", password="pw")
+        note, second = self._notify(2)
+        note = Notification.objects.get(pk=note.pk)
+        note.is_read = True
+        note.save()
+        note.save()
+        self.assertEqual(self._unread(), 1)
+        note.is_read = False
+        note.save(update_fields=["message"])  # is_read not written, nothing changes
+        self.assertEqual(self._unread(), 1)
+
+        admin = User.objects.create_superuser(username="admin", password="pw", email="a@example.com")
+        self.client.force_login(admin)
+        response = self.client.post(reverse("admin:users_notification_change", args=[note.pk]), {
+            "user": other.pk, "type": note.type, "message": note.message, "is_read": "on",
+        })
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(reverse("admin:users_notification_change", args=[second.pk]), {
+            "user": other.pk, "type": second.type, "message": second.message,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self._unread(), 0)
+        other.userprofile.refresh_from_db()
+        self.assertEqual(other.userprofile.unread_notifications, 1)
+
+    def test_recount_repairs_drift(self):
+        self._notify(2)
+        self.user.userprofile.__class__.objects.update(unread_notifications=9)
+        notifications.recount_unread()
+        self.assertEqual(self._unread(), 2)
+
+    def test_inbox_pages_through_everything_without_counting(self):
+        self._notify(25)
+        seen, cursor = [], None
+        while True:
+            page, cursor = notifications.inbox_page(self.user, cursor)
+            seen.extend(n.pk for n in page)
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("users:profile"), {"cursor": cursor or "bogus"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["notifications"]), notifications.INBOX_PAGE_SIZE)
+        self.assertFalse([q for q in ctx.captured_queries if "COUNT(" in q["sql"] and "notification" in q["sql"]])
+        self.assertContains(response, '<span class="nav-badge">25</span>', html=True)
+
+
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="popular", password="pw")
+        self.qset = QuestionSet.objects.create(owner=self.owner, title="Summer")
+
+    def _responses(self, count, created_at):
+        return notifications.notify([
+            Notification(user=self.owner, type=NotificationType.RECEIVED_RESPONSE, message="Answered",
+                         question_set=self.qset, created_at=created_at)
+            for _ in range(count)
+        ])
+
+    def _unread(self):
+        self.owner.userprofile.refresh_from_db()
+        return self.owner.userprofile.unread_notifications
+
+    def test_finished_days_become_one_digest(self):
+        self._responses(3, timezone.now() - timedelta(days=1))
+        self._responses(2, timezone.now())
+
+        self.assertEqual(retention.coalesce_responses(), (1, 3))
+
+        digest = Notification.objects.get(type=NotificationType.RESPONSE_DIGEST)
+        self.assertEqual(digest.message, "3 people answered your diary 'Summer'.")
+        self.assertFalse(digest.is_read)
+        self.assertEqual(Notification.objects.filter(type=NotificationType.RECEIVED_RESPONSE).count(), 2)
+        self.assertEqual(self._unread(), 3)
+        self.assertEqual(retention.coalesce_responses(), (0, 0))
+
+    def test_large_groups_are_split_into_batches(self):
+        self._responses(5, timezone.now() - timedelta(days=2))
+        self.assertEqual(retention.coalesce_responses(batch_size=2), (2, 4))
+        self.assertEqual(self.owner.notifications.count(), 3)
+
+    def test_purge_archives_and_uncounts_expired_rows(self):
+        self._responses(3, timezone.now() - timedelta(days=200))
+        self._responses(1, timezone.now())
+        archive = io.StringIO()
+
+        self.assertEqual(retention.purge_expired(days=180, batch_size=2, archive=archive), 3)
+
+        archived = [json.loads(line) for line in archive.getvalue().splitlines()]
+        self.assertEqual(len(archived), 3)
+        self.assertEqual(self.owner.notifications.count(), 1)
+        self.assertEqual(self._unread(), 1)
+
+    def test_command_runs_the_retention_job(self):
+        self._responses(3, timezone.now() - timedelta(days=200))
+        self._responses(2, timezone.now() - timedelta(days=2))
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "archive.ndjson")
+            call_command("compact_notifications", "--days", "180", "--archive", path, stdout=out)
+            with open(path, encoding="utf-8") as archive:
+                self.assertEqual(len(archive.readlines()), 1)  # the 200-day-old responses, as one digest
+        self.assertEqual(
+            out.getvalue().splitlines(),
+            ["Coalesced 5 notifications into 2 digests.", "Deleted 1 notifications older than 180 days."],
+        )
+
+
+class ProfileLoadingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="loader", password="pw")
+
+    def _profile_queries(self, ctx):
+        return [q for q in ctx.captured_queries if q["sql"].startswith('SELECT "users_userprofile"')]
+
+    def test_user_and_profile_load_in_one_query(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("users:profile"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._profile_queries(ctx), [])
+        user_queries = [q for q in ctx.captured_queries if 'FROM "users_customuser"' in q["sql"]]
+        self.assertEqual(len(user_queries), 1)
+        self.assertIn('"users_userprofile"', user_queries[0]["sql"])
+
+    def test_answer_page_does_not_reload_profile(self):
+        owner = User.objects.create_user(username="host", password="pw")
+        style = QuestionSetStyle.objects.create(name="Classic", template_name="style_classic.html")
+        qset = QuestionSet.objects.create(owner=owner, title="Profile diary", style=style)
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("diary:answer_question_set_shared", args=[qset.share_uuid]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._profile_queries(ctx), [])
+
+    def test_context_processor_is_lazy(self):
+        self.client.force_login(self.user)
+        request = RequestFactory().get("/")
+        request.session = self.client.session
+        AuthenticationMiddleware(lambda r: None).process_request(request)
+
+        with self.assertNumQueries(0):
+            context = user_profile(request)
+        # the session, then the user joined with the profile
+        with self.assertNumQueries(2):
+            self.assertEqual(context["profile"].plan, "free")
+        with self.assertNumQueries(1):
+            self.assertEqual(context["quota"]["remaining"], 5)
+
+    @override_settings(AUTHENTICATION_BACKENDS=["django.contrib.auth.backends.ModelBackend"])
+    def test_plain_backend_still_works(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse("users:profile")).status_code, 200)
+
+    def test_registration_logs_the_new_user_in(self):
+        response = self.client.post(reverse("users:register"), {
+            "username": "newcomer", "email": "new@example.com", "name": "New", "surname": "Comer",
+            "city": "Tbilisi", "password1": "a-long-Passw0rd", "password2": "a-long-Passw0rd",
+        })
+        self.assertRedirects(response, reverse("users:profile"))
+        user = User.objects.get(username="newcomer")
+        self.assertEqual(int(self.client.session[SESSION_KEY]), user.pk)
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], "users.backends.ProfileModelBackend")
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="pw", email="a@example.com")
+        self.client.force_login(self.admin)
+
+    def _add_users(self, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(username=f"Reader{i}", password="pw")
+            notifications.notify([Notification(user=user, actor=self.admin, message=f"Note {i}")])
+
+    def _queries(self, name, **params):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse(f"admin:{name}"), params).status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_changelists_do_not_query_per_row(self):
+        self._add_users(2)
+        names = ("users_notification_changelist", "users_userprofile_changelist")
+        counts = {name: self._queries(name) for name in names}
+        self._add_users(8)
+        self.assertEqual({name: self._queries(name) for name in names}, counts)
+
+    def test_profiles_show_this_weeks_answers(self):
+        self._add_users(2)
+        reader = User.objects.get(username="Reader1")
+        quota.consume_answer(reader)
+        quota.consume_answer(reader)
+        response = self.client.get(reverse("admin:users_userprofile_changelist"))
+        used = {p.user.username: p.answers_this_week for p in response.context["cl"].result_list}
+        self.assertEqual(used["Reader1"], 2)
+        self.assertIsNone(used["Reader2"])
+        self.assertContains(response, "Answers this week")
+
+    def test_username_search_is_an_indexed_prefix_match(self):
+        self._add_users(3)
+        response = self.client.get(reverse("admin:users_notification_changelist"), {"q": "reader1"})
+        self.assertEqual([n.message for n in response.context["cl"].result_list], ["Note 1"])
+
+        users = User.objects.filter(username__istartswith="reader1").order_by()
+        plan = query_plan(users)
+        self.assertEqual(plan_problems(plan), [], plan)
+        self.assertIn("user_username_nocase_idx", " ".join(plan))
+
+    def test_profile_reset_action_is_one_statement(self):
+        self._add_users(3)
+        for user in User.objects.all():
+            quota.consume_answer(user)
+        model_admin = site._registry[UserProfile]
+        with mock.patch.object(model_admin, "message_user"), CaptureQueriesContext(connection) as queries:
+            model_admin.reset_weekly_answers_action(RequestFactory().post("/"), UserProfile.objects.all())
+        self.assertEqual(WeeklyAnswerQuota.objects.count(), 0)
+        self.assertEqual(len([q for q in queries.captured_queries if q["sql"].startswith("DELETE")]), 1)
+
+
+class NotificationQueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="reader", password="pw")
+        Notification.objects.create(user=cls.user, message="hello")
+
+    def assertIndexed(self, queryset):
+        plan = query_plan(queryset)
+        self.assertEqual(plan_problems(plan), [], plan)
+
+    def test_inbox_pages(self):
+        inbox = self.user.notifications.order_by("-created_at", "-id")
+        self.assertIndexed(inbox[:11])
+        self.assertIndexed(inbox.filter(created_at__lt=timezone.now())[:11])
+
+    def test_unread_lookup(self):
+        unread = self.user.notifications.filter(is_read=False).order_by()
+        self.assertIndexed(unread)
+        self.assertIn("notification_unread_idx", " ".join(query_plan(unread)))
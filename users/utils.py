@@ -1,4 +1,5 @@
 from diary.models import QuestionSet
+from .quota import remaining_answers
 
 def get_limits(user):
     profile = user.userprofile
@@ -7,7 +8,7 @@ def get_limits(user):
     return {'max_answers': 5, 'max_qsets': 1}
 
 def can_answer_more(user):
-    return user.userprofile.weekly_answer_count < get_limits(user)['max_answers']
+    return remaining_answers(user) > 0
 
 def can_create_qset(user):
     limit = 3 if user.userprofile.plan == 'premium' else 1
@@ -1,12 +1,19 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
-from django.core.paginator import Paginator
+from django.http import HttpResponse
 from django.shortcuts import render, redirect  # For rendering templates and redirecting
 from django.contrib.auth import login, authenticate, logout  # Auth-related helpers
 from django.contrib.auth.decorators import login_required  # Restrict profile view to logged in users
 
 from DiaryProject import settings
+from DiaryProject.pagination import decode_cursor
 from diary.models import QuestionSet
 from .forms import CustomUserCreationForm  # Our custom form
+from .backends import aload_user
+from .notifications import ainbox_page, inbox_page
+from .quota import aget_quota, get_quota
 from .utils import get_limits
 
 from django.shortcuts import redirect
@@ -50,29 +57,56 @@ def logout_view(request):
 # Show user profile (only for logged in users)
 @login_required(login_url='users:login')
 def profile_view(request):
-    notifications_qs = request.user.notifications.all()
+    # keyset paged: ?cursor= comes from the previous page's "Older" link
+    cursor = request.GET.get("cursor")
+    try:
+        notifications, next_cursor = inbox_page(request.user, cursor)
+    except ValueError:
+        cursor = None
+        notifications, next_cursor = inbox_page(request.user)
 
-    # paginate with 10 per page
-    paginator = Paginator(notifications_qs, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    current_qset_count = QuestionSet.objects.filter(owner=request.user).count()
+    answer_quota = get_quota(request.user)
+    context = _profile_context(request.user, notifications, cursor, next_cursor, current_qset_count, answer_quota)
+    return render(request, 'users/profile.html', context)
 
 
-    profile = request.user.userprofile
-    limits = get_limits(request.user)
-    current_qset_count = QuestionSet.objects.filter(owner=request.user).count()
-    # Reset weekly answers if needed
-    profile.reset_weekly_answers()
+@login_required(login_url='users:login')
+async def profile_view_async(request):
+    """Async ``profile_view``: the inbox page, set count and quota are read concurrently."""
+    user = await aload_user(request)
+    cursor = request.GET.get("cursor")
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            cursor = None
+
+    (notifications, next_cursor), current_qset_count, answer_quota = await asyncio.gather(
+        ainbox_page(user, cursor), QuestionSet.objects.filter(owner=user).acount(), aget_quota(user),
+    )
 
-    context = {
+    context = _profile_context(user, notifications, cursor, next_cursor, current_qset_count, answer_quota)
+    return await sync_to_async(render)(request, 'users/profile.html', context)
+
+
+def _profile_context(user, notifications, cursor, next_cursor, current_qset_count, answer_quota):
+    profile = user.userprofile
+    limits = get_limits(user)
+    return {
         'profile': profile,
-        'max_answers': limits['max_answers'],
+        'quota': answer_quota,
+        'max_answers': answer_quota['limit'],
         'max_qsets': limits['max_qsets'],
         'current_qset_count': current_qset_count,  # pass this to the template
-        "page_obj": page_obj,  # for template pagination controls
-        "next_reset": profile.next_reset,  # send datetime
+        "notifications": notifications,
+        "unread_count": profile.unread_notifications,
+        "cursor": cursor,  # set when not on the newest page
+        "next_cursor": next_cursor,  # None on the oldest page
+        "next_reset": answer_quota['resets_at'],  # send datetime
     }
-    return render(request, 'users/profile.html', context)
+
+
 @login_required(login_url='users:login')
 def upgrade_to_premium(request):
     profile = request.user.userprofile
@@ -81,6 +115,12 @@ def upgrade_to_premium(request):
     messages.success(request, "You’ve been upgraded to Premium!")
     return redirect('users:profile')  # adjust if your profile URL name is different
 
+def event_stream(request):
+    # Under ASGI, DiaryProject.events.EventStreamApp answers this path before
+    # Django sees it. Here (WSGI) every open stream would hold a worker thread,
+    # so answer 204, which tells EventSource to stop reconnecting.
+    return HttpResponse(status=204)
+
 def set_language(request, lang_code):
     if lang_code not in dict(settings.LANGUAGES):
         lang_code = settings.LANGUAGE_CODE